@@ -0,0 +1,262 @@
+import sys
+import time
+import random
+import itertools
+from harmony import Harmony, SearchLimit, reset_tables
+from solve import get_harmony_text
+import strategy
+
+"""
+benchmark.py compares search configurations of Harmony,
+as described in harmony.py, by the number of nodes (swaps
+made) and the time each needs to solve the given cases.
+
+Usage
+	benchmark.py [max_nodes] [case_filename.in ...]
+	benchmark.py --tune [max_nodes]
+	benchmark.py --engines [max_nodes] [case_filename.in ...]
+
+	max_nodes defaults to 200000, and the cases default
+	to cases/7.in through cases/10.in. Runs that exhaust
+	max_nodes are reported with a trailing "+". The
+	orderings are compared with ORDERING_STRATEGY, without
+	the endgame table and pattern database, which would
+	otherwise solve most cases before the ordering counts.
+
+	--tune times every configuration in TUNE_CONFIGS on
+	the files in cases/ and on TUNE_GAMES random games,
+	and saves the fastest configuration per profile as
+	the strategy table, see strategy.py.
+
+	--engines compares the engines of ENGINES, without
+	forced swaps, on the given cases, by default random
+	games of ENGINE_GAMES. Nodes of the "sat" engine are
+	conflicts of its solver, see sat.py.
+"""
+DEFAULT_CASES = ["cases/7.in", "cases/8.in", "cases/9.in", "cases/10.in"]
+DEFAULT_MAX_NODES = 200000
+ORDERINGS = ["none", "history"]
+ORDERING_STRATEGY = {"endgame": False, "patterns": False}
+
+TUNE_CASES = ["cases/{}.in".format(i) for i in range(1, 11)]
+TUNE_GAMES = [(3, 4), (3, 6), (4, 6), (4, 8), (4, 10), (5, 8), (5, 10)]
+TUNE_SEEDS = range(4)
+TUNE_CONFIGS = [
+	{"engine": "dfs", "successors": successors, "ordering": ordering,
+		"deterministic": deterministic, "propagate": propagate,
+		"seed": None}
+	for successors, ordering, deterministic, propagate in itertools.product(
+		["unsorted", "sorted"], ["history", "none"], [True, False],
+		[False, True])
+]
+
+ENGINES = ["dfs", "sat"]
+ENGINE_GAMES = [(5, 12), (5, 14), (6, 14), (6, 16)]
+
+def random_game(n, moves, seed):
+	"""
+	random_game
+		makes a solvable game by undoing random swaps from
+		the solved grid. Each undone swap must be one the
+		game allows forwards, so a block given back its last
+		swap must have come from its color row.
+
+	Parameters
+		n: side length of game
+		moves: number of swaps needed to solve the game
+		seed: seed for the random choices
+
+	Return
+		{n: n, colors: list, swaps: list}
+	"""
+	rng = random.Random(seed)
+	colors = [index // n for index in range(n**2)]
+	swaps = [0] * n**2
+
+	pairs = [(index1, index2)
+		for index1 in range(n**2) for index2 in range(index1 + 1, n**2)
+		if index1 // n == index2 // n or index1 % n == index2 % n]
+
+	made = 0
+	while made < moves:
+		index1, index2 = rng.choice(pairs)
+
+		# the blocks move back to the other cell
+		if (swaps[index1] == 0 and colors[index1] != index1 // n) or \
+			(swaps[index2] == 0 and colors[index2] != index2 // n):
+			continue
+
+		colors[index1], colors[index2] = colors[index2], colors[index1]
+		swaps[index1], swaps[index2] = swaps[index2] + 1, swaps[index1] + 1
+		made += 1
+
+	return {"n": n, "colors": colors, "swaps": swaps}
+
+def run(data, max_nodes, **options):
+	"""
+	run
+		solves one game with fresh history and transposition
+		tables and the given Harmony options
+
+	Parameters
+		data: dictionary mapping n, colors, and swaps for
+			a given initial state of the game
+		max_nodes: node budget for the search
+		options: keyword arguments passed to Harmony
+
+	Return
+		(nodes, seconds, solved): solved is True or False if
+			the search finished, None if it ran out of nodes
+	"""
+	Harmony.history.clear()
+	reset_tables()
+	harmony = Harmony(data["n"], list(data["colors"]),
+		list(data["swaps"]), max_nodes = max_nodes, **options)
+
+	start = time.time()
+	try:
+		solved = harmony.solve() is not None
+	except SearchLimit:
+		solved = None
+
+	return (harmony.nodes, time.time() - start, solved)
+
+def tune(max_nodes):
+	"""
+	tune
+		times every configuration of TUNE_CONFIGS on the
+		tuning games and saves the strategy table. Runs
+		that exhaust max_nodes count as twice the slowest
+		finished run of their profile. A configuration that
+		answers None for a game with a solution, as forced
+		swaps may, is not chosen for its profile. Random
+		games have one, and a file in cases/ has one if any
+		configuration finds it.
+
+	Parameters
+		max_nodes: node budget for each run
+
+	Return
+		dict mapping profile keys to configurations
+	"""
+	# (game, whether it is known to have a solution)
+	games = [(get_harmony_text(filename), False) for filename in TUNE_CASES]
+	for (n, moves), seed in itertools.product(TUNE_GAMES, TUNE_SEEDS):
+		games.append((random_game(n, moves, seed), True))
+
+	# profile -> list of per-game lists of seconds per config
+	timings = {}
+	# profile -> indices of configs that missed a solution
+	wrong = {}
+	for data, solvable in games:
+		key = strategy.profile(strategy.features(
+			data["n"], data["colors"], data["swaps"]))
+
+		seconds = []
+		answers = []
+		for config in TUNE_CONFIGS:
+			nodes, elapsed, solved = run(data, max_nodes,
+				strategy = config)
+			seconds.append(None if solved is None else elapsed)
+			answers.append(solved)
+
+		if solvable or True in answers:
+			for i, solved in enumerate(answers):
+				if solved is False:
+					wrong.setdefault(key, set()).add(i)
+
+		timings.setdefault(key, []).append(seconds)
+
+	table = {}
+	for key, runs in sorted(timings.items()):
+		finished = [t for seconds in runs for t in seconds if t is not None]
+		candidates = [i for i in range(len(TUNE_CONFIGS))
+			if i not in wrong.get(key, ())]
+		if not finished or not candidates:
+			continue
+
+		penalty = 2 * max(finished)
+		totals = dict((i, sum(penalty if seconds[i] is None else seconds[i]
+			for seconds in runs)) for i in candidates)
+		best = min(candidates, key = lambda i: totals[i])
+		table[key] = TUNE_CONFIGS[best]
+
+		print("{:<14}{:>4} games  {}".format(key, len(runs),
+			sorted(TUNE_CONFIGS[best].items())))
+
+	strategy.save_table(table)
+	return table
+
+def compare_engines(max_nodes, cases):
+	"""
+	compare_engines
+		prints nodes and seconds per game for each engine
+		of ENGINES
+
+	Parameters
+		max_nodes: node budget for each run
+		cases: case filenames, or None for random games of
+			ENGINE_GAMES
+	"""
+	if cases:
+		games = [(filename, get_harmony_text(filename)) for filename in cases]
+	else:
+		games = [("random {}:{}:{}".format(n, moves, seed),
+			random_game(n, moves, seed))
+			for (n, moves), seed in itertools.product(ENGINE_GAMES, TUNE_SEEDS)]
+
+	print("{:<18}{:>8}{:>12}{:>10}{:>8}".format(
+		"game", "engine", "nodes", "seconds", "solved"))
+
+	for name, data in games:
+		for engine in ENGINES:
+			nodes, seconds, solved = run(data, max_nodes,
+				strategy = {"engine": engine, "deterministic": False})
+			nodes = str(nodes) + ("+" if solved is None else "")
+
+			print("{:<18}{:>8}{:>12}{:>10.3f}{:>8}".format(
+				name, engine, nodes, seconds, str(solved)))
+
+def main():
+	"""
+	main
+		prints nodes and seconds per case for each move
+		ordering, compares the engines, or tunes the strategy
+		table
+	"""
+	args = sys.argv[1:]
+	tuning = "--tune" in args
+	if tuning:
+		args.remove("--tune")
+	engines = "--engines" in args
+	if engines:
+		args.remove("--engines")
+
+	max_nodes = DEFAULT_MAX_NODES
+	if args and args[0].isdigit():
+		max_nodes = int(args.pop(0))
+
+	if tuning:
+		tune(max_nodes)
+		return
+	if engines:
+		compare_engines(max_nodes, args)
+		return
+
+	cases = args or DEFAULT_CASES
+
+	print("{:<14}{:>12}{:>12}{:>10}".format(
+		"case", "ordering", "nodes", "seconds"))
+
+	for filename in cases:
+		data = get_harmony_text(filename)
+		for ordering in ORDERINGS:
+			nodes, seconds, solved = run(data, max_nodes,
+				ordering = ordering, strategy = ORDERING_STRATEGY)
+			nodes = str(nodes) + ("+" if solved is None else "")
+
+			print("{:<14}{:>12}{:>12}{:>10.3f}".format(
+				filename, ordering, nodes, seconds))
+
+if __name__ == "__main__":
+	main()
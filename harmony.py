@@ -1,5 +1,21 @@
 import sys
 import copy
+import random
+import multiprocessing
+from strategy import select as strategy_select
+import tablebase
+import pattern
+import twophase
+import mitm
+import sat
+import transposition
+import tracer
+import memory
+
+try:
+	import Queue as queue
+except ImportError:
+	import queue
 
 """
 Harmony 3 is an iOS game that prompts the user to
@@ -22,7 +38,100 @@ Version
 """
 debug = False
 
-class Harmony():
+# most swaps of a path searched without a node budget
+MAX_LEN = 12
+
+# puzzles solve_many keeps in flight per worker
+WINDOW_PER_WORKER = 2
+
+# seconds solve_many waits for an answer before it checks
+# that its workers are alive
+POLL_SECONDS = 0.5
+
+# per process, side length -> TranspositionTable reused by
+# every search of that size in this process, see process_table
+_tables = {}
+
+class SearchLimit(Exception):
+	"""
+	SearchLimit is raised by find_path when a search that
+	was given a node budget runs out of nodes before it
+	either finds a path or exhausts the tree.
+	"""
+	pass
+
+def luby(i):
+	"""
+	luby
+		returns the ith term, from 1, of the Luby sequence
+		1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ...
+	"""
+	k = 1
+	while (1 << k) - 1 < i:
+		k += 1
+
+	if i == (1 << k) - 1:
+		return 1 << (k - 1)
+	return luby(i - (1 << (k - 1)) + 1)
+
+class Geometry(object):
+	"""
+	Geometry holds the tables of the grid that depend on the
+	side length alone. They are built once per side length,
+	see geometry, and shared by every game of that size, so
+	they are tuples that no game changes.
+
+	Instance Variables
+		n: side length of game
+		rows: the row of each list index
+		cols: the column of each list index
+		partners: tuples of the list indices in line with
+			each index, excluding the index itself, its row
+			from left to right then its column from top to
+			bottom
+		row_masks: bitmasks of the cells of each row
+		line_masks: bitmasks, by list index, of the cells of
+			partners. Bit i of a mask stands for list index i.
+	"""
+	__slots__ = ["n", "rows", "cols", "partners", "row_masks",
+		"line_masks"]
+
+	def __init__(self, n):
+		"""
+		Constructor
+			builds the tables of side length n
+		"""
+		self.n = n
+		self.rows = tuple(index // n for index in range(n**2))
+		self.cols = tuple(index % n for index in range(n**2))
+
+		partners = []
+		for index in range(n**2):
+			i, j = self.rows[index], self.cols[index]
+			horizontal = [i*n + y for y in range(n) if y != j]
+			vertical = [x*n + j for x in range(n) if x != i]
+			partners.append(tuple(horizontal + vertical))
+		self.partners = tuple(partners)
+
+		self.row_masks = tuple(((1 << n) - 1) << (row * n)
+			for row in range(n))
+		self.line_masks = tuple(sum(1 << partner for partner in line)
+			for line in self.partners)
+
+_geometries = {}
+
+def geometry(n):
+	"""
+	geometry
+		returns the Geometry of side length n, shared by
+		every caller in this process
+	"""
+	shape = _geometries.get(n)
+	if shape is None:
+		shape = _geometries[n] = Geometry(n)
+	return shape
+
+class Harmony(object):
 	"""
 	Harmony represents the grid of the game, which
 	is an n by n square. The grid is indexed (0,0)
@@ -37,36 +146,151 @@ class Harmony():
 			a grid going from top left to bottom right. The
 			number of swaps is s >= 0.
 
-		list_to_grid: dictionary mapping one-dimensional list
-			indices to their equivalent (i, j) tuple form
-		grid_to_list: dictionary mapping (i, j) tuples to
-			their equivalent list index forms
+		rows: the row of each list index
+		cols: the column of each list index
+		partners: tuples of the list indices in line with each
+			index, see Geometry
 
 		swaps_left: number of total swaps remaining among
 			all blocks in grid.
-		swapping_points: dict keyed by list integer indices
-			that, at the any point in the game, follow the
-			property that swaps[index] has > 0 swaps. Used for 
-			O(1) deletion and insertion.
-		one_swap_points: dict keyed by list integer indices
-			that, at the any point in the game, follow the
-			property that swaps[index] = 1. Used for trivial
-			swapping cases to reduce search space.
-
-		get_swappable: successor function to use. If long path,
-			use successors sorted by increasing possible swaps
+		misplaced: number of blocks whose color is not the
+			row they are in. The game is solved when both
+			swaps_left and misplaced are 0.
+		active: list of the list indices of blocks with > 0
+			swaps at the start. Only these blocks ever move,
+			so the search only looks at their cells, see
+			compact.
+		links: length n^2 list of tuples of the cells of active
+			in line with each index, in the order of partners
+		frozen_misplaced: number of blocks with no swaps at the
+			start outside their color row. The game cannot be
+			solved unless it is 0.
+		stride: one more than the most swaps of any block
+		next_node, prev_node: links of a bucket queue of the
+			blocks with > 0 swaps, keyed by swap count. Node
+			swaps heads bucket swaps, and each block is linked
+			into the bucket of its swaps by a node of its own.
+			swap and unswap relink the two blocks in O(1), and
+			unswap restores every bucket to its order before
+			the swap.
+		node_cell: list mapping each node to the list index of
+			its block
+		cell_node: list mapping each list index to the node
+			of its block, or None if it has no swaps left
+		free_node: next node to hand out. swap takes a new
+			node for a block that changes bucket, and unswap
+			gives it back.
+		moved_nodes: stack of the nodes swap took blocks off,
+			for unswap to put back
+
+		line_masks: bitmasks, by list index, of the other
+			cells in its row and column, see Geometry
+		row_masks: bitmasks of the cells of each row
+		active_mask: bitmask of the blocks with > 0 swaps
+		one_mask: bitmask of the blocks with exactly 1 swap
+		color_masks: list of bitmasks of the blocks of each
+			color. swap and unswap keep the last three up to
+			date, see legal_mask.
+
+		strategy: configuration dict chosen by strategy.select
+			and the constructor overrides
+		engine: name of the search engine solve runs, "dfs",
+			"twophase", see twophase.py, "mitm", see mitm.py, or
+			"sat", see sat.py
+		deterministic: whether solve makes the forced swaps
+			of colinear one-swap blocks before searching
+		propagate: whether find_path makes those swaps again
+			after every swap it tries
+		backjump: whether find_path explains its failures by
+			conflict sets and jumps back over swaps that had no
+			part in them, see find_path
+		conflict: set of list indices explaining the last
+			failure of find_path, or None if it depends on the
+			whole board, see explain
+		rng: random.Random shuffling the order of moves before
+			they are ordered, if the strategy has a seed
+		tablebase: endgame table of size n, see tablebase.py,
+			if the strategy uses one and it has been generated
+		patterns: pattern database of size n, see pattern.py,
+			if the strategy uses one, it has been built, and
+			there are n blocks of each color
+		transpositions: table of positions without a solution,
+			see transposition.py, while search runs and the
+			strategy uses one. The table attached to a worker
+			process is shared with the other workers, and any
+			other table with every search of the same size in
+			the process, see process_table.
+		known: None, or a mapping of positions on a solution
+			found before, as (tuple(colors), tuple(swaps)), to
+			the swap to make next. A search that reaches one
+			follows it instead of searching, see follow_known.
+		get_swappable: successor function to use, with
+			successors sorted by increasing possible swaps
+			if the strategy says "sorted"
+
+		ordering: "history" to try killer moves and moves with
+			a good history first, "none" for the fixed row then
+			column order of valid_moves
+		killers: list indexed by search depth of up to
+			KILLER_SLOTS swap pairs that most recently led the
+			search deepest from that depth
+		history: class-level memory.Cache shared by all games,
+			keyed by (n, index1, index2) with index1 < index2 or
+			by (n, index), scoring how often a swap pair or a
+			block has led toward solutions. It counts against
+			the process's memory budget, which may drop its
+			oldest scores.
+		nodes: number of swaps made by the search so far
+		deepest: longest path reached in the current subtree
+		max_nodes: node budget for the search, or None
+		pause: None, or a function the search calls with the
+			game once nodes reaches pause_at, to hand control
+			back to its caller for a while, see stepper.py. It
+			sets the next pause_at, and may raise SearchLimit
+			to stop the search. Only the search of this
+			process pauses, not worker processes.
+		pause_at: node count of the next call to pause
+		trace: class-level None, as a Harmony is not traced.
+			See TracedHarmony.
+		budget: memory.MemoryBudget of the search, made by
+			search from the strategy's memory unless given,
+			see memory.py
+
+	Compatibility
+		list_to_grid, grid_to_list, adjacent_points,
+		swapping_points and one_swap_points are built on
+		request from rows, cols, partners and swaps, in the
+		dict forms the solver used to keep.
 	"""
+	__slots__ = ["n", "colors", "swaps", "rows", "cols", "partners",
+		"swaps_left", "misplaced", "active", "links", "frozen_misplaced",
+		"stride", "next_node",
+		"prev_node", "node_cell", "cell_node", "free_node", "moved_nodes",
+		"line_masks", "row_masks", "active_mask", "one_mask", "color_masks",
+		"strategy", "engine", "deterministic", "propagate", "backjump",
+		"conflict", "rng",
+		"get_swappable", "ordering", "killers", "nodes", "deepest",
+		"max_nodes", "pause", "pause_at", "budget", "tablebase",
+		"patterns", "transpositions", "known"]
+
+	KILLER_SLOTS = 2
+	history = memory.Cache(memory.process_budget(), 0)
+
+	# no game is traced unless made a TracedHarmony, so that
+	# the others need not set up a tracer of their own
+	trace = None
 
 	################################
 	# Constructor, index arithmetic
 	################################
 
-	def __init__(self, n = 0, colors = None, swaps = None):
+	def __init__(self, n = 0, colors = None, swaps = None,
+		ordering = None, max_nodes = None, strategy = None):
 		"""
 		Constructor
 			initializes n, colors, and swaps as provided.
-			Determines swaps_left and creates a list of
-			swapping_points from which to begin the search
+			Determines swaps_left and queues the blocks
+			from which to begin the search
 
 		Parameters
 			n: side length of game
@@ -77,7 +301,14 @@ class Harmony():
 				required for each block, from left
 				to right, top to bottom. For this game,
 				number of swaps >= 0
-		"""		
+			ordering: "history" or "none", see move_order.
+				Overrides the ordering of the strategy.
+			max_nodes: if given, find_path raises SearchLimit
+				after this many swaps instead of searching on
+			strategy: dict of configuration keys, as described
+				in strategy.py, overriding the ones chosen
+				for this position
+		"""
 		# if one is not provided, then we cannot have
 		# a valid game
 		if not colors or not swaps:
@@ -94,54 +325,74 @@ class Harmony():
 		# maintain swaps_left for O(1) checking search over
 		self.swaps_left = sum(swaps)
 
-		# if long path, use guided search
-		SWAP_CHANGE_LEN = 8
-		MAX_LEN = 12
+		# a node budget bounds the search on its own
+		if self.swaps_left > MAX_LEN * 2 and max_nodes is None:
+			self.usage(2)
+
+		# pick the search configuration for this position
+		self.strategy = strategy_select(n, colors, swaps)
+		self.strategy.update(strategy or {})
+		if ordering is not None:
+			self.strategy["ordering"] = ordering
+
+		self.engine = self.strategy["engine"]
+		self.deterministic = self.strategy["deterministic"]
+		self.propagate = self.strategy["propagate"]
+		self.backjump = self.strategy["backjump"]
+		self.conflict = None
+
+		self.rng = None
+		if self.strategy["seed"] is not None:
+			self.rng = random.Random(self.strategy["seed"])
 
-		if self.swaps_left > SWAP_CHANGE_LEN * 2:
+		self.tablebase = None
+		if self.strategy["endgame"]:
+			self.tablebase = tablebase.get(n)
+
+		self.patterns = None
+		if self.strategy["patterns"] and \
+			all(colors.count(color) == n for color in range(n)):
+			self.patterns = pattern.get(n)
+
+		self.transpositions = None
+		self.known = None
+
+		if self.strategy["successors"] == "sorted":
 			self.get_swappable = self.get_swappable_sorted
 		else:
 			self.get_swappable = self.get_swappable_unsorted
 
-		if self.swaps_left > MAX_LEN * 2:
-			self.usage(2)
-
-		# index manipulation initialization
-		self.list_to_grid = {}
-		self.grid_to_list = {}
-
-		l2g = self.list_to_grid # faster calls
-		g2l = self.grid_to_list
-
-		for i in range(n):
-			for j in range(n):
-				grid_ind = (i, j)
-				list_ind = i*n + j
-				
-				l2g[list_ind] = grid_ind
-				g2l[grid_ind] = list_ind
-
-		# get one swap points for faster end condition
-		# get starting points, where swaps > 0
-		# other valid points, if not here, will be added
-		# as the algorithm runs
-		self.one_swap_points = {}
-		self.swapping_points = {}
-		for i in range(n**2):
-			swap = swaps[i]
-			if swap > 0: # can start from this point
-				self.swapping_points[i] = True
-				if swap == 1: # deterministic swaps
-					self.one_swap_points[i] = True
-
-		# for faster checking of valid swaps
-		# stored in list index format
-		self.adjacent_points = {}
-		for i in range(n):
-			for j in range(n):
-				horizontal = [g2l[(i, y)] for y in range(n)]
-				vertical = [g2l[(x, j)] for x in range(n)]
-				self.adjacent_points[g2l[(i, j)]] = horizontal + vertical
+		# move ordering and search statistics
+		self.ordering = self.strategy["ordering"]
+		self.killers = [[] for _ in range(self.swaps_left // 2 + 1)]
+		self.nodes = 0
+		self.deepest = 0
+		self.max_nodes = max_nodes
+		self.pause = None
+		self.pause_at = 0
+		self.budget = None
+
+		# index manipulation and valid swap tables, shared
+		# by every game of this size
+		shape = geometry(n)
+		self.rows = shape.rows
+		self.cols = shape.cols
+		self.partners = shape.partners
+		self.row_masks = shape.row_masks
+		self.line_masks = shape.line_masks
+
+		# count blocks outside their color row, kept up to
+		# date by swap, unswap and set_value
+		self.misplaced = 0
+		for index in range(n**2):
+			if colors[index] != self.rows[index]:
+				self.misplaced += 1
+
+		# queue the starting points, where swaps > 0, by
+		# swap count
+		self.compact()
+		self.build_buckets()
+		self.build_masks()
 
 	def usage(self, state):
 		"""
@@ -158,16 +409,16 @@ class Harmony():
 				2 represents wrong color configuration,
 				e.g. not the same number of each color.
 		"""
-		print "Your input file is improperly formatted."
+		print("Your input file is improperly formatted.")
 
 		if state == 0:
-			print "Please provide colors and/or swaps"
+			print("Please provide colors and/or swaps")
 		elif state == 1:
-			print "Wrong list size for color or swaps."
+			print("Wrong list size for color or swaps.")
 		elif state == 2:
-			print "Sorry we can't solve paths this long yet!"
+			print("Sorry we can't solve paths this long yet!")
 		else: # currently unused, may implement in future
-			print "Not the same number of blocks per color."
+			print("Not the same number of blocks per color.")
 		sys.exit(1)
 
 	def get(self, index):
@@ -259,12 +510,20 @@ class Harmony():
 			(color, swaps): if the index is valid
 		"""
 		try:
+			row = self.rows[index]
+			self.misplaced += (color != row) - (self.colors[index] != row)
+
 			self.colors[index] = color
 			self.swaps[index] = swaps
-			return (color, swaps)
 		except:
 			raise KeyError("Invalid grid index {}.".format(index))
 
+		self.swaps_left = sum(self.swaps)
+		self.compact()
+		self.build_buckets()
+		self.build_masks()
+		return (color, swaps)
+
 	# deprecated
 	def set_value_by_pair(self, pair, item):
 		"""
@@ -300,9 +559,9 @@ class Harmony():
 		Return
 			two-dimensional (i, j) representation of index
 		"""
-		# integer division
-		return self.list_to_grid[index]
-		# return (index / self.n, index % self.n)
+		if not self.valid_index(index):
+			raise KeyError(index)
+		return (self.rows[index], self.cols[index])
 
 	def grid_to_list_index(self, index):
 		"""
@@ -315,8 +574,67 @@ class Harmony():
 		Return
 			one-dimensional representation of (i, j)
 		"""
-		return self.grid_to_list[index]
-		# return i * self.n + j
+		i, j = index
+		if not (0 <= i < self.n and 0 <= j < self.n):
+			raise KeyError(index)
+		return i * self.n + j
+
+	@property
+	def list_to_grid(self):
+		"""
+		list_to_grid
+			dictionary mapping one-dimensional list indices
+			to their equivalent (i, j) tuple form. Built on
+			each request, for compatibility only.
+		"""
+		return dict((index, (self.rows[index], self.cols[index]))
+			for index in range(self.n**2))
+
+	@property
+	def grid_to_list(self):
+		"""
+		grid_to_list
+			dictionary mapping (i, j) tuples to their
+			equivalent list index forms. Built on each
+			request, for compatibility only.
+		"""
+		return dict(((self.rows[index], self.cols[index]), index)
+			for index in range(self.n**2))
+
+	@property
+	def adjacent_points(self):
+		"""
+		adjacent_points
+			dictionary mapping each list index to the list
+			of its row then its column, both including the
+			index itself. Built on each request, for
+			compatibility only.
+		"""
+		n = self.n
+		return dict((index,
+			[self.rows[index]*n + y for y in range(n)] +
+			[x*n + self.cols[index] for x in range(n)])
+			for index in range(n**2))
+
+	@property
+	def swapping_points(self):
+		"""
+		swapping_points
+			dictionary keyed by the list indices of blocks
+			with > 0 swaps. Built on each request, for
+			compatibility only.
+		"""
+		return dict((index, True) for index in self.get_swappable_unsorted())
+
+	@property
+	def one_swap_points(self):
+		"""
+		one_swap_points
+			dictionary keyed by the list indices of blocks
+			with one swap. Built on each request, for
+			compatibility only.
+		"""
+		return dict((index, True) for index in self.get_one_swappable())
 
 	def valid_index(self, index):
 		"""
@@ -365,10 +683,8 @@ class Harmony():
 				return False
 		"""
 		# now check if index1 and index2 are colinear
-		i1, j1 = self.list_to_grid[index1]
-		i2, j2 = self.list_to_grid[index2]
-
-		return (i1 == i2 or j1 == j2)
+		return (self.rows[index1] == self.rows[index2] or
+			self.cols[index1] == self.cols[index2])
 
 	################################
 	# Basic logic rules for the game
@@ -390,26 +706,10 @@ class Harmony():
 				both have > 0 swaps available
 			False: otherwise
 		"""
-		# cannot swap with itself
-		if index1 == index2:
+		# a block is never in line with itself, see legal_mask
+		if not self.valid_index(index2):
 			return False
-
-		if self.indices_in_line(index1, index2):
-			color1, swap1 = self.get(index1)
-			color2, swap2 = self.get(index2)
-
-			# don't allow impossible situations
-			# if swap to a row that is impossible
-			if ((swap1 < 2 and 
-			    color1 != self.list_to_grid[index2][0]) or
-				(swap2 < 2 and 
-				color2 != self.list_to_grid[index1][0])):
-				return False
-
-			return (swap1 > 0 and swap2 > 0)
-
-		# else indices not in line
-		return False
+		return bool(self.legal_mask(index1) >> index2 & 1)
 
 	def has_swaps_left(self):
 		"""
@@ -437,19 +737,22 @@ class Harmony():
 				in order of color by row
 			False: otherwise
 		"""
-		# must use all swaps
-		if self.has_swaps_left():
-			return False
+		# must use all swaps, and check row number only
+		return self.swaps_left == 0 and self.misplaced == 0
 
-		for i in range(self.n):
-			for j in range(self.n):
-				index = self.grid_to_list[(i, j)]
-				# check row number only
-				if self.colors[index] != i:
-					return False
+	def dead_end(self):
+		"""
+		dead_end
+			returns whether the game can no longer be solved
+			because there are fewer swaps left than misplaced
+			blocks. Every misplaced block has to use at least
+			one of its own swaps to reach its row.
 
-		# no swaps left, all colors in order
-		return True
+		Return
+			True: if misplaced > swaps_left
+			False: otherwise
+		"""
+		return self.misplaced > self.swaps_left
 
 	################################
 	# Pathfinding helper functions
@@ -468,31 +771,609 @@ class Harmony():
 			[index1, index2, ...] of valid swaps starting
 			from the given index
 		"""
-		# overlap of index itself is okay since valid_swap
-		# catches not swapping with itself
-		possible_moves = self.adjacent_points[index]
- 		valid_moves = []
+		return self.mask_moves(index, self.legal_mask(index))
+
+	def mask_moves(self, index, mask):
+		"""
+		mask_moves
+			returns the list indices of the bits of a mask of
+			candidates from the given index, the ones in its
+			row first, each line in list index order
+
+		Parameters
+			index: list integer index
+			mask: bitmask of cells in line with index
+
+		Return
+			[index1, index2, ...]
+		"""
+		row = mask & self.row_masks[self.rows[index]]
+
+		moves = []
+		for bits in (row, mask ^ row):
+			while bits:
+				low = bits & -bits
+				moves.append(low.bit_length() - 1)
+				bits ^= low
+
+		return moves
+
+	def legal_mask(self, index):
+		"""
+		legal_mask
+			returns the bitmask of the valid swapping
+			candidates from the given index, see valid_moves.
+			Both blocks need swaps left, and a block on its
+			last swap must land in the row of its color.
+
+		Parameters
+			index: list integer index
+
+		Return
+			bitmask, bit i set if list index i is a candidate
+		"""
+		swaps = self.swaps[index]
+		if swaps < 1:
+			return 0
+
+		mask = self.line_masks[index] & self.active_mask
+		if swaps < 2:
+			mask &= self.row_masks[self.colors[index]]
+
+		# partners on their last swap must be of this row's color
+		return mask & ~(self.one_mask &
+			~self.color_masks[self.rows[index]])
+
+	def move_order(self, index, depth, expanded = 0, pruned = None):
+		"""
+		move_order
+			returns the valid moves from the given index in
+			the order the search should try them. With history
+			ordering, killer moves for this depth come first,
+			then the rest by decreasing history score. Ties
+			keep the row then column order of valid_moves,
+			shuffled if the strategy has a seed.
+
+			With a pattern database, moves that leave the
+			pattern of either block's color infeasible are
+			dropped, and cheaper moves are tried first, after
+			killer moves.
+
+		Parameters
+			index: list integer index
+			depth: number of swaps already on the path
+			expanded: bitmask of the cells whose swaps were
+				already tried, left out of the moves
+			pruned: list the moves dropped by the pattern
+				database are added to, as (index, move), or None
+
+		Return
+			[index1, index2, ...] of valid swaps starting
+			from the given index, best first
+		"""
+		moves = self.mask_moves(index, self.legal_mask(index) & ~expanded)
+		if self.rng is not None:
+			self.rng.shuffle(moves)
+
+		# drop moves that lose a pattern, cheapest first
+		costs = None
+		if self.patterns is not None:
+			costs = dict((move, self.pattern_cost(index, move))
+				for move in moves)
+			if pruned is not None:
+				pruned.extend((index, move) for move in moves
+					if costs[move] >= pattern.INFEASIBLE)
+			if self.trace is not None:
+				for move in moves:
+					if costs[move] >= pattern.INFEASIBLE:
+						self.trace.record(tracer.PRUNE, tracer.PATTERN, depth,
+							index, move)
+			moves = [move for move in moves
+				if costs[move] < pattern.INFEASIBLE]
+			moves.sort(key = costs.get)
+
+		if self.ordering != "history" or len(moves) < 2:
+			return moves
+
+		n = self.n
+		history = self.history
+		killers = self.killers[depth]
+		slots = self.KILLER_SLOTS
+
+		def score(move):
+			pair = (index, move) if index < move else (move, index)
+			cost = -costs[move] if costs else 0
+			if pair in killers:
+				return (slots - killers.index(pair), cost, 0)
+			return (0, cost, history.get((n,) + pair, 0))
+
+		# reverse keeps ties in their original order
+		moves.sort(key = score, reverse = True)
+		return moves
+
+	def moves(self, depth, pruned = None):
+		"""
+		moves
+			yields every valid swap of the current position
+			once, as (index1, index2) with index1 the block the
+			swap is tried from. Blocks come in the order of
+			successors, and each block's swaps in the order of
+			move_order, leaving out the blocks before it, whose
+			swaps with it were already tried.
+
+			Like swappable, this walks the board as it is when
+			each swap is asked for, so the caller must undo its
+			swaps before asking for the next.
+
+		Parameters
+			depth: number of swaps already on the path
+			pruned: list the swaps dropped by the pattern
+				database are added to, or None
+
+		Return
+			generator of (index1, index2)
+		"""
+		expanded = 0
+		for index1 in self.successors(depth):
+			for index2 in self.move_order(index1, depth, expanded, pruned):
+				yield (index1, index2)
+			expanded |= 1 << index1
+
+	def successors(self, depth):
+		"""
+		successors
+			returns the blocks the search may start its next
+			swap from, in the order to try them. Sorted
+			successors that need no reordering are walked in
+			the bucket queue itself, see swappable.
+
+		Parameters
+			depth: number of swaps already on the path
+
+		Return
+			list or iterator of list integer indices
+		"""
+		if self.ordering != "history" and self.rng is None and \
+			self.strategy["successors"] == "sorted":
+			return self.swappable()
+		return self.start_order(self.get_swappable(), depth)
+
+	def start_order(self, remaining, depth):
+		"""
+		start_order
+			reorders the blocks the search may start its next
+			swap from. With history ordering, blocks in killer
+			moves for this depth come first, then the rest by
+			decreasing history score of the block. Ties keep
+			the order of get_swappable, shuffled if the
+			strategy has a seed.
+
+		Parameters
+			remaining: list of swappable list integer indices
+			depth: number of swaps already on the path
+
+		Return
+			remaining, reordered in place
+		"""
+		if self.rng is not None:
+			self.rng.shuffle(remaining)
+
+		if self.ordering != "history" or len(remaining) < 2:
+			return remaining
+
+		n = self.n
+		history = self.history
+		killer_cells = []
+		for pair in self.killers[depth]:
+			killer_cells.extend(pair)
+		slots = len(killer_cells)
+
+		def score(index):
+			if index in killer_cells:
+				return (slots - killer_cells.index(index), 0)
+			return (0, history.get((n, index), 0))
+
+		remaining.sort(key = score, reverse = True)
+		return remaining
+
+	def pattern_cost(self, index1, index2):
+		"""
+		pattern_cost
+			returns the total pattern cost of the colors of
+			the blocks at index1 and index2 after swapping
+			them, without changing the board
+
+		Parameters
+			index1: list integer index
+			index2: list integer index
+
+		Return
+			sum of the costs: if both patterns are feasible
+			pattern.INFEASIBLE: otherwise
+		"""
+		colors = self.colors
+		swaps = self.swaps
+		color1, swap1 = colors[index1], swaps[index1]
+		color2, swap2 = colors[index2], swaps[index2]
+
+		colors[index1], swaps[index1] = color2, swap2 - 1
+		colors[index2], swaps[index2] = color1, swap1 - 1
+		try:
+			cost = self.patterns.cost(colors, swaps, color1)
+			if color2 != color1 and cost < pattern.INFEASIBLE:
+				cost += self.patterns.cost(colors, swaps, color2)
+		finally:
+			colors[index1], swaps[index1] = color1, swap1
+			colors[index2], swaps[index2] = color2, swap2
+
+		return min(cost, pattern.INFEASIBLE)
+
+	def pattern_dead(self):
+		"""
+		pattern_dead
+			returns whether the pattern of some color can no
+			longer be solved, see pattern.py
+
+		Return
+			True: if there is a pattern database and one of
+				the current patterns is infeasible
+			False: otherwise
+		"""
+		if self.patterns is None:
+			return False
+		return pattern.INFEASIBLE in self.patterns.costs(self.colors,
+			self.swaps)
+
+	def spend_node(self):
+		"""
+		spend_node
+			counts one swap made by a search engine against
+			the node budget
+
+		Raises
+			SearchLimit: if more than max_nodes swaps are made,
+				or pause stops the search
+		"""
+		self.nodes += 1
+		if self.max_nodes is not None and self.nodes > self.max_nodes:
+			raise SearchLimit(self.nodes)
+		if self.pause is not None and self.nodes >= self.pause_at:
+			self.pause(self)
+
+	def estimate_cost(self, samples = 32, seed = None):
+		"""
+		estimate_cost
+			estimates the number of swaps a full search of the
+			game would make, by Knuth's method: each probe
+			follows random moves from the start, and the product
+			of the number of moves at every depth along the way
+			estimates the size of that level of the tree. The
+			estimate is the mean over the probes, with a 95%
+			confidence interval. The board is left as it was.
+
+		Parameters
+			samples: number of probes
+			seed: None, or a seed for the random moves
+
+		Return
+			(estimate, low, high) numbers of swaps
+		"""
+		rng = random.Random(seed)
+		estimates = [self.probe(rng) for _ in range(samples)]
+
+		mean = float(sum(estimates)) / samples
+		variance = 0.0
+		if samples > 1:
+			variance = sum((estimate - mean)**2
+				for estimate in estimates) / (samples - 1)
+		margin = 1.96 * (variance / samples)**0.5
+
+		return (mean, max(mean - margin, 0.0), mean + margin)
+
+	def probe(self, rng):
+		"""
+		probe
+			makes random moves from the current position until
+			the search would stop there, and undoes them, see
+			estimate_cost
+
+		Parameters
+			rng: random.Random choosing the moves
+
+		Return
+			estimated number of swaps below the position
+		"""
+		path = []
+		estimate = 0.0
+		level = 1.0
+
+		try:
+			while self.has_swaps_left() and not self.dead_end() and \
+				not self.in_endgame():
+				# in a fixed order, so that the moves the search
+				# has learned to try first do not sway the probe
+				moves = sorted(self.moves(len(path)))
+				if not moves:
+					break
+
+				level *= len(moves)
+				estimate += level
+
+				index1, index2 = rng.choice(moves)
+				self.swap(index1, index2)
+				path.append((index1, index2))
+		finally:
+			for index1, index2 in reversed(path):
+				self.unswap(index1, index2)
+
+		return estimate
+
+	def record_progress(self, depth, index1, index2, reached):
+		"""
+		record_progress
+			credits the swap (index1, index2) made at depth for
+			leading the search down to depth reached. The swap
+			becomes the first killer move at its depth, and its
+			history score grows with the depth it gained.
+
+		Parameters
+			depth: number of swaps on the path before this one
+			index1: list integer index
+			index2: list integer index
+			reached: deepest path length found below this swap
+		"""
+		pair = (index1, index2) if index1 < index2 else (index2, index1)
+
+		killers = self.killers[depth]
+		if pair in killers:
+			killers.remove(pair)
+		killers.insert(0, pair)
+		del killers[self.KILLER_SLOTS:]
+
+		# score the pair, and each block for start_order. Only
+		# new keys go through the cache, to count their bytes.
+		history = self.history
+		scores = history.entries
+		bonus = 1 << (reached - depth)
+		for key in [(self.n,) + pair, (self.n, index1), (self.n, index2)]:
+			score = scores.get(key)
+			if score is None:
+				history.add(key, bonus)
+			else:
+				scores[key] = score + bonus
+
+	def compact(self):
+		"""
+		compact
+			finds the cells the search works on. A swap needs
+			two blocks with swaps left and trades their places,
+			so the cells holding them at the start stay the
+			only ones whose blocks move. The other blocks are
+			frozen, and checked once for being in their row.
+		"""
+		n = self.n
+		colors = self.colors
+		swaps = self.swaps
+		self.active = [index for index in range(n**2) if swaps[index] > 0]
+
+		# with every cell active, the partners are the links
+		if len(self.active) == n**2:
+			self.links = self.partners
+			self.frozen_misplaced = 0
+			return
+
+		self.links = [tuple([partner for partner in partners
+			if swaps[partner] > 0]) for partners in self.partners]
+
+		rows = self.rows
+		self.frozen_misplaced = len([index for index in range(n**2)
+			if swaps[index] == 0 and colors[index] != rows[index]])
+
+	def build_buckets(self):
+		"""
+		build_buckets
+			queues every block with > 0 swaps in the bucket
+			of its swap count, in list index order. Node s is
+			the head of bucket s, and the nodes after the heads
+			are handed out to blocks as they are queued.
+		"""
+		n = self.n
+		swaps = self.swaps
+		self.stride = max(swaps) + 1
+
+		# every swap queues at most two nodes and takes two
+		# swaps off swaps_left
+		size = self.stride + len(self.active) + self.swaps_left
+		self.next_node = list(range(size))
+		self.prev_node = list(range(size))
+		self.node_cell = [None] * size
+		self.cell_node = [None] * n**2
+		self.free_node = self.stride
+		self.moved_nodes = []
+
+		for index in self.active:
+			self.bucket_append(index, swaps[index])
+
+	def build_masks(self):
+		"""
+		build_masks
+			sets active_mask, one_mask and color_masks from
+			the board, see legal_mask
+		"""
+		self.active_mask = 0
+		self.one_mask = 0
+		self.color_masks = [0] * self.n
+
+		for index in range(self.n**2):
+			bit = 1 << index
+			self.color_masks[self.colors[index]] |= bit
+			if self.swaps[index] > 0:
+				self.active_mask |= bit
+			if self.swaps[index] == 1:
+				self.one_mask |= bit
+
+	def update_masks(self, index1, index2, color1, color2):
+		"""
+		update_masks
+			brings the masks of build_masks up to date after
+			swap or unswap of index1, index2
+
+		Parameters
+			index1: list integer index
+			index2: list integer index
+			color1: color at index1 before the swap
+			color2: color at index2 before the swap
+		"""
+		bits = 1 << index1 | 1 << index2
+		if color1 != color2:
+			self.color_masks[color1] ^= bits
+			self.color_masks[color2] ^= bits
+
+		swaps = self.swaps
+		active = self.active_mask & ~bits
+		one = self.one_mask & ~bits
+		for index in (index1, index2):
+			if swaps[index] > 0:
+				active |= 1 << index
+			if swaps[index] == 1:
+				one |= 1 << index
+		self.active_mask = active
+		self.one_mask = one
+
+	def bucket_append(self, index, swaps):
+		"""
+		bucket_append
+			links a new node for the block at index in at the
+			end of its bucket
+
+		Parameters
+			index: list integer index
+			swaps: swaps left of the block, > 0
+		"""
+		node = self.free_node
+		self.free_node += 1
+		self.node_cell[node] = index
+		self.cell_node[index] = node
+
+		last = self.prev_node[swaps]
+		self.next_node[last] = node
+		self.prev_node[node] = last
+		self.next_node[node] = swaps
+		self.prev_node[swaps] = node
+
+	def bucket_move(self, index, swaps):
+		"""
+		bucket_move
+			moves the block at index to the end of the bucket
+			of its new swap count, remembering its old node
+			for bucket_return
+
+		Parameters
+			index: list integer index
+			swaps: swaps left of the block now
+		"""
+		node = self.cell_node[index]
+		self.bucket_unlink(node)
+		self.moved_nodes.append(node)
+
+		if swaps > 0:
+			self.bucket_append(index, swaps)
+		else:
+			self.cell_node[index] = None
+
+	def bucket_return(self, index):
+		"""
+		bucket_return
+			undoes the last bucket_move, of the block at index
+
+		Parameters
+			index: list integer index
+
+		Raises
+			ValueError: if no bucket_move is left to undo
+		"""
+		if not self.moved_nodes:
+			raise ValueError("no swap to undo at index {}".format(index))
 
-		# try them all, in the horizontal and vertical lines
-		for move in possible_moves:
-			if self.valid_swap(index, move):
-				valid_moves.append(move)
+		node = self.cell_node[index]
+		if node is not None:
+			self.bucket_unlink(node)
+			self.free_node -= 1
 
-		return valid_moves
+		node = self.moved_nodes.pop()
+		self.bucket_restore(node)
+		self.cell_node[index] = node
+
+	def bucket_unlink(self, node):
+		"""
+		bucket_unlink
+			takes a node out of its bucket. The node keeps its
+			own links, so that bucket_restore can put it back.
+
+		Parameters
+			node: node of a block
+		"""
+		next_node = self.next_node
+		prev_node = self.prev_node
+		next_node[prev_node[node]] = next_node[node]
+		prev_node[next_node[node]] = prev_node[node]
+
+	def bucket_restore(self, node):
+		"""
+		bucket_restore
+			puts a node back where bucket_unlink took it from.
+			Everything done to the buckets since must have been
+			undone first.
+
+		Parameters
+			node: node of a block
+		"""
+		self.next_node[self.prev_node[node]] = node
+		self.prev_node[self.next_node[node]] = node
+
+	def bucket(self, swaps):
+		"""
+		bucket
+			yields the list indices of the blocks with the
+			given number of swaps, in queue order. Swaps made
+			while it is suspended must be undone before it
+			resumes.
+
+		Parameters
+			swaps: swap count, 0 < swaps < stride
+		"""
+		next_node = self.next_node
+		node_cell = self.node_cell
+
+		node = next_node[swaps]
+		while node != swaps:
+			yield node_cell[node]
+			node = next_node[node]
+
+	def swappable(self):
+		"""
+		swappable
+			yields the list indices of the blocks with > 0
+			swaps, fewest swaps first, without building a
+			list. See bucket.
+		"""
+		for swaps in range(1, self.stride):
+			for index in self.bucket(swaps):
+				yield index
 
 	def get_one_swappable(self):
 		"""
-		get_swappable
+		get_one_swappable
 			finds and returns a list of indices containing
-			swappable blocks, with swaps = 0
+			swappable blocks, with swaps = 1
 
 		Return
 			[index1, index2, ...] of valid one-swap blocks
 			remaining
 		"""
-		one_swap = self.one_swap_points
-		return [ind for ind in one_swap
-				if one_swap[ind]]
+		if self.stride < 2:
+			return []
+		return list(self.bucket(1))
 
 	def get_swappable_unsorted(self):
 		"""
@@ -502,11 +1383,10 @@ class Harmony():
 
 		Return
 			[index1, index2, ...] of valid swappable blocks
-			remaining
+			remaining, in list index order
 		"""
-		swapping_points = self.swapping_points
-		return [ind for ind in swapping_points
-				if swapping_points[ind]]
+		swaps = self.swaps
+		return [index for index in self.active if swaps[index] > 0]
 
 	def get_swappable_sorted(self):
 		"""
@@ -519,18 +1399,7 @@ class Harmony():
 			[index1, index2, ...] of valid swappable blocks
 			remaining in order of increasing swaps
 		"""
-		swapping_points = self.swapping_points
-
-		sorted_points = []
-		for ind in swapping_points:
-			if swapping_points[ind]:
-				color, swaps = self.get(ind)
-				sorted_points.append((color, swaps, ind))
-
-		# sort by swaps
-		sorted_points.sort(key = lambda x: x[1])
-		# get index
-		return [x[2] for x in sorted_points]
+		return list(self.swappable())
 
 	def swap(self, index1, index2):
 		"""
@@ -547,34 +1416,36 @@ class Harmony():
 			The colors at index1, index2 are swapped.
 			The total swap count has been decreased by 2,
 			and the individual swap counts of index1, index2
-			have each decreased by 1.
+			have each decreased by 1. misplaced counts the
+			blocks outside their color row after the swap.
 
 		Return
 			True: if successful
 			False: otherwise
 		"""
 		if self.valid_swap(index1, index2):
-			color1, swap1 = self.get(index1)
-			color2, swap2 = self.get(index2)
+			colors = self.colors
+			swaps = self.swaps
+			color1, swap1 = colors[index1], swaps[index1]
+			color2, swap2 = colors[index2], swaps[index2]
 
-			self.set_value(index1, color2, swap2 - 1)
-			self.set_value(index2, color1, swap1 - 1)
+			colors[index1], swaps[index1] = color2, swap2 - 1
+			colors[index2], swaps[index2] = color1, swap1 - 1
 
-			# check if no longer swappable
-			swapping_points = self.swapping_points
-			one_swap = self.one_swap_points
+			# the two blocks trade rows
+			row1 = self.rows[index1]
+			row2 = self.rows[index2]
+			self.misplaced += ((color2 != row1) + (color1 != row2) -
+				(color1 != row1) - (color2 != row2))
 
-			if swap2 < 2:
-				swapping_points[index1] = False
-				one_swap[index1] = False
-			if swap1 < 2:
-				swapping_points[index2] = False
-				one_swap[index2] = False
+			# move each block's node to the bucket of the
+			# swaps left at its new index
+			if swap2 - 1 != swap1:
+				self.bucket_move(index1, swap2 - 1)
+			if swap1 - 1 != swap2:
+				self.bucket_move(index2, swap1 - 1)
 
-			if swap2 == 3:
-				one_swap[index1] = True
-			if swap1 == 3:
-				one_swap[index2] = True
+			self.update_masks(index1, index2, color1, color2)
 
 			self.swaps_left -= 2
 
@@ -601,28 +1472,45 @@ class Harmony():
 			The colors at index1, index2 are swapped.
 			The total swap count has been increased by 2,
 			and the individual swap counts of index1, index2
-			have each increased by 1.
+			have each increased by 1. misplaced counts the
+			blocks outside their color row after the unswap.
 
 		Return
 			True: if successful
 			False: otherwise
-		"""
-		color1, swap1 = self.get(index1)
-		color2, swap2 = self.get(index2)
-
-		self.set_value(index1, color2, swap2 + 1)
-		self.set_value(index2, color1, swap1 + 1)
 
-		# reinstate swap availability, if needed
-		swapping_points = self.swapping_points
-		swapping_points[index1] = True
-		swapping_points[index2] = True
-
-		one_swap = self.one_swap_points
-		if swap2 == 0:
-			one_swap[index1] = True
-		if swap1 == 0:
-			one_swap[index2] = True
+		Raises
+			ValueError: if no swap of index1, index2 is left
+				to undo. The board is left as it was.
+		"""
+		colors = self.colors
+		swaps = self.swaps
+		color1, swap1 = colors[index1], swaps[index1]
+		color2, swap2 = colors[index2], swaps[index2]
+
+		# check there is a bucket move to undo before changing
+		# anything, so that a bad unswap leaves the board intact
+		returns = (swap2 != swap1 + 1) + (swap1 != swap2 + 1)
+		if len(self.moved_nodes) < returns:
+			raise ValueError("no swap of {} and {} to undo".format(
+				index1, index2))
+
+		colors[index1], swaps[index1] = color2, swap2 + 1
+		colors[index2], swaps[index2] = color1, swap1 + 1
+
+		# the two blocks trade rows back
+		row1 = self.rows[index1]
+		row2 = self.rows[index2]
+		self.misplaced += ((color2 != row1) + (color1 != row2) -
+			(color1 != row1) - (color2 != row2))
+
+		# undo the bucket moves of swap, in reverse order
+		if swap2 != swap1 + 1:
+			self.bucket_return(index2)
+		if swap1 != swap2 + 1:
+			self.bucket_return(index1)
+
+		self.update_masks(index1, index2, color1, color2)
 
 		self.swaps_left += 2
 
@@ -645,15 +1533,104 @@ class Harmony():
 			If any swaps of colinear one-swap blocks exist,
 			then they have been performed.
 		"""
-		one_swap = self.get_one_swappable()
-		for index1 in one_swap:
-			for index2 in one_swap:
-				# if they are in line and work for swaps
-				if self.valid_swap(index1, index2):
-					self.swap(index1, index2)
-					path.append((index1, index2))
+		for index1 in self.get_one_swappable():
+			# one-swap partners it can swap with, if it
+			# still has its swap
+			mask = self.legal_mask(index1) & self.one_mask
+			if mask:
+				index2 = self.mask_moves(index1, mask)[0]
+				self.swap(index1, index2)
+				path.append((index1, index2))
 		return path
 
+	def in_endgame(self):
+		"""
+		in_endgame
+			returns whether the endgame table covers the
+			current number of swaps left
+
+		Return
+			True: if there is a table with k >= swaps_left
+			False: otherwise
+		"""
+		return self.tablebase is not None and \
+			self.swaps_left <= self.tablebase.k
+
+	def endgame(self, path):
+		"""
+		endgame
+			finishes the game by table lookup instead of
+			searching, see in_endgame
+
+		Parameters
+			path: list of tuples of indices, detailing swap order
+
+		Return
+			path: with the swaps solving the game appended,
+				if the table has the current position
+			None: otherwise, as it cannot be solved
+
+		Postcondition
+			If a path was returned, the board is solved.
+		"""
+		moves = self.tablebase.solution(self.colors, self.swaps)
+		if moves is None:
+			return None
+
+		for index1, index2 in moves:
+			self.swap(index1, index2)
+			path.append((index1, index2))
+		return path
+
+	def follow_known(self, path):
+		"""
+		follow_known
+			finishes the game along a solution found before,
+			by the moves known gives, instead of searching
+
+		Parameters
+			path: list of tuples of indices, detailing swap order
+
+		Return
+			path: with the swaps solving the game appended, if
+				known leads from the current position to the end
+			None: otherwise, with the board as it was
+
+		Postcondition
+			If a path was returned, the board is solved.
+		"""
+		length = len(path)
+		move = self.known.get((tuple(self.colors), tuple(self.swaps)))
+		while move is not None:
+			index1, index2 = move
+			self.swap(index1, index2)
+			path.append(move)
+			move = self.known.get((tuple(self.colors), tuple(self.swaps)))
+
+		if len(path) > length and self.game_solved():
+			return path
+
+		# the solution was forgotten part of the way
+		while len(path) > length:
+			index1, index2 = path.pop()
+			self.unswap(index1, index2)
+		return None
+
+	def undo_forced(self, path, length):
+		"""
+		undo_forced
+			unswaps the swaps at the end of path, made by
+			deterministic_swaps, until path has the given
+			length again
+
+		Parameters
+			path: list of tuples of indices, detailing swap order
+			length: length of path before the forced swaps
+		"""
+		while len(path) > length:
+			index1, index2 = path.pop()
+			self.unswap(index1, index2)
+
 	################################
 	# Main pathfinding algorithm
 	################################
@@ -665,7 +1642,7 @@ class Harmony():
 			a list of tuples (index1, index2) of swaps.
 			It uses the principles of DFS.
 
-			It tries to start from each block once. each
+			It tries each valid swap of a position once. each
 			iteration, it swaps two blocks to see what happens,
 			and if the situation does not lead to a winning
 			combination, unswaps and resets the two blocks.
@@ -674,83 +1651,547 @@ class Harmony():
 			[(index1, index2), ...]: if there exists a
 				valid series of swaps to win the game
 			None: otherwise
+
+		Raises
+			SearchLimit: if max_nodes was given and the search
+				ran out of nodes
 		"""
 		if self.game_solved():
 			return []
+		if self.dead_end() or self.pattern_dead():
+			return None
 
-		starting_points = self.swapping_points.keys()
-		start_path = self.deterministic_swaps([])
+		path = self.search()
+		if path is None:
+			return None
+		return self.format_path(path)
 
-		for start in starting_points:
-			if debug:
-				print "Starting at {}\n".format(start)
+	def search(self):
+		"""
+		search
+			finds the series of swaps for solve, as list
+			indices. Blocks that start with no swaps must
+			already be in their row. If the blocks that can
+			move split into independent components, each is
+			searched on its own, see search_components.
 
-			start_copy = [swap for swap in start_path]
-			path = self.find_path(start, start_copy, set())
+		Return
+			[(index1, index2), ...]: if there exists a
+				valid series of swaps to win the game
+			None: otherwise
 
-			if path is not None:
-				return self.format_path(path)
+		Postcondition
+			If a path was found, the board is solved.
+		"""
+		if self.frozen_misplaced:
+			return None
 
-		return None
+		if self.budget is None:
+			self.budget = memory.MemoryBudget(self.strategy["memory"],
+				memory.process_budget())
+
+		if self.strategy["decompose"]:
+			components = self.components()
+			if len(components) > 1:
+				return self.search_components(components)
+
+		if self.in_endgame():
+			return self.endgame([])
+
+		try:
+			if self.engine == "twophase":
+				return twophase.search(self)
+			if self.engine == "mitm" and mitm.fits(self):
+				return mitm.search(self)
+			if self.engine == "sat":
+				return sat.search(self)
+		except memory.MemoryLimit:
+			# the engine's tables do not fit, so the depth
+			# first search, which keeps none, takes over
+			pass
+
+		if self.strategy["transpositions"] and max(self.swaps) < 16:
+			self.transpositions = transposition.get(self.n)
+			if self.transpositions is None:
+				self.transpositions = process_table(self.n,
+					self.budget.allot(self.strategy["table_memory"]))
+
+		start_path = []
+		if self.deterministic:
+			start_path = self.deterministic_swaps(start_path)
+
+		try:
+			if self.strategy["restarts"]:
+				return self.restart_search(start_path)
+			return self.find_path(start_path)
+		except SearchLimit:
+			# hand the board back as it was given
+			for index1, index2 in reversed(start_path):
+				self.unswap(index1, index2)
+			raise
+
+	def restart_search(self, path):
+		"""
+		restart_search
+			searches in runs stopped after a node budget that
+			follows the Luby sequence times the strategy's
+			restart_nodes. The first run keeps the order of
+			moves, and each run after it shuffles them with the
+			next seed. Positions a run has found to have no
+			solution stay in the transposition table, and the
+			history of good moves is kept, for the runs after
+			it. The last run allowed by max_nodes, if any, or
+			the first to finish, gives the answer.
+
+		Parameters
+			path: list of tuples of indices, detailing swap order
+
+		Return
+			[(index1, index2), ...]: if there exists a
+				valid series of swaps to win the game
+			None: otherwise
+
+		Raises
+			SearchLimit: if more than max_nodes swaps are made.
+				The board is restored before it propagates.
+		"""
+		max_nodes = self.max_nodes
+		rng = self.rng
+		seed = self.strategy["seed"] or 0
+
+		run = 1
+		try:
+			while True:
+				self.max_nodes = self.nodes + \
+					luby(run) * self.strategy["restart_nodes"]
+				if max_nodes is not None and self.max_nodes >= max_nodes:
+					self.max_nodes = max_nodes
+				if run > 1:
+					self.rng = random.Random(seed + run)
+
+				try:
+					return self.find_path(path)
+				except SearchLimit:
+					# only the end of a run's budget starts the next
+					if self.max_nodes == max_nodes or \
+						self.nodes <= self.max_nodes:
+						raise
+				run += 1
+		finally:
+			self.max_nodes = max_nodes
+			self.rng = rng
+
+	def components(self):
+		"""
+		components
+			splits the blocks that can move into groups that
+			never interact. A swap only trades the places of
+			two blocks with swaps left, so the cells holding
+			such blocks stay the same set all game, and blocks
+			only move between cells of the set that share a
+			row or column, directly or through other cells.
+
+		Return
+			[[index1, index2, ...], ...] of sorted list indices
+				per component, smallest component first
+		"""
+		swaps = self.swaps
+		seen = set()
+		components = []
+
+		for index in self.active:
+			if swaps[index] == 0 or index in seen:
+				continue
+
+			seen.add(index)
+			component = []
+			stack = [index]
+			while stack:
+				cell = stack.pop()
+				component.append(cell)
+				for partner in self.links[cell]:
+					if swaps[partner] > 0 and partner not in seen:
+						seen.add(partner)
+						stack.append(partner)
+
+			components.append(sorted(component))
+
+		components.sort(key = len)
+		return components
+
+	def component_game(self, cells):
+		"""
+		component_game
+			returns the game of a single component: its cells
+			keep their blocks, and every other cell holds a
+			finished block of its row's color
+
+		Parameters
+			cells: list of list integer indices of a component
+
+		Return
+			(colors, swaps) lists of length n^2
+		"""
+		colors = list(self.rows)
+		swaps = [0] * self.n**2
+		for index in cells:
+			colors[index] = self.colors[index]
+			swaps[index] = self.swaps[index]
+
+		return (colors, swaps)
+
+	def search_components(self, components):
+		"""
+		search_components
+			searches each component on its own, in separate
+			processes if the strategy has more than one
+			worker, and joins their paths. The search stops
+			as soon as one component has no solution.
+
+		Parameters
+			components: list of components, see components
+
+		Return
+			[(index1, index2), ...]: if every component has
+				a valid series of swaps
+			None: otherwise
+
+		Postcondition
+			If a path was found, the board is solved.
+		"""
+		strategy = dict(self.strategy, decompose = False)
+		budget = None
+		if self.max_nodes is not None:
+			budget = max(self.max_nodes - self.nodes, 0)
+
+		jobs = []
+		for cells in components:
+			colors, swaps = self.component_game(cells)
+			jobs.append((self.n, colors, swaps, strategy, budget))
+
+		path = []
+		if self.strategy["workers"] > 1:
+			table = None
+			if self.strategy["transpositions"]:
+				table = transposition.create(self.n,
+					self.strategy["table_memory"])
+
+			pool = multiprocessing.Pool(self.strategy["workers"],
+				transposition.attach, (table,))
+			try:
+				for sub_path, nodes in pool.imap_unordered(
+					search_component, jobs):
+					self.nodes += nodes
+					if sub_path is None:
+						return None
+					path.extend(sub_path)
+			finally:
+				pool.terminate()
+				pool.join()
+				if table is not None:
+					table.close()
+		else:
+			for n, colors, swaps, strategy, budget in jobs:
+				game = type(self)(n, colors, swaps, max_nodes = budget,
+					strategy = strategy)
+
+				# the component pauses where this game would,
+				# and is traced and budgeted along with it
+				game.pause = self.pause
+				if self.trace is not None:
+					game.trace = self.trace
+				game.budget = self.budget
+				game.pause_at = self.pause_at - self.nodes
+				try:
+					sub_path = game.search()
+				finally:
+					self.nodes += game.nodes
+					self.pause_at = self.nodes + game.pause_at - game.nodes
+				if sub_path is None:
+					return None
+				path.extend(sub_path)
+
+				if budget is not None:
+					budget = max(self.max_nodes - self.nodes, 0)
+
+		# components never share cells, so the paths
+		# can be made one after another
+		for index1, index2 in path:
+			self.swap(index1, index2)
+		return path
+
+	def closure(self, cells):
+		"""
+		closure
+			adds to a set of cells every cell that its blocks
+			with swaps left can still trade with, directly or
+			through other such blocks. No swap from outside the
+			closure can change the blocks in it.
+
+		Parameters
+			cells: iterable of list integer indices
+
+		Return
+			set of list integer indices
+		"""
+		swaps = self.swaps
+		links = self.links
+
+		closed = set(cells)
+		stack = [index for index in closed if swaps[index] > 0]
+		while stack:
+			index = stack.pop()
+			for partner in links[index]:
+				if swaps[partner] > 0 and partner not in closed:
+					closed.add(partner)
+					stack.append(partner)
+
+		return closed
+
+	def explain(self, reasons, pruned):
+		"""
+		explain
+			returns the conflict set of a position none of
+			whose swaps lead to a solution: a closed set of
+			cells such that no position with the same blocks
+			in them, still closed, has a solution either.
+
+			Each swap tried adds its two cells and the conflict
+			set of the position it led to. Each swap the pattern
+			database dropped adds its cells and every cell
+			holding a block of the same colors. A position
+			without any swaps is explained by the closure of its
+			first block with swaps left, which can never move.
+
+		Parameters
+			reasons: set of cells gathered from the swaps tried,
+				or None if one of them failed for reasons of the
+				whole board
+			pruned: list of swaps dropped by the pattern database
+
+		Return
+			frozenset of list integer indices, or None for the
+				whole board
+		"""
+		if reasons is None:
+			return None
+
+		colors = self.colors
+		dropped = set()
+		for index1, index2 in pruned:
+			dropped.update((colors[index1], colors[index2]))
+			reasons.update((index1, index2))
+		if dropped:
+			reasons.update(index for index in self.active
+				if colors[index] in dropped)
+
+		if not reasons:
+			reasons = set([next(self.swappable())])
+		return frozenset(self.closure(reasons))
+
+	def dead_conflict(self):
+		"""
+		dead_conflict
+			returns the conflict set of a position the search
+			does not go below, see explain. A block without
+			swaps outside its color row can never move, and
+			explains it alone. Otherwise every block that has
+			used its swaps is in its color row, and the blocks
+			with swaps left explain it.
+
+		Return
+			frozenset of list integer indices
+		"""
+		swaps = self.swaps
+		if self.dead_end():
+			for index in range(self.n**2):
+				if swaps[index] == 0 and self.colors[index] != self.rows[index]:
+					return frozenset([index])
+
+		return frozenset(index for index in self.active if swaps[index] > 0)
+
+	def jumps_over(self, conflict, touched):
+		"""
+		jumps_over
+			returns whether the swaps just made, on the cells
+			touched, had no part in the failure explained by the
+			conflict set, so that the position before them fails
+			for the same reason. They must not have touched its
+			cells, nor have been the last links between its
+			blocks and others.
+
+		Parameters
+			conflict: frozenset of list integer indices
+			touched: list integer indices swapped
+		"""
+		swaps = self.swaps
+		for index in touched:
+			if index in conflict:
+				return False
+			if swaps[index] == 0:
+				for partner in self.links[index]:
+					if partner in conflict and swaps[partner] > 0:
+						return False
+
+		return True
 
-	def find_path(self, index1, path = [], tried = set()):
+	def find_path(self, path):
 		"""
 		find_path
 			is a recursive helper function for solve. It tries
-			to DFS from all different paths
+			each valid swap of the position once, see moves,
+			and searches on from the position it leads to
+
+			With backjumping, each failure leaves its conflict
+			set in conflict, see explain. If a swap fails for
+			reasons it had no part in, see jumps_over, the other
+			swaps of the position would fail the same way, and
+			the search jumps back past it.
 
 		Parameters
-			index: list integer index
+			path: list of tuples of indices, detailing swap order
 
 		Return
 			[(index1, index2), ...]: if there exists a
 				valid series of swaps to win the game
 			[]:	if no swaps are needed; the game is done
 			None: otherwise
+
+		Raises
+			SearchLimit: if more than max_nodes swaps are made.
+				The board is restored before it propagates.
 		"""
-		#if debug:
-		#	print "Index1: {}".format(index1)
-		
+		self.conflict = None
+
 		# base case, no more swaps
 		if not self.has_swaps_left():
 			if self.game_solved():
 				return path
 			return None
 
-		# reduce search space
-		# path = self.deterministic_swaps(path)
-
-		swappable = self.valid_moves(index1)
+		depth = len(path)
+		backjump = self.backjump
+		reasons = set()
+		pruned = [] if backjump else None
+		trace = self.trace
 
 		# explore each path
-		for index2 in swappable:
-			swap_pair = (index1, index2)
-			path.append(swap_pair)
+		for index1, index2 in self.moves(depth, pruned):
+			# try to swap it and see what happens
+			path.append((index1, index2))
+			self.swap(index1, index2)
+			self.nodes += 1
+			if trace is not None:
+				trace.record(tracer.EXPAND, tracer.NONE, depth, index1, index2)
+
+			# make the swaps it forces, to undo with it
+			forced = len(path)
+			if self.propagate:
+				self.deterministic_swaps(path)
 
-			# tuples are hashable
-			path_tup = tuple(path)
-			if path_tup not in tried:
-				tried.add(path_tup)
-
-				# try to swap it and see what happens
-				self.swap(index1, index2)
-
-				if self.game_solved():
-					return path
-
-				# now try all remaining possibilities
-				remaining = self.get_swappable()
-
-				for index3 in remaining:
-					new_path = self.find_path(index3, path, tried)
+			if self.game_solved():
+				if trace is not None:
+					trace.record(tracer.SOLVED, tracer.NONE, depth, index1,
+						index2)
+				self.record_progress(depth, index1, index2, len(path))
+				return path
 
-					if new_path:
-						return new_path
+			# deepest path length seen below this swap
+			outer = self.deepest
+			self.deepest = depth + 1
+
+			try:
+				if self.max_nodes is not None and \
+					self.nodes > self.max_nodes:
+					raise SearchLimit(self.nodes)
+				if self.pause is not None and self.nodes >= self.pause_at:
+					self.pause(self)
+
+				# now search on from here,
+				# or look it up near the end
+				new_path = None
+				position = None
+				searched = False
+				reason = tracer.NONE
+				if self.dead_end():
+					reason = tracer.DEAD_END
+				elif self.in_endgame():
+					new_path = self.endgame(path)
+					reason = tracer.ENDGAME
+				elif self.known is not None and self.follow_known(path):
+					new_path = path
+					reason = tracer.KNOWN
+				else:
+					if self.transpositions is not None:
+						position = tablebase.pack(self.colors, self.swaps)
+						if position in self.transpositions:
+							position = None
+							reason = tracer.TRANSPOSITION
+					if position is not None or \
+						self.transpositions is None:
+						new_path = self.find_path(path)
+						searched = True
+
+				if trace is not None and reason != tracer.NONE:
+					kind = tracer.SOLVED if new_path else tracer.PRUNE
+					trace.record(kind, reason, depth, index1, index2)
+
+				if new_path:
+					self.record_progress(depth, index1, index2,
+						len(new_path))
+					return new_path
+
+				# every swap from here was tried, unless forced
+				# swaps were made along the way
+				if position is not None and not self.propagate:
+					self.transpositions.add(position, self.swaps_left)
+
+				# jump back if this swap had no part in the
+				# failure, or else add it to the reasons
+				jump = None
+				if backjump and reasons is not None:
+					if not searched:
+						self.conflict = self.dead_conflict()
+
+					touched = [index for pair in path[depth:]
+						for index in pair]
+					if self.conflict is None:
+						reasons = None
+					elif self.jumps_over(self.conflict, touched):
+						jump = self.conflict
+					else:
+						reasons.update(self.conflict)
+						reasons.update(touched)
+			except SearchLimit:
+				self.undo_forced(path, forced)
+				path.pop()
+				self.unswap(index1, index2)
+				if trace is not None:
+					trace.record(tracer.BACKTRACK, tracer.LIMIT, depth,
+						index1, index2)
+				raise
+
+			self.undo_forced(path, forced)
+
+			reached = self.deepest
+			self.deepest = max(outer, reached)
+			if reached > depth + 1:
+				self.record_progress(depth, index1, index2, reached)
 
 			# if no path, undo the swapping
 			path.pop()
 			self.unswap(index1, index2)
-		
+			if trace is not None:
+				trace.record(tracer.BACKTRACK,
+					tracer.NONE if jump is None else tracer.BACKJUMP, depth,
+					index1, index2)
+
+			if jump is not None:
+				self.conflict = jump
+				return None
+
+		if backjump:
+			self.conflict = self.explain(reasons, pruned)
 		return None
 
 	def format_path(self, path):
@@ -773,4 +2214,254 @@ class Harmony():
 
 			human_readable_path.append((index1, index2))
 
-		return human_readable_path
\ No newline at end of file
+		return human_readable_path
+
+class TracedHarmony(Harmony):
+	"""
+	TracedHarmony is a Harmony whose searches can be traced.
+
+	Instance Variables
+		trace: tracer.Recorder logging what find_path does,
+			or None, see tracer.py
+	"""
+	__slots__ = ["trace"]
+
+	def __init__(self, *args, **kwargs):
+		"""
+		Constructor
+			takes the arguments of Harmony, and starts out
+			without a recorder
+		"""
+		super(TracedHarmony, self).__init__(*args, **kwargs)
+		self.trace = None
+
+def search_component(job):
+	"""
+	search_component
+		searches one component game in a worker process
+
+	Parameters
+		job: (n, colors, swaps, strategy, max_nodes) as made
+			by Harmony.search_components
+
+	Return
+		(path, nodes): the path found by Harmony.search, or
+			None, and the number of nodes it took
+	"""
+	n, colors, swaps, strategy, max_nodes = job
+	game = Harmony(n, colors, swaps, max_nodes = max_nodes,
+		strategy = strategy)
+	return (game.search(), game.nodes)
+
+def puzzle_job(position, puzzle, max_nodes, strategy):
+	"""
+	puzzle_job
+		checks one puzzle given to solve_many and makes the
+		job solve_job runs
+
+	Parameters
+		position: index of the puzzle in the input
+		puzzle: (n, colors, swaps), or a dict mapping n,
+			colors, and swaps as made by solve.get_harmony_text
+		max_nodes, strategy: as given to solve_many
+
+	Return
+		(position, n, colors, swaps, max_nodes, strategy)
+
+	Raises
+		ValueError: if the puzzle is not a game Harmony takes
+	"""
+	if isinstance(puzzle, dict):
+		n, colors, swaps = puzzle["n"], puzzle["colors"], puzzle["swaps"]
+	else:
+		n, colors, swaps = puzzle
+	colors = list(colors)
+	swaps = list(swaps)
+
+	if n < 1 or len(colors) != n**2 or len(swaps) != n**2:
+		raise ValueError("puzzle {} is not a {} by {} game".format(
+			position, n, n))
+	if sum(swaps) > MAX_LEN * 2 and max_nodes is None:
+		raise ValueError("puzzle {} needs max_nodes".format(position))
+
+	return (position, n, colors, swaps, max_nodes, strategy)
+
+def process_table(n, megabytes):
+	"""
+	process_table
+		returns the TranspositionTable this process keeps for
+		side length n, made the first time it is asked for.
+		Positions without a solution have none in any game,
+		so every search of that size shares it, and none pays
+		for filling a table of its own.
+
+	Parameters
+		n: side length of game
+		megabytes: size of the table, if it has to be made
+
+	Return
+		TranspositionTable, or None if there is none and
+			megabytes is 0
+	"""
+	table = _tables.get(n)
+	if table is None and megabytes > 0:
+		table = _tables[n] = transposition.TranspositionTable(n, megabytes)
+	return table
+
+def reset_tables():
+	"""
+	reset_tables
+		forgets the tables made by process_table, so that
+		the next search of every size starts from an empty one
+	"""
+	_tables.clear()
+
+def solve_job(job):
+	"""
+	solve_job
+		solves one puzzle of solve_many. Puzzles of the same
+		size solved by the same process share a table of
+		positions without a solution, see transposition.py,
+		made to fit the process's memory budget, as well as
+		the grid geometry and history every game shares.
+
+	Parameters
+		job: tuple made by puzzle_job
+
+	Return
+		(position, path, finished): path as returned by
+			Harmony.solve, and finished False if the puzzle
+			ran out of nodes
+	"""
+	position, n, colors, swaps, max_nodes, strategy = job
+	game = Harmony(n, colors, swaps, max_nodes = max_nodes,
+		strategy = strategy)
+
+	table = None
+	if game.strategy["transpositions"]:
+		table = process_table(n, memory.process_budget().allot(
+			game.strategy["table_memory"]))
+
+	previous = transposition.attach(table)
+	try:
+		return (position, game.solve(), True)
+	except SearchLimit:
+		return (position, None, False)
+	finally:
+		transposition.attach(previous)
+
+def pool_job(job):
+	"""
+	pool_job
+		runs solve_job in a worker process, handing back any
+		error instead of raising it, so that the result always
+		comes back to solve_many
+
+	Return
+		(result, error): the result of solve_job, or None, and
+			the exception it raised, or None
+	"""
+	try:
+		return (solve_job(job), None)
+	except Exception as error:
+		return (None, error)
+
+def solve_many(puzzles, workers = 1, ordered = False, max_nodes = None,
+	strategy = None, window = None):
+	"""
+	solve_many
+		solves a stream of puzzles, in this process or in a
+		pool of worker processes, and yields each answer as
+		soon as it is known. Puzzles are read from the input
+		only while fewer than window of them are being solved
+		or waiting to be yielded, so a huge generator of them
+		takes bounded memory.
+
+	Parameters
+		puzzles: iterable of (n, colors, swaps), or of dicts
+			mapping n, colors, and swaps
+		workers: number of processes solving puzzles. With 1,
+			each puzzle is solved in this process when the
+			answer before it has been taken.
+		ordered: whether answers come in the order of the
+			puzzles, rather than as they are found
+		max_nodes: if given, the most swaps each search makes
+		strategy: dict of strategy overrides for every puzzle,
+			as given to Harmony. Components of a puzzle are
+			searched in its worker.
+		window: most puzzles in flight, WINDOW_PER_WORKER per
+			worker if None
+
+	Return
+		generator of (position, path, finished): position is
+			the index of the puzzle in puzzles, path is as
+			returned by Harmony.solve, and finished is False if
+			the puzzle ran out of nodes
+
+	Raises
+		ValueError: when a puzzle is reached that is not a
+			game Harmony takes
+		RuntimeError: if a worker process dies, for example
+			killed for its memory, as its puzzle would never
+			be answered
+	"""
+	jobs = (puzzle_job(position, puzzle, max_nodes, strategy)
+		for position, puzzle in enumerate(puzzles))
+
+	if workers <= 1:
+		for job in jobs:
+			yield solve_job(job)
+		return
+
+	strategy = dict(strategy or {}, workers = 1)
+	jobs = (job[:-1] + (strategy,) for job in jobs)
+	window = window or WINDOW_PER_WORKER * workers
+
+	results = queue.Queue()
+	pool = multiprocessing.Pool(workers)
+
+	# the pool replaces a worker that dies, but not its puzzle
+	processes = list(pool._pool)
+	try:
+		# answers found ahead of their turn, if ordered
+		waiting = {}
+		in_flight = 0
+		next_position = 0
+		exhausted = False
+
+		while True:
+			while not exhausted and in_flight < window:
+				job = next(jobs, None)
+				if job is None:
+					exhausted = True
+				else:
+					pool.apply_async(pool_job, (job,), callback = results.put)
+					in_flight += 1
+
+			if in_flight == 0:
+				return
+
+			if ordered and next_position in waiting:
+				result = waiting.pop(next_position)
+			else:
+				while True:
+					try:
+						result, error = results.get(timeout = POLL_SECONDS)
+						break
+					except queue.Empty:
+						for process in processes:
+							if process.exitcode is not None:
+								raise RuntimeError("worker {} died with exit "
+									"code {}".format(process.pid, process.exitcode))
+				if error is not None:
+					raise error
+				if ordered and result[0] != next_position:
+					waiting[result[0]] = result
+					continue
+
+			in_flight -= 1
+			next_position += 1
+			yield result
+	finally:
+		pool.terminate()
+		pool.join()
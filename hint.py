@@ -0,0 +1,219 @@
+from harmony import Harmony
+import tablebase
+import transposition
+import memory
+from portfolio import complete
+
+"""
+hint.py answers "what next?" for a game of Harmony 3, as
+described in harmony.py, over and over while a player
+makes their own swaps.
+
+A HintSession remembers every position along the solutions
+it has found, with the swap that comes next. As long as the
+player follows one of them, the next swap is a dict lookup.
+Once they leave it, the position is searched again. That
+search is not from scratch: it follows a known solution as
+soon as it reaches a position on one, see Harmony.known, the
+session keeps a table of positions without a solution, see
+transposition.py, which every search it runs reads and adds
+to, and the history of good swaps is shared by all games
+anyway, see Harmony. The known positions are kept in caches
+of the process's memory budget, which forget the oldest
+under pressure, see memory.py. A hint is taken from the
+solution just found, not read back from them.
+
+Usage
+	session = HintSession(n)
+	index1, index2 = session.hint(colors, swaps)
+"""
+class HintSession(object):
+	"""
+	HintSession gives the next swap of positions of one game
+	as the player goes along.
+
+	Instance Variables
+		n: side length of game
+		strategy: dict of strategy overrides for every search,
+			see strategy.py, or None
+		max_nodes: if given, the most swaps each search makes
+		table: TranspositionTable shared by the searches, or
+			None if there is no memory for one
+		line: memory.Cache mapping positions on a known
+			solution to the swap to make next, as
+			(index1, index2)
+		lost: memory.Cache of positions known to have no
+			solution
+		searches: number of searches run
+		nodes: total nodes of those searches
+	"""
+	def __init__(self, n, strategy = None, max_nodes = None,
+		table_memory = transposition.DEFAULT_MEMORY):
+		"""
+		Constructor
+
+		Parameters
+			n: side length of game
+			strategy: dict of strategy overrides, as given to
+				Harmony
+			max_nodes: if given, the most swaps each search
+				makes, needed for games too long to search
+				without
+			table_memory: megabytes of the table of positions
+				without a solution, or 0 for none. It is cut to
+				what the process's memory budget has left.
+		"""
+		self.n = n
+		self.strategy = strategy
+		self.max_nodes = max_nodes
+
+		self.table = None
+		table_memory = memory.process_budget().allot(table_memory)
+		if table_memory > 0:
+			self.table = transposition.TranspositionTable(n, table_memory)
+
+		# positions are cheap to search again, so none need
+		# be kept under pressure
+		self.line = memory.Cache(memory.process_budget(), 0)
+		self.lost = memory.Cache(memory.process_budget(), 0)
+		self.searches = 0
+		self.nodes = 0
+
+	def hint(self, colors, swaps):
+		"""
+		hint
+			returns the next swap toward a solution of the
+			position, searching only if it is not on a known
+			solution
+
+		Parameters
+			colors: length n^2 list of colors
+			swaps: length n^2 list of swap counts
+
+		Return
+			(index1, index2): list indices of the swap
+			None: if the game is solved or has no solution
+
+		Raises
+			SearchLimit: if max_nodes was given and the search
+				ran out of nodes
+		"""
+		key = (tuple(colors), tuple(swaps))
+		move = self.line.get(key)
+		if move is not None or key in self.lost:
+			return move
+
+		path = self.solve(colors, swaps)
+		if not path:
+			return None
+		return path[0]
+
+	def solve(self, colors, swaps):
+		"""
+		solve
+			searches the position, and remembers the positions
+			along the solution found
+
+		Parameters
+			colors: length n^2 list of colors
+			swaps: length n^2 list of swap counts
+
+		Return
+			[(index1, index2), ...]: list indices of the swaps
+				that solve the game from the position
+			None: if there are none
+
+		Raises
+			SearchLimit: if max_nodes was given and the search
+				ran out of nodes
+		"""
+		key = (tuple(colors), tuple(swaps))
+		game = self.game(colors, swaps, self.strategy)
+
+		if game.game_solved():
+			return []
+
+		if game.dead_end() or game.pattern_dead() or \
+			self.known_lost(colors, swaps):
+			self.lost.add(key)
+			return None
+
+		path = self.search(game)
+
+		# forced swaps may miss solutions, see portfolio.py,
+		# so a None from them is checked by a full search
+		if path is None and not complete(game.strategy):
+			strategy = dict(self.strategy or {}, deterministic = False,
+				propagate = False)
+			path = self.search(self.game(colors, swaps, strategy))
+
+		if path is None:
+			self.lost.add(key)
+			return None
+
+		self.remember(colors, swaps, path)
+		return path
+
+	def game(self, colors, swaps, strategy):
+		"""
+		game
+			returns a Harmony of the position to search, with
+			the given strategy overrides
+		"""
+		return Harmony(self.n, list(colors), list(swaps),
+			max_nodes = self.max_nodes, strategy = strategy)
+
+	def search(self, game):
+		"""
+		search
+			runs Harmony.search on the game with the session's
+			table attached and its known solutions to follow,
+			and counts its nodes
+
+		Return
+			path returned by Harmony.search
+		"""
+		game.known = self.line
+		previous = transposition.attach(self.table)
+		try:
+			return game.search()
+		finally:
+			transposition.attach(previous)
+			self.searches += 1
+			self.nodes += game.nodes
+
+	def known_lost(self, colors, swaps):
+		"""
+		known_lost
+			returns whether the table already holds the
+			position, as one without a solution
+		"""
+		return self.table is not None and max(swaps) < 16 and \
+			tablebase.pack(colors, swaps) in self.table
+
+	def remember(self, colors, swaps, path):
+		"""
+		remember
+			adds the positions along a solution to line
+
+		Parameters
+			colors: length n^2 list of colors
+			swaps: length n^2 list of swap counts
+			path: list indices of the swaps solving the game
+		"""
+		colors = list(colors)
+		swaps = list(swaps)
+		for index1, index2 in path:
+			self.line[(tuple(colors), tuple(swaps))] = (index1, index2)
+
+			colors[index1], colors[index2] = colors[index2], colors[index1]
+			swaps[index1], swaps[index2] = swaps[index2] - 1, swaps[index1] - 1
+
+	def close(self):
+		"""
+		close
+			forgets the known positions, and gives their memory
+			back to the process's budget
+		"""
+		self.line.close()
+		self.lost.close()
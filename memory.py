@@ -0,0 +1,330 @@
+import sys
+from collections import OrderedDict
+
+"""
+memory.py keeps the memory taken by the caches of Harmony 3,
+as described in harmony.py, within a budget.
+
+A MemoryBudget has a limit in megabytes, or none. There is
+one for the whole process, see set_limit, and each search
+has one of its own from the strategy's memory, whose usage
+also counts against the process's. Caches that grow as a
+search goes, such as the positions twophase.py has failed
+from, register with the budget of their search and report
+the bytes they take and give back. Once a budget is over its
+limit, it asks its caches, largest first, to shrink until it
+is down to LOW_WATER of the limit. Caches shrink by dropping
+their oldest entries, which only costs searching again, but
+a search cache keeps at least MIN_ENTRIES: one smaller than
+that would only make its engine search the same positions
+over and over.
+
+Tables the whole process shares register with its budget:
+the history table of Harmony, which shrinks like a cache,
+and the pattern databases of pattern.py, which are dropped
+whole, see PatternDatabase.shrink.
+
+If the caches cannot free enough, the budget raises
+MemoryLimit, and the search drops the engine that grew them
+for the depth first search, whose memory is bounded by the
+length of the path. Structures of a fixed size, such as
+tables of positions without a solution, are not registered
+but made to fit what is left, see MemoryBudget.allot.
+
+Usage
+	memory.set_limit(512)
+
+	Harmony(n, colors, swaps, strategy = {"memory": 64})
+"""
+MEGABYTE = 1024**2
+
+# share of the limit a budget over it shrinks its caches to
+LOW_WATER = 0.75
+
+# bytes a dict or set takes per entry, besides the entry
+SLOT_BYTES = 100
+
+# entries a cache keeps however hard it is asked to shrink,
+# unless it is made with fewer
+MIN_ENTRIES = 256
+
+class MemoryLimit(MemoryError):
+	"""
+	MemoryLimit is raised when a budget is over its limit
+	and its caches cannot shrink any further.
+	"""
+	pass
+
+def sizeof(value):
+	"""
+	sizeof
+		returns the approximate bytes of a value, with the
+		items of tuples counted too. Small integers are
+		shared by the interpreter, and take none.
+	"""
+	if isinstance(value, int) and -5 <= value <= 256:
+		return 0
+	size = sys.getsizeof(value)
+	if isinstance(value, tuple):
+		size += sum(sizeof(item) for item in value)
+	return size
+
+class MemoryBudget(object):
+	"""
+	MemoryBudget counts the bytes taken by its caches, and
+	shrinks them when they are over its limit.
+
+	Instance Variables
+		limit: bytes allowed, or None for no limit
+		used: bytes reported by the caches
+		parent: budget this one counts against too, or None
+		caches: caches registered with this budget or one
+			counting against it
+	"""
+	def __init__(self, megabytes = None, parent = None):
+		"""
+		Constructor
+
+		Parameters
+			megabytes: limit of the budget, or None
+			parent: budget this one counts against too
+		"""
+		self.limit = None
+		if megabytes is not None:
+			self.limit = int(megabytes * MEGABYTE)
+		self.used = 0
+		self.parent = parent
+		self.caches = []
+
+	def register(self, cache):
+		"""
+		register
+			adds a cache the budget may ask to shrink. A cache
+			has nbytes, the bytes it takes, and shrink, which
+			frees some of them and returns how many.
+		"""
+		budget = self
+		while budget is not None:
+			budget.caches.append(cache)
+			budget = budget.parent
+
+	def unregister(self, cache):
+		"""
+		unregister
+			removes a cache, and gives back the bytes it took
+		"""
+		budget = self
+		while budget is not None:
+			budget.caches.remove(cache)
+			budget = budget.parent
+		self.free(cache.nbytes)
+
+	def grow(self, nbytes):
+		"""
+		grow
+			counts bytes a cache took, and shrinks the caches
+			if that puts this budget or one it counts against
+			over its limit
+
+		Raises
+			MemoryLimit: if the caches cannot get back under
+				the limit
+		"""
+		budget = self
+		while budget is not None:
+			budget.used += nbytes
+			budget = budget.parent
+
+		budget = self
+		while budget is not None:
+			if budget.limit is not None and budget.used > budget.limit:
+				budget.relieve()
+			budget = budget.parent
+
+	def free(self, nbytes):
+		"""
+		free
+			counts bytes a cache gave back
+		"""
+		budget = self
+		while budget is not None:
+			budget.used -= nbytes
+			budget = budget.parent
+
+	def relieve(self):
+		"""
+		relieve
+			asks the caches, largest first, to shrink until the
+			budget is down to LOW_WATER of its limit
+
+		Raises
+			MemoryLimit: if it is still over its limit after
+				every cache has shrunk as far as it can
+		"""
+		target = int(self.limit * LOW_WATER)
+		while self.used > target:
+			freed = 0
+			for cache in sorted(self.caches, key = lambda cache: -cache.nbytes):
+				freed += cache.shrink()
+				if self.used <= target:
+					return
+			if not freed:
+				break
+
+		if self.used > self.limit:
+			raise MemoryLimit(self.used)
+
+	def available(self):
+		"""
+		available
+			returns the bytes left under the limit of this
+			budget and the ones it counts against, or None if
+			none of them has a limit
+		"""
+		left = None
+		budget = self
+		while budget is not None:
+			if budget.limit is not None:
+				room = max(budget.limit - budget.used, 0)
+				left = room if left is None else min(left, room)
+			budget = budget.parent
+		return left
+
+	def allot(self, megabytes):
+		"""
+		allot
+			returns the megabytes a structure of a fixed size
+			that wants megabytes may take: all of them, or
+			what is left, whichever is less
+
+		Return
+			megabytes, possibly 0
+		"""
+		left = self.available()
+		if left is None:
+			return megabytes
+		return min(megabytes, float(left) / MEGABYTE)
+
+class Cache(object):
+	"""
+	Cache is a dict that reports its size to a budget, and
+	drops its oldest half when asked to shrink, unless it is
+	down to min_entries. Used as a set, its values are None.
+	Every entry is taken to be the size of the first one.
+
+	Instance Variables
+		budget: MemoryBudget it is registered with, or None
+		min_entries: entries it keeps when asked to shrink
+		entries: OrderedDict of the entries, oldest first
+		entry_bytes: bytes of one entry, once there is one
+		nbytes: bytes of all the entries
+	"""
+	def __init__(self, budget = None, min_entries = MIN_ENTRIES):
+		"""
+		Constructor
+
+		Parameters
+			budget: MemoryBudget to register with, or None for
+				a cache that never shrinks
+			min_entries: entries it keeps when asked to shrink
+		"""
+		self.budget = budget
+		self.min_entries = min_entries
+		self.entries = OrderedDict()
+		self.entry_bytes = None
+		self.nbytes = 0
+		if budget is not None:
+			budget.register(self)
+
+	def __contains__(self, key):
+		return key in self.entries
+
+	def __len__(self):
+		return len(self.entries)
+
+	def get(self, key, default = None):
+		return self.entries.get(key, default)
+
+	def add(self, key, value = None):
+		"""
+		add
+			stores an entry, reporting its bytes to the budget
+
+		Raises
+			MemoryLimit: if the budget cannot make room
+		"""
+		if key in self.entries:
+			self.entries[key] = value
+			return
+
+		if self.entry_bytes is None:
+			self.entry_bytes = sizeof(key) + sizeof(value) + SLOT_BYTES
+		self.entries[key] = value
+		self.nbytes += self.entry_bytes
+		if self.budget is not None:
+			self.budget.grow(self.entry_bytes)
+
+	__setitem__ = add
+
+	def shrink(self):
+		"""
+		shrink
+			drops the oldest half of the entries, or as many as
+			leaves min_entries
+
+		Return
+			bytes freed
+		"""
+		drop = min((len(self.entries) + 1) // 2,
+			max(len(self.entries) - self.min_entries, 0))
+		for _ in range(drop):
+			self.entries.popitem(last = False)
+
+		freed = drop * (self.entry_bytes or 0)
+		self.nbytes -= freed
+		if self.budget is not None:
+			self.budget.free(freed)
+		return freed
+
+	def clear(self):
+		"""
+		clear
+			empties the cache, giving its bytes back to the
+			budget it stays registered with
+		"""
+		if self.budget is not None:
+			self.budget.free(self.nbytes)
+		self.entries.clear()
+		self.nbytes = 0
+
+	def close(self):
+		"""
+		close
+			empties the cache and leaves its budget
+		"""
+		if self.budget is not None:
+			self.budget.unregister(self)
+			self.budget = None
+		self.entries.clear()
+		self.nbytes = 0
+
+_process = MemoryBudget()
+
+def process_budget():
+	"""
+	process_budget
+		returns the budget of this process
+	"""
+	return _process
+
+def set_limit(megabytes):
+	"""
+	set_limit
+		sets the limit of this process's budget
+
+	Parameters
+		megabytes: the limit, or None for no limit
+	"""
+	_process.limit = None
+	if megabytes is not None:
+		_process.limit = int(megabytes * MEGABYTE)
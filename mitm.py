@@ -0,0 +1,301 @@
+import tablebase
+import twophase
+import memory
+
+"""
+mitm.py is a meet in the middle search engine for Harmony 3,
+as described in harmony.py.
+
+Every solution has exactly swaps_left / 2 swaps, and all of
+them end in the same position: each row filled with blocks
+of its color and no swaps left. The engine walks backwards
+from that goal, undoing swaps between cells whose blocks
+can move, and keeps every position it finds layer by layer,
+up to half of the swaps or until the next layer would pass
+the memory cap, the strategy's middle_states. A depth first
+search from the start then only has to reach the last layer
+kept.
+
+A position on the way from the start must be made of the
+start's blocks: each block of a color has at most the swaps
+of a different block of that color at the start, and that
+block reaches its cell with the swaps it used, see
+twophase.reach_table. Positions from the goal that cannot be
+matched up this way are dropped.
+
+Positions are packed as in tablebase.py, so blocks can have
+at most 15 swaps. Each takes about STATE_BYTES, and the layers
+are kept to what the game's memory budget has left, see
+memory.py.
+"""
+# approximate bytes of a position kept in a layer
+STATE_BYTES = 200
+
+def fits(harmony):
+	"""
+	fits
+		returns whether the game can be packed for this engine
+	"""
+	return max(harmony.swaps) < 16
+
+def start_blocks(harmony):
+	"""
+	start_blocks
+		returns, for each color, the (cell, swaps) of its
+		blocks with swaps left at the start
+	"""
+	blocks = [[] for _ in range(harmony.n)]
+	for index in range(harmony.n**2):
+		if harmony.swaps[index] > 0:
+			blocks[harmony.colors[index]].append(
+				(index, harmony.swaps[index]))
+	return blocks
+
+def match_options(harmony):
+	"""
+	match_options
+		finds, for every cell and packed block, the start
+		blocks of its color that it can be matched to, see
+		the module description
+
+	Parameters
+		harmony: Harmony game at its starting position
+
+	Return
+		list indexed by cell of lists indexed by packed block,
+			color << 4 | swaps, of lists of indices into
+			start_blocks(harmony)[color]. None for cells whose
+			blocks never move.
+	"""
+	reach = twophase.reach_table(harmony)
+	starts = start_blocks(harmony)
+
+	options = []
+	for index in range(harmony.n**2):
+		if harmony.swaps[index] == 0:
+			options.append(None)
+			continue
+
+		cell_options = [[] for _ in range(256)]
+		for color, blocks in enumerate(starts):
+			for i, (start, most) in enumerate(blocks):
+				for swaps in range(min(most, 15) + 1):
+					if reach[most - swaps][start] >> index & 1:
+						cell_options[color << 4 | swaps].append(i)
+		options.append(cell_options)
+
+	return options
+
+def consistent(cells, color, options):
+	"""
+	consistent
+		returns whether the blocks of a color in a position
+		can each be matched to a different start block of
+		that color, see the module description
+
+	Parameters
+		cells: bytearray of a packed position
+		color: color to check
+		options: list returned by match_options
+	"""
+	choices = []
+	for index, cell in enumerate(cells):
+		if cell >> 4 == color and options[index] is not None:
+			choices.append(options[index][cell])
+
+	# match blocks to start blocks along augmenting paths
+	matched = {}
+	def augment(block, seen):
+		for i in choices[block]:
+			if i not in seen:
+				seen.add(i)
+				if i not in matched or augment(matched[i], seen):
+					matched[i] = block
+					return True
+		return False
+
+	for block in range(len(choices)):
+		if not augment(block, set()):
+			return False
+	return True
+
+def goal_layers(harmony, depth, max_states):
+	"""
+	goal_layers
+		finds the positions up to depth swaps before the goal
+		that are consistent with the start, one layer per
+		swap, while the total stays under max_states
+
+	Parameters
+		harmony: Harmony game at its starting position
+		depth: most swaps to undo
+		max_states: most positions to keep
+
+	Return
+		list of dicts, layer d mapping the packed positions d
+			swaps before the goal to the swap (index1, index2)
+			leading one layer closer. The last layer is empty if
+			no position that far from the goal is consistent.
+
+	Raises
+		SearchLimit: if the node budget of the game runs out
+	"""
+	n = harmony.n
+	active = [swap > 0 for swap in harmony.swaps]
+	pairs = [(index1, index2) for index1, index2 in tablebase.line_pairs(n)
+		if active[index1] and active[index2]]
+	options = match_options(harmony)
+
+	goal = tablebase.pack(harmony.rows, [0] * n**2)
+	layers = [{goal: (tablebase.EMPTY, tablebase.EMPTY)}]
+	kept = 1
+
+	while len(layers) <= depth:
+		layer = {}
+		for position in layers[-1]:
+			for before, index1, index2 in tablebase.predecessors(n,
+				position, pairs):
+				if before in layer:
+					continue
+
+				# only the two blocks changed, so check them alone
+				# first, then the matching of their colors
+				cells = bytearray(before)
+				if not options[index1][cells[index1]] or \
+					not options[index2][cells[index2]]:
+					continue
+
+				color1, color2 = cells[index1] >> 4, cells[index2] >> 4
+				if not consistent(cells, color1, options):
+					continue
+				if color2 != color1 and \
+					not consistent(cells, color2, options):
+					continue
+
+				layer[before] = (index1, index2)
+				harmony.spend_node()
+
+			# a layer that does not fit is not kept at all
+			if kept + len(layer) > max_states:
+				return layers
+
+		layers.append(layer)
+		kept += len(layer)
+		if not layer:
+			break
+
+	return layers
+
+def forward(harmony, depth, middle, path, failed, max_failed):
+	"""
+	forward
+		searches depth swaps from the current position for one
+		in the middle layer
+
+	Parameters
+		harmony: Harmony game
+		depth: number of swaps to make
+		middle: dict of the last layer from goal_layers
+		path: list of tuples of indices, detailing swap order
+		failed: memory.Cache of packed positions known not to
+			reach the middle layer
+		max_failed: most positions to keep in failed
+
+	Return
+		path: with the swaps appended, if the middle was met
+		None: otherwise
+
+	Raises
+		SearchLimit: if the node budget runs out. The board is
+			restored before it propagates.
+	"""
+	position = tablebase.pack(harmony.colors, harmony.swaps)
+	if depth == 0:
+		return path if position in middle else None
+	if position in failed or harmony.dead_end():
+		return None
+
+	swaps = harmony.swaps
+	for index1 in harmony.active:
+		if swaps[index1] == 0:
+			continue
+
+		for index2 in harmony.links[index1]:
+			if index2 < index1 or not harmony.swap(index1, index2):
+				continue
+			path.append((index1, index2))
+
+			try:
+				harmony.spend_node()
+				found = forward(harmony, depth - 1, middle, path, failed,
+					max_failed)
+			except Exception:
+				path.pop()
+				harmony.unswap(index1, index2)
+				raise
+
+			if found is not None:
+				return found
+
+			path.pop()
+			harmony.unswap(index1, index2)
+
+	if len(failed) < max_failed:
+		failed.add(position)
+	return None
+
+def search(harmony):
+	"""
+	search
+		solves the game by meeting the goal layers from the
+		start, then following the layers to the goal
+
+	Parameters
+		harmony: Harmony game
+
+	Return
+		[(index1, index2), ...]: if there exists a valid
+			series of swaps to win the game
+		None: otherwise
+
+	Raises
+		SearchLimit: if the node budget of the game runs out
+		MemoryLimit: if the memory budget of the game runs out
+
+	Postcondition
+		If a path was found, the board is solved.
+	"""
+	if harmony.swaps_left % 2:
+		return None
+
+	depth = harmony.swaps_left // 2
+	max_states = harmony.strategy["middle_states"]
+
+	budget = harmony.budget or memory.MemoryBudget()
+	left = budget.available()
+	if left is not None:
+		max_states = max(min(max_states, left // STATE_BYTES), 1)
+
+	layers = goal_layers(harmony, (depth + 1) // 2, max_states)
+	nbytes = STATE_BYTES * sum(len(layer) for layer in layers)
+	back = len(layers) - 1
+	if not layers[back]:
+		return None
+
+	failed = memory.Cache(budget)
+	try:
+		budget.grow(nbytes)
+		path = forward(harmony, depth - back, layers[back], [], failed,
+			max_states)
+	finally:
+		failed.close()
+		budget.free(nbytes)
+	if path is None:
+		return None
+
+	for layer in reversed(layers[1:]):
+		index1, index2 = layer[tablebase.pack(harmony.colors, harmony.swaps)]
+		harmony.swap(index1, index2)
+		path.append((index1, index2))
+
+	return path
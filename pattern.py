@@ -0,0 +1,365 @@
+import os
+import sys
+import time
+import pickle
+import memory
+
+"""
+pattern.py builds and reads pattern databases for Harmony 3,
+as described in harmony.py. The pattern of a color keeps
+only that color's blocks and their swaps, and treats every
+other block as a wildcard that can always be swapped with.
+
+A pattern is solved when its n blocks fill the row of their
+color with no swaps left. Its cost is the least number of
+swaps its blocks take part in on the way, or INFEASIBLE if
+no way exists. Any solution of the real game solves every
+pattern, so an INFEASIBLE pattern means the game is lost,
+and costs never overestimate.
+
+Exchanging row 0 and the row of a color turns its pattern
+into one for color 0, and patterns that differ only in the
+order of their columns have the same cost. One table per
+side length therefore serves every color, keyed by the
+sorted columns of the pattern. Patterns with a block over
+MAX_SWAPS[n] swaps are not in the table and cost 0.
+
+A loaded table counts against the process's memory budget,
+see memory.py. When the budget needs the room, the table
+is dropped, its patterns all cost 0 from then on, and get
+no longer loads it.
+
+Usage
+	pattern.py n [max_swaps]
+
+	Builds the table of side length n, saves it, and prints
+	the build time, table size and peak memory.
+"""
+PATTERN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+	"patterns")
+
+# largest swaps per block kept in the table of side length n
+MAX_SWAPS = {2: 4, 3: 4, 4: 3, 5: 3, 6: 2}
+
+INFEASIBLE = 255
+
+_databases = {}
+
+def default_filename(n):
+	"""
+	default_filename
+		returns where the table of side length n is kept
+	"""
+	return os.path.join(PATTERN_DIR, "pattern{}.pdb".format(n))
+
+def canonical(n, blocks):
+	"""
+	canonical
+		returns the table key of a pattern: for each column,
+		the sorted (row, swaps) of its blocks, with the
+		columns sorted
+
+	Parameters
+		n: side length of game
+		blocks: list of (row, column, swaps), with the color's
+			row as row 0
+	"""
+	columns = [[] for _ in range(n)]
+	for row, col, swaps in blocks:
+		columns[col].append((row, swaps))
+
+	return tuple(sorted(tuple(sorted(column)) for column in columns))
+
+def blocks_of(key):
+	"""
+	blocks_of
+		returns a list of (row, column, swaps) of a pattern
+		with the given key, see canonical
+	"""
+	return [(row, col, swaps)
+		for col, column in enumerate(key) for row, swaps in column]
+
+def predecessors(n, blocks, max_swaps):
+	"""
+	predecessors
+		returns the patterns one swap before the given one,
+		with no block over max_swaps. Going forwards, a block
+		on its last swap must land in row 0.
+
+	Parameters
+		n: side length of game
+		blocks: list of (row, column, swaps)
+		max_swaps: largest swaps per block
+
+	Return
+		[blocks, ...]
+	"""
+	occupied = set((row, col) for row, col, swaps in blocks)
+	found = []
+
+	for i, (row, col, swaps) in enumerate(blocks):
+		if swaps >= max_swaps or (swaps == 0 and row != 0):
+			continue
+
+		# the block came from a wildcard's cell
+		cells = [(row, y) for y in range(n) if y != col] + \
+			[(x, col) for x in range(n) if x != row]
+		for cell in cells:
+			if cell not in occupied:
+				before = list(blocks)
+				before[i] = (cell[0], cell[1], swaps + 1)
+				found.append(before)
+
+		# or traded places with another block of its color
+		for j in range(i + 1, len(blocks)):
+			row2, col2, swaps2 = blocks[j]
+			if row2 != row and col2 != col:
+				continue
+			if swaps2 >= max_swaps or (swaps2 == 0 and row2 != 0):
+				continue
+
+			before = list(blocks)
+			before[i] = (row2, col2, swaps + 1)
+			before[j] = (row, col, swaps2 + 1)
+			found.append(before)
+
+	return found
+
+def build(n, max_swaps = None, verbose = False):
+	"""
+	build
+		finds the cost of every feasible pattern of side
+		length n by breadth first search backwards from the
+		solved pattern
+
+	Parameters
+		n: side length of game
+		max_swaps: largest swaps per block, MAX_SWAPS[n] if None
+		verbose: whether to print the size of each level
+
+	Return
+		dict mapping pattern keys to costs
+	"""
+	if max_swaps is None:
+		max_swaps = MAX_SWAPS[n]
+
+	goal = canonical(n, [(0, col, 0) for col in range(n)])
+	table = {goal: 0}
+	frontier = [goal]
+	cost = 0
+
+	while frontier:
+		cost += 1
+		level = []
+		for key in frontier:
+			for before in predecessors(n, blocks_of(key), max_swaps):
+				before_key = canonical(n, before)
+				if before_key not in table:
+					table[before_key] = cost
+					level.append(before_key)
+
+		frontier = level
+		if verbose and level:
+			print("cost {}: {} patterns".format(cost, len(level)))
+
+	return table
+
+def peak_memory():
+	"""
+	peak_memory
+		returns the peak resident memory of this process in
+		megabytes, or None where it cannot be read
+	"""
+	try:
+		import resource
+	except ImportError:
+		return None
+
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == "darwin":
+		return peak / 1024.0**2
+	return peak / 1024.0
+
+class PatternDatabase(object):
+	"""
+	PatternDatabase looks up the cost of the pattern of each
+	color of a position.
+
+	Instance Variables
+		n: side length of game
+		max_swaps: largest swaps per block in the table
+		table: dict mapping pattern keys to costs, or None
+			once dropped
+		relabel: list indexed by color of lists mapping each
+			row to its row with that color's row as row 0
+		nbytes: approximate bytes of the table
+	"""
+	def __init__(self, n, max_swaps, table):
+		"""
+		Constructor
+
+		Parameters
+			n: side length of game
+			max_swaps: largest swaps per block in the table
+			table: dict mapping pattern keys to costs
+		"""
+		self.n = n
+		self.max_swaps = max_swaps
+		self.table = table
+
+		# every entry is taken to be the size of the first one
+		self.nbytes = 0
+		if table:
+			key = next(iter(table))
+			self.nbytes = len(table) * (memory.sizeof(key) +
+				memory.sizeof(table[key]) + memory.SLOT_BYTES)
+
+		self.relabel = []
+		for color in range(n):
+			rows = list(range(n))
+			rows[0], rows[color] = color, 0
+			self.relabel.append(rows)
+
+	def save(self, filename = None):
+		"""
+		save
+			pickles the table
+
+		Parameters
+			filename: path of the table, default_filename(n)
+				if None
+		"""
+		filename = filename or default_filename(self.n)
+		directory = os.path.dirname(filename)
+		if directory and not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		with open(filename, "wb") as f:
+			pickle.dump((self.n, self.max_swaps, self.table), f,
+				pickle.HIGHEST_PROTOCOL)
+
+	@classmethod
+	def load(cls, filename):
+		"""
+		load
+			returns the PatternDatabase pickled by save
+		"""
+		with open(filename, "rb") as f:
+			n, max_swaps, table = pickle.load(f)
+		return cls(n, max_swaps, table)
+
+	def cost(self, colors, swaps, color):
+		"""
+		cost
+			returns the cost of the pattern of one color
+
+		Parameters
+			colors: length n^2 list of colors
+			swaps: length n^2 list of swap counts
+			color: color of the pattern
+
+		Return
+			cost: if the color has n blocks, none over
+				max_swaps swaps
+			INFEASIBLE: if such a pattern cannot be solved
+			0: otherwise
+		"""
+		if self.table is None:
+			return 0
+
+		n = self.n
+		relabel = self.relabel[color]
+		max_swaps = self.max_swaps
+
+		blocks = []
+		for index in range(n**2):
+			if colors[index] == color:
+				if swaps[index] > max_swaps:
+					return 0
+				blocks.append((relabel[index // n], index % n, swaps[index]))
+
+		if len(blocks) != n:
+			return 0
+
+		return self.table.get(canonical(n, blocks), INFEASIBLE)
+
+	def costs(self, colors, swaps):
+		"""
+		costs
+			returns the list of pattern costs of every color
+		"""
+		return [self.cost(colors, swaps, color) for color in range(self.n)]
+
+	def shrink(self):
+		"""
+		shrink
+			drops the table for the memory budget, see
+			memory.py. Every pattern costs 0 from then on.
+
+		Return
+			bytes freed
+		"""
+		freed = self.nbytes
+		budget = memory.process_budget()
+		budget.unregister(self)
+		self.table = None
+		self.nbytes = 0
+		return freed
+
+def get(n):
+	"""
+	get
+		returns the PatternDatabase of side length n, shared
+		by every caller in this process, or None if it has
+		not been built or was dropped for the memory budget
+	"""
+	filename = default_filename(n)
+	if filename not in _databases:
+		_databases[filename] = None
+		if os.path.exists(filename):
+			database = PatternDatabase.load(filename)
+			_databases[filename] = database
+
+			budget = memory.process_budget()
+			budget.register(database)
+			try:
+				budget.grow(database.nbytes)
+			except memory.MemoryLimit:
+				pass
+
+	database = _databases[filename]
+	if database is not None and database.table is None:
+		return None
+	return database
+
+def main():
+	"""
+	main
+		builds and saves a table from the command line
+	"""
+	if len(sys.argv) not in (2, 3):
+		print("Usage: %s n [max_swaps]" % sys.argv[0])
+		sys.exit(1)
+
+	n = int(sys.argv[1])
+	max_swaps = int(sys.argv[2]) if len(sys.argv) == 3 else MAX_SWAPS[n]
+
+	start = time.time()
+	table = build(n, max_swaps, verbose = True)
+	elapsed = time.time() - start
+
+	database = PatternDatabase(n, max_swaps, table)
+	database.save()
+	_databases.pop(default_filename(n), None)
+
+	print("{} patterns up to {} swaps per block in {:.1f}s".format(
+		len(table), max_swaps, elapsed))
+	print("{:.1f} MB on disk".format(
+		os.path.getsize(default_filename(n)) / 1024.0**2))
+
+	peak = peak_memory()
+	if peak is not None:
+		print("{:.1f} MB peak memory".format(peak))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,218 @@
+import os
+import json
+import multiprocessing
+from harmony import Harmony, SearchLimit
+from strategy import select as strategy_select
+import transposition
+
+try:
+	from Queue import Empty
+except ImportError:
+	from queue import Empty
+
+"""
+portfolio.py races several search configurations of
+Harmony, as described in harmony.py, against each other
+in separate processes. The first configuration to find a
+path wins, and the others are stopped.
+
+A configuration that solves with forced one-swap pairs,
+deterministic or propagate, may miss paths, so its None
+does not end the race. A None from any other configuration
+proves that the game has no solution. A configuration only
+lists the keys it overrides, so whether it forces swaps is
+read from the strategy.py configuration of the game with
+the overrides applied.
+
+The processes share one table of positions without a
+solution, see transposition.py. Only configurations that
+search the whole tree below a position add it.
+
+Wins are counted per configuration name in STATS_FILE, to
+tune the defaults in strategy.py by.
+"""
+STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+	"portfolio_wins.json")
+
+# (name, strategy overrides), see strategy.py. The strategy
+# table may turn forced swaps on, so the configurations meant
+# to search the whole tree turn them off themselves.
+PORTFOLIO = [
+	("unsorted", {"successors": "unsorted", "ordering": "history",
+		"deterministic": False, "propagate": False}),
+	("sorted", {"successors": "sorted", "ordering": "none",
+		"deterministic": False, "propagate": False}),
+	("propagate", {"successors": "sorted", "deterministic": True,
+		"propagate": True}),
+	("restarts", {"successors": "unsorted", "ordering": "history",
+		"deterministic": False, "propagate": False, "seed": 0,
+		"restarts": True}),
+	("backjump", {"successors": "unsorted", "ordering": "history",
+		"deterministic": False, "propagate": False, "backjump": True}),
+	("twophase", {"engine": "twophase", "deterministic": False,
+		"propagate": False}),
+	("mitm", {"engine": "mitm", "deterministic": False,
+		"propagate": False}),
+]
+
+def complete(config):
+	"""
+	complete
+		returns whether a configuration searches the whole
+		tree, so that its None means there is no solution
+
+	Parameters
+		config: full configuration dict, as in Harmony.strategy:
+			the one strategy.select chose, with any overrides
+			applied
+	"""
+	return not (config["deterministic"] or config["propagate"])
+
+def run_config(n, colors, swaps, config, max_nodes = None):
+	"""
+	run_config
+		solves a game with one configuration
+
+	Parameters
+		n: side length of game
+		colors: length n^2 list of colors
+		swaps: length n^2 list of swap counts
+		config: dict of strategy overrides
+		max_nodes: if given, the most swaps to make
+
+	Return
+		path returned by Harmony.solve
+
+	Raises
+		SearchLimit: if more than max_nodes swaps are made
+	"""
+	return Harmony(n, list(colors), list(swaps), max_nodes = max_nodes,
+		strategy = config).solve()
+
+def worker(name, n, colors, swaps, config, results, table = None,
+	max_nodes = None):
+	"""
+	worker
+		runs one configuration in its own process and puts
+		(name, path, finished) on the results queue. finished
+		is False if the configuration ran out of nodes.
+
+	Parameters
+		name: name of the configuration
+		n, colors, swaps: the game, as given to Harmony
+		config: dict of strategy overrides
+		results: multiprocessing.Queue
+		table: shared TranspositionTable, or None
+		max_nodes: if given, the most swaps to make
+	"""
+	transposition.attach(table)
+	try:
+		path = run_config(n, colors, swaps, config, max_nodes)
+	except SearchLimit:
+		results.put((name, None, False))
+		return
+	results.put((name, path, True))
+
+def record_win(name, stats_file = None):
+	"""
+	record_win
+		adds one win for the named configuration to the
+		stats file
+
+	Parameters
+		name: name of the configuration
+		stats_file: path of the stats, STATS_FILE if None
+	"""
+	stats_file = stats_file or STATS_FILE
+
+	wins = {}
+	if os.path.exists(stats_file):
+		with open(stats_file, "r") as f:
+			wins = json.load(f)
+
+	wins[name] = wins.get(name, 0) + 1
+	with open(stats_file, "w") as f:
+		json.dump(wins, f, indent = 1, sort_keys = True)
+
+def solve_portfolio(n, colors, swaps, portfolio = None, timeout = None,
+	stats_file = None, table_memory = transposition.DEFAULT_MEMORY,
+	max_nodes = None):
+	"""
+	solve_portfolio
+		starts one process per configuration, waits for the
+		first definite answer, and terminates the rest
+
+	Parameters
+		n: side length of game
+		colors: length n^2 list of colors
+		swaps: length n^2 list of swap counts
+		portfolio: list of (name, strategy overrides), PORTFOLIO
+			if None
+		timeout: seconds to wait for an answer, or None
+		stats_file: path the win is recorded in, STATS_FILE if
+			None, or False to not record it
+		table_memory: megabytes of the shared table, or 0 for
+			none
+		max_nodes: if given, the most swaps each configuration
+			makes, needed for games too long to search without
+
+	Return
+		(path, name): path as returned by Harmony.solve, and
+			the name of the configuration that produced it.
+			name is None if no configuration answered.
+	"""
+	portfolio = portfolio or PORTFOLIO
+
+	# reject bad input here, not once per process
+	Harmony(n, list(colors), list(swaps), max_nodes = max_nodes)
+
+	table = None
+	if table_memory and max(swaps) < 16:
+		table = transposition.create(n, table_memory)
+
+	results = multiprocessing.Queue()
+	processes = {}
+	for name, config in portfolio:
+		process = multiprocessing.Process(target = worker,
+			args = (name, n, colors, swaps, config, results, table,
+				max_nodes))
+		process.daemon = True
+		process.start()
+		processes[name] = process
+
+	# the configurations in effect, to read complete from
+	selected = strategy_select(n, colors, swaps)
+	configs = dict((name, dict(selected, **config))
+		for name, config in portfolio)
+	waiting = set(processes)
+	answer = (None, None)
+	waited = 0.0
+	try:
+		while waiting and (timeout is None or waited < timeout):
+			try:
+				name, path, finished = results.get(timeout = 0.1)
+			except Empty:
+				waited += 0.1
+				# a process that died never reports
+				for name in list(waiting):
+					if processes[name].exitcode not in (None, 0):
+						waiting.discard(name)
+				continue
+
+			waiting.discard(name)
+			if path is not None or \
+				(finished and complete(configs[name])):
+				answer = (path, name)
+				break
+	finally:
+		for process in processes.values():
+			if process.is_alive():
+				process.terminate()
+			process.join()
+		if table is not None:
+			table.close()
+
+	if answer[1] is not None and stats_file is not False:
+		record_win(answer[1], stats_file)
+
+	return answer
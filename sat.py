@@ -0,0 +1,756 @@
+import sys
+import heapq
+import memory
+
+"""
+sat.py is a search engine for Harmony 3, as described in
+harmony.py, that hands the game to a SAT solver.
+
+Every solution has exactly swaps_left / 2 swaps, so the game
+unrolls into that many steps. For each step and each cell
+whose block can move there are variables for the color and
+the swap count of the block in the cell, one of each true,
+and for each step a variable per pair of those cells in
+line with each other, exactly one true: the swap made. A
+swap moves the color and the count less one of each block
+to the other cell, needs both counts above 0, and every
+cell it does not touch keeps its block. The last step must
+have every block in its color row with no swaps left. A
+block on its last swap must land in its color row right
+away, which the goal implies, but saying so prunes sooner.
+
+The encoding can be written in DIMACS CNF for any solver,
+and is solved here by CDCL, a conflict driven clause
+learning solver in pure Python: two watched literals per
+clause, first unique implication point learning with clause
+minimization, VSIDS decisions with saved phases, Luby
+restarts, and learnt clauses dropped by their literal block
+distance. Each conflict counts as a node of the game, and
+the clauses take about CLAUSE_BYTES each from its memory
+budget, see memory.py.
+
+Usage
+	sat.py data_filename.txt [dimacs_filename]
+
+	Solves the game by this engine and prints the path,
+	or writes its encoding to dimacs_filename.
+"""
+# approximate bytes of a clause, in the encoding and the solver
+CLAUSE_BYTES = 400
+
+# conflicts of the shortest run between restarts
+RESTART_CONFLICTS = 100
+
+# variable activity decay per conflict
+ACTIVITY_DECAY = 0.95
+
+# learnt clauses kept, as a share of the problem clauses,
+# and the growth of that limit at every reduction
+LEARNT_SHARE = 0.5
+LEARNT_GROWTH = 1.1
+
+class CDCL(object):
+	"""
+	CDCL is a conflict driven clause learning SAT solver,
+	see the module description. Variables are numbered from
+	1 and clauses are given as lists of DIMACS literals, v
+	or -v. Inside, literal 2v stands for v and 2v + 1 for -v.
+
+	Instance Variables
+		num_vars: number of variables
+		ok: False once the clauses are known to conflict
+		values: by inner literal, 1 if true, -1 if false and
+			0 if unassigned
+		levels: decision level of each assigned variable
+		reasons: clause that implied each assigned variable,
+			None for decisions. Its first literal is the one
+			implied.
+		activity: VSIDS score of each variable
+		phases: last value of each variable, tried first
+		heap: heap of (-activity, variable) to decide on,
+			with stale entries skipped
+		watches: by inner literal, the clauses whose first
+			or second literal it is
+		clauses: problem clauses of two or more literals
+		learnts: learnt clauses
+		lbds: literal block distance of each learnt clause
+		max_learnts: learnt clauses kept at a reduction
+		trail: inner literals in order of assignment
+		trail_lim: length of trail at each decision
+		qhead: next literal of trail to propagate
+		bump: activity added to a variable in a conflict
+		conflicts: number of conflicts met
+		decisions: number of decisions made
+	"""
+	def __init__(self, num_vars = 0):
+		"""
+		Constructor
+
+		Parameters
+			num_vars: number of variables to start with
+		"""
+		self.num_vars = 0
+		self.ok = True
+		self.values = [0, 0]
+		self.levels = [0]
+		self.reasons = [None]
+		self.activity = [0.0]
+		self.phases = [False]
+		self.seen = [False]
+		self.heap = []
+		self.watches = [[], []]
+
+		self.clauses = []
+		self.learnts = []
+		self.lbds = []
+		self.max_learnts = 0
+
+		self.trail = []
+		self.trail_lim = []
+		self.qhead = 0
+		self.bump = 1.0
+
+		self.conflicts = 0
+		self.decisions = 0
+
+		self.new_vars(num_vars)
+
+	def new_vars(self, count):
+		"""
+		new_vars
+			adds count variables, numbered after the last one
+		"""
+		for v in range(self.num_vars + 1, self.num_vars + count + 1):
+			self.values += [0, 0]
+			self.levels.append(0)
+			self.reasons.append(None)
+			self.activity.append(0.0)
+			self.phases.append(False)
+			self.seen.append(False)
+			self.watches += [[], []]
+			self.heap.append((0.0, v))
+		self.num_vars += count
+
+	def add_clause(self, literals):
+		"""
+		add_clause
+			adds a problem clause. Clauses are only added
+			between calls to solve.
+
+		Parameters
+			literals: list of DIMACS literals
+
+		Return
+			False: if the clauses are known to conflict
+			True: otherwise
+		"""
+		if not self.ok:
+			return False
+
+		values = self.values
+		clause = []
+		for literal in literals:
+			lit = 2 * literal if literal > 0 else -2 * literal + 1
+			# satisfied, or a tautology
+			if values[lit] == 1 or lit ^ 1 in clause:
+				return True
+			if values[lit] == 0 and lit not in clause:
+				clause.append(lit)
+
+		if not clause:
+			self.ok = False
+		elif len(clause) == 1:
+			self.assign(clause[0], None)
+			self.ok = self.propagate() is None
+		else:
+			self.clauses.append(clause)
+			self.watches[clause[0]].append(clause)
+			self.watches[clause[1]].append(clause)
+
+		return self.ok
+
+	def assign(self, lit, reason):
+		"""
+		assign
+			makes an inner literal true at the current level
+		"""
+		v = lit >> 1
+		self.values[lit] = 1
+		self.values[lit ^ 1] = -1
+		self.levels[v] = len(self.trail_lim)
+		self.reasons[v] = reason
+		self.trail.append(lit)
+
+	def propagate(self):
+		"""
+		propagate
+			assigns the literals the clauses imply, until none
+			are left or a clause is false
+
+		Return
+			the false clause, or None
+		"""
+		values = self.values
+		watches = self.watches
+		trail = self.trail
+
+		while self.qhead < len(trail):
+			false_lit = trail[self.qhead] ^ 1
+			self.qhead += 1
+
+			watching = watches[false_lit]
+			watches[false_lit] = kept = []
+			for i, clause in enumerate(watching):
+				if clause[0] == false_lit:
+					clause[0] = clause[1]
+					clause[1] = false_lit
+
+				first = clause[0]
+				if values[first] == 1:
+					kept.append(clause)
+					continue
+
+				# watch another literal that is not false
+				for k in range(2, len(clause)):
+					lit = clause[k]
+					if values[lit] != -1:
+						clause[1] = lit
+						clause[k] = false_lit
+						watches[lit].append(clause)
+						break
+				else:
+					kept.append(clause)
+					if values[first] == -1:
+						kept.extend(watching[i + 1:])
+						self.qhead = len(trail)
+						return clause
+					self.assign(first, clause)
+
+		return None
+
+	def analyze(self, conflict):
+		"""
+		analyze
+			learns a clause from a conflict, cut at the first
+			unique implication point and minimized by the
+			reasons of its literals
+
+		Parameters
+			conflict: false clause
+
+		Return
+			(learnt, level, lbd): the learnt clause, with the
+				literal it asserts first and the one of the
+				highest level after it, the level to go back to,
+				and the number of levels in the clause
+		"""
+		seen = self.seen
+		levels = self.levels
+		reasons = self.reasons
+		trail = self.trail
+		level = len(self.trail_lim)
+
+		learnt = [None]
+		marked = []
+		pending = 0
+		index = len(trail) - 1
+		lit = None
+		clause = conflict
+
+		while True:
+			for other in clause if lit is None else clause[1:]:
+				v = other >> 1
+				if not seen[v] and levels[v] > 0:
+					seen[v] = True
+					marked.append(v)
+					self.bump_var(v)
+					if levels[v] == level:
+						pending += 1
+					else:
+						learnt.append(other)
+
+			while not seen[trail[index] >> 1]:
+				index -= 1
+			lit = trail[index]
+			index -= 1
+			seen[lit >> 1] = False
+			pending -= 1
+			if pending == 0:
+				break
+			clause = reasons[lit >> 1]
+
+		learnt[0] = lit ^ 1
+
+		# drop literals implied by the others
+		kept = [learnt[0]]
+		for other in learnt[1:]:
+			reason = reasons[other >> 1]
+			if reason is None or not all(seen[q >> 1] or levels[q >> 1] == 0
+				for q in reason[1:]):
+				kept.append(other)
+		learnt = kept
+
+		for v in marked:
+			seen[v] = False
+
+		back = 0
+		if len(learnt) > 1:
+			top = max(range(1, len(learnt)),
+				key = lambda i: levels[learnt[i] >> 1])
+			learnt[1], learnt[top] = learnt[top], learnt[1]
+			back = levels[learnt[1] >> 1]
+
+		lbd = len(set(levels[other >> 1] for other in learnt))
+		return learnt, back, lbd
+
+	def bump_var(self, v):
+		"""
+		bump_var
+			raises the activity of a variable in a conflict
+		"""
+		activity = self.activity
+		activity[v] += self.bump
+		if activity[v] > 1e100:
+			for u in range(1, self.num_vars + 1):
+				activity[u] *= 1e-100
+			self.bump *= 1e-100
+			self.rebuild_heap()
+		elif self.values[2 * v] == 0:
+			heapq.heappush(self.heap, (-activity[v], v))
+
+	def rebuild_heap(self):
+		"""
+		rebuild_heap
+			makes the heap of the unassigned variables again,
+			without stale entries
+		"""
+		self.heap = [(-self.activity[v], v)
+			for v in range(1, self.num_vars + 1) if self.values[2 * v] == 0]
+		heapq.heapify(self.heap)
+
+	def cancel_until(self, level):
+		"""
+		cancel_until
+			unassigns every literal above a decision level
+		"""
+		if len(self.trail_lim) <= level:
+			return
+
+		values = self.values
+		activity = self.activity
+		start = self.trail_lim[level]
+		for lit in self.trail[start:]:
+			v = lit >> 1
+			values[lit] = values[lit ^ 1] = 0
+			self.phases[v] = not lit & 1
+			heapq.heappush(self.heap, (-activity[v], v))
+
+		del self.trail[start:]
+		del self.trail_lim[level:]
+		self.qhead = start
+
+		if len(self.heap) > 4 * self.num_vars + 64:
+			self.rebuild_heap()
+
+	def decide(self):
+		"""
+		decide
+			returns the literal of the most active unassigned
+			variable, in its saved phase, or None if every
+			variable is assigned
+		"""
+		heap = self.heap
+		values = self.values
+		while heap:
+			v = heapq.heappop(heap)[1]
+			if values[2 * v] == 0:
+				return 2 * v + (not self.phases[v])
+		return None
+
+	def reduce(self):
+		"""
+		reduce
+			drops the worse half of the learnt clauses with a
+			literal block distance above 2, at level 0
+		"""
+		order = sorted(range(len(self.learnts)),
+			key = lambda i: (self.lbds[i], len(self.learnts[i])))
+		keep = len(order) // 2
+		kept = [i for rank, i in enumerate(order)
+			if rank < keep or self.lbds[i] <= 2]
+
+		self.learnts = [self.learnts[i] for i in kept]
+		self.lbds = [self.lbds[i] for i in kept]
+
+		self.watches = [[] for _ in self.values]
+		for clause in self.clauses + self.learnts:
+			self.watches[clause[0]].append(clause)
+			self.watches[clause[1]].append(clause)
+
+	def search(self, max_conflicts, on_conflict):
+		"""
+		search
+			decides and propagates until the clauses are
+			satisfied or conflict at level 0, or a restart is
+			due
+
+		Parameters
+			max_conflicts: conflicts before restarting
+			on_conflict: None, or a function called at every
+				conflict
+
+		Return
+			True: if every variable is assigned
+			False: if the clauses conflict
+			None: if it is time to restart
+		"""
+		conflicts = 0
+		while True:
+			conflict = self.propagate()
+			if conflict is not None:
+				self.conflicts += 1
+				conflicts += 1
+				if on_conflict is not None:
+					on_conflict()
+				if not self.trail_lim:
+					return False
+
+				learnt, back, lbd = self.analyze(conflict)
+				self.cancel_until(back)
+				if len(learnt) == 1:
+					self.assign(learnt[0], None)
+				else:
+					self.learnts.append(learnt)
+					self.lbds.append(lbd)
+					self.watches[learnt[0]].append(learnt)
+					self.watches[learnt[1]].append(learnt)
+					self.assign(learnt[0], learnt)
+				self.bump /= ACTIVITY_DECAY
+				continue
+
+			if conflicts >= max_conflicts:
+				self.cancel_until(0)
+				return None
+
+			lit = self.decide()
+			if lit is None:
+				return True
+			self.decisions += 1
+			self.trail_lim.append(len(self.trail))
+			self.assign(lit, None)
+
+	def solve(self, on_conflict = None):
+		"""
+		solve
+			finds values of the variables that satisfy every
+			clause, restarting after RESTART_CONFLICTS times the
+			next term of the Luby sequence conflicts
+
+		Parameters
+			on_conflict: None, or a function called at every
+				conflict, that may raise to stop the solver
+
+		Return
+			[1 or -1, 2 or -2, ...]: the value of each
+				variable, as DIMACS literals
+			None: if the clauses cannot be satisfied
+		"""
+		if not self.ok:
+			return None
+
+		self.max_learnts = max(int(len(self.clauses) * LEARNT_SHARE), 1000)
+		# Knuth's reluctant doubling: v runs through the
+		# Luby sequence
+		u, v = 1, 1
+		try:
+			while True:
+				result = self.search(v * RESTART_CONFLICTS, on_conflict)
+				if result is not None:
+					break
+
+				if u & -u == v:
+					u, v = u + 1, 1
+				else:
+					v *= 2
+
+				if len(self.learnts) > self.max_learnts:
+					self.reduce()
+					self.max_learnts = int(self.max_learnts * LEARNT_GROWTH)
+
+			if not result:
+				self.ok = False
+				return None
+			return [v if self.values[2 * v] == 1 else -v
+				for v in range(1, self.num_vars + 1)]
+		finally:
+			self.cancel_until(0)
+
+class Encoding(object):
+	"""
+	Encoding holds the clauses of a game, see the module
+	description.
+
+	Instance Variables
+		num_vars: number of variables
+		clauses: list of clauses, as lists of DIMACS literals
+		steps: number of swaps to make, swaps_left / 2
+		swap_vars: list by step of (variable, index1, index2)
+			for every swap that step can make
+	"""
+	def __init__(self, steps):
+		"""
+		Constructor
+
+		Parameters
+			steps: number of swaps to make
+		"""
+		self.num_vars = 0
+		self.clauses = []
+		self.steps = steps
+		self.swap_vars = [[] for _ in range(steps)]
+
+	def new_vars(self, count):
+		"""
+		new_vars
+			returns a list of count new variables
+		"""
+		self.num_vars += count
+		return list(range(self.num_vars - count + 1, self.num_vars + 1))
+
+	def exactly_one(self, variables):
+		"""
+		exactly_one
+			adds clauses making exactly one of the variables
+			true. Long lists are kept to at most one by a
+			sequential counter instead of every pair.
+		"""
+		clauses = self.clauses
+		clauses.append(list(variables))
+		if len(variables) <= 6:
+			for i in range(len(variables)):
+				for j in range(i + 1, len(variables)):
+					clauses.append([-variables[i], -variables[j]])
+			return
+
+		# counter i is true once a variable up to i is
+		counters = self.new_vars(len(variables) - 1)
+		for i, variable in enumerate(variables[:-1]):
+			clauses.append([-variable, counters[i]])
+			if i > 0:
+				clauses.append([-counters[i - 1], counters[i]])
+				clauses.append([-variable, -counters[i - 1]])
+		clauses.append([-variables[-1], -counters[-1]])
+
+	def dimacs(self):
+		"""
+		dimacs
+			returns the encoding as DIMACS CNF text, with the
+			swap of each variable of a step in a comment
+		"""
+		lines = ["c harmony swaps {}".format(self.steps)]
+		for step, choices in enumerate(self.swap_vars):
+			for variable, index1, index2 in choices:
+				lines.append("c swap {} {} {} {}".format(step, index1, index2,
+					variable))
+		lines.append("p cnf {} {}".format(self.num_vars, len(self.clauses)))
+		for clause in self.clauses:
+			lines.append(" ".join(str(literal) for literal in clause) + " 0")
+		return "\n".join(lines) + "\n"
+
+	def write(self, filename):
+		"""
+		write
+			writes the DIMACS CNF text of the encoding
+		"""
+		with open(filename, "w") as f:
+			f.write(self.dimacs())
+
+	def decode(self, model):
+		"""
+		decode
+			reads the swaps off a model of the encoding
+
+		Parameters
+			model: iterable of the DIMACS literals true in
+				the model, as returned by CDCL.solve
+
+		Return
+			[(index1, index2), ...]: list indices of the swaps
+		"""
+		true = set(literal for literal in model if literal > 0)
+		path = []
+		for choices in self.swap_vars:
+			for variable, index1, index2 in choices:
+				if variable in true:
+					path.append((index1, index2))
+					break
+		return path
+
+def encode(harmony):
+	"""
+	encode
+		unrolls a game into its clauses, see the module
+		description. Only cells whose block has swaps left
+		get variables, as no other block moves.
+
+	Parameters
+		harmony: Harmony game at its starting position
+
+	Return
+		Encoding of the game
+	"""
+	cells = harmony.active
+	rows = harmony.rows
+	steps = harmony.swaps_left // 2
+	encoding = Encoding(steps)
+	clauses = encoding.clauses
+
+	palette = sorted(set(harmony.colors[index] for index in cells))
+	counts = range(max([harmony.swaps[index] for index in cells] or [0]) + 1)
+	pairs = [(index1, index2) for index1 in cells
+		for index2 in harmony.links[index1] if index2 > index1]
+
+	# color and count variables of each cell, by step
+	color = []
+	count = []
+	for step in range(steps + 1):
+		color.append({})
+		count.append({})
+		for index in cells:
+			color[step][index] = dict(zip(palette,
+				encoding.new_vars(len(palette))))
+			count[step][index] = encoding.new_vars(len(counts))
+			encoding.exactly_one(list(color[step][index].values()))
+			encoding.exactly_one(count[step][index])
+
+			# a block cannot have more swaps than steps left
+			for swaps in counts[steps - step + 1:]:
+				clauses.append([-count[step][index][swaps]])
+
+	for index in cells:
+		clauses.append([color[0][index][harmony.colors[index]]])
+		clauses.append([count[0][index][harmony.swaps[index]]])
+
+		if rows[index] in color[steps][index]:
+			clauses.append([color[steps][index][rows[index]]])
+		else:
+			clauses.append([])
+		clauses.append([count[steps][index][0]])
+
+	for step in range(steps):
+		now, later = step, step + 1
+		choices = encoding.new_vars(len(pairs))
+		encoding.exactly_one(choices)
+
+		touched = dict(zip(cells, encoding.new_vars(len(cells))))
+		touching = dict((index, [-touched[index]]) for index in cells)
+
+		for swap, (index1, index2) in zip(choices, pairs):
+			encoding.swap_vars[step].append((swap, index1, index2))
+
+			for source, target in ((index1, index2), (index2, index1)):
+				clauses.append([-swap, touched[source]])
+				touching[source].append(swap)
+
+				# the block needs a swap to leave, and one on
+				# its last swap lands in its color row
+				clauses.append([-swap, -count[now][source][0]])
+				if len(counts) > 1:
+					if rows[target] in palette:
+						clauses.append([-swap, -count[now][source][1],
+							color[now][source][rows[target]]])
+					else:
+						clauses.append([-swap, -count[now][source][1]])
+
+				for value in palette:
+					clauses.append([-swap, -color[now][source][value],
+						color[later][target][value]])
+				for swaps in counts[1:]:
+					clauses.append([-swap, -count[now][source][swaps],
+						count[later][target][swaps - 1]])
+
+		for index in cells:
+			clauses.append(touching[index])
+
+			# a block that is not swapped stays as it is
+			for value in palette:
+				clauses.append([touched[index], -color[now][index][value],
+					color[later][index][value]])
+			for swaps in counts:
+				clauses.append([touched[index], -count[now][index][swaps],
+					count[later][index][swaps]])
+
+	return encoding
+
+def search(harmony):
+	"""
+	search
+		solves the game by the CDCL solver, and makes the
+		swaps of the model it finds. Every conflict spends a
+		node of the game.
+
+	Parameters
+		harmony: Harmony game
+
+	Return
+		[(index1, index2), ...]: if there exists a valid
+			series of swaps to win the game
+		None: otherwise
+
+	Raises
+		SearchLimit: if the node budget of the game runs out
+		MemoryLimit: if the clauses do not fit the memory
+			budget of the game
+
+	Postcondition
+		If a path was found, the board is solved.
+	"""
+	if harmony.swaps_left % 2 or harmony.frozen_misplaced:
+		return None
+
+	encoding = encode(harmony)
+	budget = harmony.budget or memory.MemoryBudget()
+	nbytes = CLAUSE_BYTES * len(encoding.clauses)
+	try:
+		budget.grow(nbytes)
+		solver = CDCL(encoding.num_vars)
+		for clause in encoding.clauses:
+			if not solver.add_clause(clause):
+				return None
+
+		model = solver.solve(harmony.spend_node)
+	finally:
+		budget.free(nbytes)
+	if model is None:
+		return None
+
+	path = encoding.decode(model)
+	for index1, index2 in path:
+		harmony.swap(index1, index2)
+	return path
+
+def main():
+	"""
+	main
+		solves a game by this engine, or writes its encoding,
+		from the command line
+	"""
+	from harmony import Harmony
+	from solve import get_harmony_text
+
+	if len(sys.argv) not in (2, 3):
+		print("Usage: %s data_filename.txt [dimacs_filename]" % sys.argv[0])
+		sys.exit(1)
+
+	data = get_harmony_text(sys.argv[1])
+	harmony = Harmony(data["n"], data["colors"], data["swaps"],
+		max_nodes = sys.maxsize, strategy = {"engine": "sat"})
+
+	if len(sys.argv) == 3:
+		encode(harmony).write(sys.argv[2])
+		return
+
+	print(search(harmony))
+
+if __name__ == "__main__":
+	main()
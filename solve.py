@@ -1,15 +1,34 @@
 import sys
 import os
 import json
+import time
 import cProfile
-from harmony import Harmony
+from harmony import Harmony, TracedHarmony, SearchLimit
+from portfolio import solve_portfolio, complete
+import tracer
 
 """
 solve.py is the CLI for solving a game of
 Harmony 3, as described in harmony.py
 
 Usage
-	solve.py data_filename.txt
+	solve.py [--portfolio] data_filename.txt
+	solve.py --trace trace_filename data_filename.txt
+	solve.py --batch data_filename.txt ...
+
+	--portfolio races several search configurations in
+	separate processes, see portfolio.py
+
+	--trace records the search in trace_filename, to be
+	summed up by tracer.py
+
+	--batch solves each file in turn. The size of each
+	search is estimated first, see Harmony.estimate_cost,
+	and scaled by FIRST_PATH_SHARE to the swaps it takes to
+	find the first path: games expected under INLINE_NODES
+	swaps are solved in this process, and the rest are
+	raced by the portfolio. Each game gets a time budget
+	from its expected swaps.
 
 Formatting of data_filename.txt
 	n
@@ -24,6 +43,28 @@ Version
 debug = False
 args = sys.argv
 
+# probes per estimate, see Harmony.estimate_cost
+ESTIMATE_SAMPLES = 32
+
+# share of the estimated tree searched before the first path
+# is found. The estimate is of the whole tree, but the search
+# stops at the first path: in cases/7.in to cases/9.in it
+# takes 10, 26 and 1850 swaps without an endgame table or
+# pattern database, under 1e-6 of the high end of the
+# estimate, and less with them.
+FIRST_PATH_SHARE = 1e-5
+
+# games expected to take under this many swaps to the first
+# path are solved without the portfolio
+INLINE_NODES = 1000000
+
+# rough search speed, to turn estimates into time budgets
+NODES_PER_SECOND = 20000
+
+# bounds of the time budget of one game, in seconds
+MIN_SECONDS = 1
+MAX_SECONDS = 60
+
 def usage():
 	"""
 	usage
@@ -38,7 +79,10 @@ def usage():
 	Postcondition
 		Error message has printed. System has quit.
 	"""
-	print("Usage: %s data_filename.txt" % sys.argv[0])
+	print("Usage: %s [--portfolio] data_filename.txt" % sys.argv[0])
+	print("       %s --trace trace_filename data_filename.txt" %
+		sys.argv[0])
+	print("       %s --batch data_filename.txt ..." % sys.argv[0])
 	sys.exit(1)
 
 def get_harmony_text(filename):
@@ -73,10 +117,10 @@ def get_harmony_text(filename):
 
 			return data
 		except:
-			print "Invalid data file formatting."
+			print("Invalid data file formatting.")
 			usage()
 
-def get_path(filename):
+def get_path(filename, portfolio = False, trace = None):
 	"""
 	get_path
 		takes in a filename, loads the data, and returns the
@@ -85,6 +129,10 @@ def get_path(filename):
 	Parameters
 		data: dictionary mapping n, colors, and swaps for 
 			a given initial state of the game
+		portfolio: whether to race several configurations
+			instead of solving with the selected one
+		trace: path of a file to record the search in, see
+			tracer.py, or None
 	"""
 	data = get_harmony_text(filename)
 
@@ -94,13 +142,101 @@ def get_path(filename):
 	swaps = data["swaps"]
 	test = data["test"]
 	# this formatting is if filename = "cases/#.in"
-	print "Test {}: {}\n".format(filename[6], test)
+	print("Test {}: {}\n".format(filename[6], test))
 
 	# load and solve game
-	harmony = Harmony(n, colors, swaps)
-	path = harmony.solve()
+	if portfolio:
+		path, winner = solve_portfolio(n, colors, swaps)
+		print("Answered by the {} configuration.\n".format(winner))
+		return path
+
+	if trace is None:
+		return Harmony(n, colors, swaps).solve()
+
+	harmony = TracedHarmony(n, colors, swaps)
+	with tracer.Recorder(trace) as harmony.trace:
+		return harmony.solve()
+
+def plan(harmony, samples = ESTIMATE_SAMPLES):
+	"""
+	plan
+		decides how to solve a game from the estimated size
+		of its search
+
+	Parameters
+		harmony: Harmony game at its starting position
+		samples: number of probes of the estimate
+
+	Return
+		("inline" or "portfolio", time budget in seconds)
+	"""
+	estimate, low, high = harmony.estimate_cost(samples, seed = 0)
 
-	return path
+	# swaps to the first path, at the high end
+	nodes = high * FIRST_PATH_SHARE
+	seconds = min(max(nodes / NODES_PER_SECOND, MIN_SECONDS), MAX_SECONDS)
+	if nodes < INLINE_NODES:
+		return ("inline", seconds)
+	return ("portfolio", seconds)
+
+def solve_batch(filenames):
+	"""
+	solve_batch
+		solves each file as routed by plan, and prints one
+		line per game
+
+	Parameters
+		filenames: list of data file paths
+
+	Return
+		list of paths, as returned by Harmony.solve, or None
+			for games without a solution or without an answer
+			in their budget
+	"""
+	paths = []
+	for filename in filenames:
+		data = get_harmony_text(filename)
+		n, colors, swaps = data["n"], data["colors"], data["swaps"]
+
+		start = time.time()
+		harmony = Harmony(n, list(colors), list(swaps),
+			max_nodes = MAX_SECONDS * NODES_PER_SECOND)
+		route, seconds = plan(harmony)
+
+		path = None
+		answered = False
+		if route == "inline":
+			harmony.max_nodes = int(seconds * NODES_PER_SECOND)
+			try:
+				path = harmony.solve()
+				# forced swaps may miss paths, see portfolio.py
+				answered = path is not None or complete(harmony.strategy)
+			except SearchLimit:
+				pass
+			if not answered:
+				# the estimate was off, or the None proves
+				# nothing, so race for the rest
+				route = "portfolio"
+
+		# the race only gets what is left of the budget
+		left = seconds - (time.time() - start)
+		if route == "portfolio" and not answered and left > 0:
+			path, winner = solve_portfolio(n, colors, swaps,
+				timeout = left,
+				max_nodes = int(left * NODES_PER_SECOND))
+			answered = winner is not None
+
+		if path is not None:
+			result = "{} swaps".format(len(path))
+		elif answered:
+			result = "no solution"
+		else:
+			result = "no answer within the time limit"
+		print("{}: {} in {:.2f}s ({}, {:.0f}s budget)".format(filename,
+			result, time.time() - start, route, seconds))
+		paths.append(path)
+
+	return paths
 
 ################################
 # Run CLI with given data file
@@ -110,21 +246,41 @@ def main():
 	main
 		to run with cProfile
 	"""
+	args = sys.argv[1:]
+	if "--batch" in args:
+		args.remove("--batch")
+		if not args or not all(os.path.exists(arg) for arg in args):
+			usage()
+		solve_batch(args)
+		return
+
+	portfolio = "--portfolio" in args
+	if portfolio:
+		args.remove("--portfolio")
+
+	trace = None
+	if "--trace" in args:
+		at = args.index("--trace")
+		if portfolio or at + 1 >= len(args):
+			usage()
+		trace = args.pop(at + 1)
+		args.pop(at)
+
 	# check for invalid usage
-	if len(sys.argv) != 2 or \
-		not os.path.exists(sys.argv[1]):
+	if len(args) != 1 or \
+		not os.path.exists(args[0]):
 			usage()
 
 	# load data from text file
-	path = get_path(sys.argv[1])
+	path = get_path(args[0], portfolio, trace)
 	
 	# print answer
 	if path is None:
-		print "Sorry! This game has no solution."
+		print("Sorry! This game has no solution.")
 	else:
-		print "We found a solution!"
+		print("We found a solution!")
 		for swap in path:
-			print "Swap {} and {}.".format(swap[0], swap[1])
+			print("Swap {} and {}.".format(swap[0], swap[1]))
 
 if __name__ == "__main__":
 	if debug:
@@ -0,0 +1,257 @@
+import threading
+from harmony import Harmony, SearchLimit
+
+"""
+stepper.py solves games of Harmony 3, as described in
+harmony.py, a slice of nodes at a time, so that a program
+with other work on the same core, such as an asyncio event
+loop, can share it with the search.
+
+A Solver runs the search of its game in a thread of its
+own, but never at the same time as its caller: step lets it
+make a number of nodes, and waits until it pauses, see
+Harmony.pause. The search keeps its place between steps,
+whatever the engine, and cancel unwinds it.
+
+solve_async wraps a Solver for asyncio. Awaiting it steps
+the search, and gives control back to the event loop after
+every step, so that games awaited side by side take turns
+of the same number of nodes. A task cancelled while awaiting
+it cancels the search.
+
+Usage
+	solver = Solver(n, colors, swaps)
+	while not solver.step(1000):
+		do_other_work()
+	print(solver.path)
+
+	path = await solve_async(n, colors, swaps)
+"""
+# nodes per step of solve_async
+STEP_NODES = 1000
+
+class SearchCancelled(SearchLimit):
+	"""
+	SearchCancelled is raised in a paused search to unwind
+	it when its Solver is cancelled.
+	"""
+	pass
+
+class Solver(object):
+	"""
+	Solver steps the search of one game, see the module
+	description.
+
+	Instance Variables
+		harmony: Harmony game searched
+		path: path returned by Harmony.solve, once finished
+		finished: whether the search is over, by finding its
+			answer, an error, or cancel
+		cancelled: whether cancel stopped the search
+		error: exception the search raised, until step raises
+			it again
+		step_nodes: nodes of the step being made
+		thread: thread running the search, once started
+		paused: semaphore released when the search pauses or
+			finishes
+		resumed: semaphore released to let the search go on
+	"""
+	def __init__(self, n, colors, swaps, ordering = None, max_nodes = None,
+		strategy = None):
+		"""
+		Constructor
+
+		Parameters
+			n, colors, swaps, ordering, max_nodes, strategy: the
+				game, as given to Harmony. Components are always
+				searched in this process, as workers cannot pause.
+		"""
+		strategy = dict(strategy or {}, workers = 1)
+		self.harmony = Harmony(n, list(colors), list(swaps), ordering,
+			max_nodes, strategy)
+		self.harmony.pause = self.pause
+
+		self.path = None
+		self.finished = False
+		self.cancelled = False
+		self.error = None
+
+		self.step_nodes = 0
+		self.thread = None
+		self.paused = threading.Semaphore(0)
+		self.resumed = threading.Semaphore(0)
+
+	@property
+	def nodes(self):
+		"""
+		nodes
+			number of nodes searched so far
+		"""
+		return self.harmony.nodes
+
+	def step(self, max_nodes):
+		"""
+		step
+			lets the search go on for about max_nodes nodes, or
+			until it finishes
+
+		Parameters
+			max_nodes: nodes to search before pausing
+
+		Return
+			True: if the search is over, and path holds its
+				answer
+			False: otherwise
+
+		Raises
+			SearchLimit: if the game's max_nodes ran out
+		"""
+		if self.finished:
+			return True
+
+		self.step_nodes = max_nodes
+		if self.thread is None:
+			self.harmony.pause_at = max_nodes
+			self.thread = threading.Thread(target = self.run)
+			self.thread.daemon = True
+			self.thread.start()
+		else:
+			self.resumed.release()
+		self.paused.acquire()
+
+		if self.error is not None:
+			error, self.error = self.error, None
+			raise error
+		return self.finished
+
+	def cancel(self):
+		"""
+		cancel
+			stops the search, and waits for it to give the
+			board back. Nothing happens if it is over.
+		"""
+		if self.finished:
+			return
+
+		self.cancelled = True
+		if self.thread is None:
+			self.finished = True
+			return
+
+		self.resumed.release()
+		self.paused.acquire()
+		self.error = None
+
+	def run(self):
+		"""
+		run
+			searches the game, in the solver's thread
+		"""
+		try:
+			self.path = self.harmony.solve()
+		except SearchCancelled:
+			pass
+		except Exception as error:
+			self.error = error
+		finally:
+			self.finished = True
+			self.paused.release()
+
+	def pause(self, harmony):
+		"""
+		pause
+			hands control back to step, in the solver's thread,
+			until the next step or cancel, see Harmony.pause
+
+		Parameters
+			harmony: game that is pausing, this solver's or one
+				of its components
+
+		Raises
+			SearchCancelled: if the solver was cancelled
+		"""
+		self.paused.release()
+		self.resumed.acquire()
+
+		if self.cancelled:
+			raise SearchCancelled(harmony.nodes)
+		harmony.pause_at = harmony.nodes + self.step_nodes
+
+class Pending(object):
+	"""
+	Pending is the awaitable returned by solve_async. It is
+	its own iterator, so that it works without coroutine
+	syntax: each send makes one step, and a step that is not
+	the last gives control back to the event loop.
+
+	Instance Variables
+		solver: Solver of the game
+		step_nodes: nodes per step
+	"""
+	def __init__(self, solver, step_nodes):
+		"""
+		Constructor
+
+		Parameters
+			solver: Solver of the game
+			step_nodes: nodes per step
+		"""
+		self.solver = solver
+		self.step_nodes = step_nodes
+
+	def __await__(self):
+		return self
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		"""
+		__next__
+			makes one step, and ends with the path once the
+			search is over
+		"""
+		try:
+			finished = self.solver.step(self.step_nodes)
+		except BaseException:
+			self.solver.cancel()
+			raise
+
+		if finished:
+			raise StopIteration(self.solver.path)
+		return None
+
+	next = __next__
+
+	def send(self, value):
+		return self.__next__()
+
+	def throw(self, kind, value = None, traceback = None):
+		"""
+		throw
+			cancels the search, and raises the exception the
+			event loop threw in, such as a task's cancellation
+		"""
+		self.solver.cancel()
+		raise kind if value is None else value
+
+	def close(self):
+		self.solver.cancel()
+
+def solve_async(n, colors, swaps, step_nodes = STEP_NODES, **options):
+	"""
+	solve_async
+		solves a game from an asyncio event loop, see the
+		module description
+
+	Parameters
+		n, colors, swaps: the game, as given to Harmony
+		step_nodes: nodes to search between handing control
+			back to the event loop
+		options: ordering, max_nodes and strategy, as given to
+			Harmony
+
+	Return
+		awaitable of the path returned by Harmony.solve
+	"""
+	return Pending(Solver(n, colors, swaps, **options), step_nodes)
@@ -0,0 +1,203 @@
+import os
+import json
+
+"""
+strategy.py picks the search configuration for a game of
+Harmony 3, as described in harmony.py, from cheap features
+of the starting position.
+
+A configuration is a dict with the keys
+	engine: name of the search engine, "dfs", "twophase" to
+		assign final cells before ordering swaps, see
+		twophase.py, "mitm" to meet positions searched back
+		from the goal, see mitm.py, or "sat" to solve the
+		game as a SAT problem, see sat.py
+	middle_states: most positions the "mitm" engine keeps
+		from the goal side, see mitm.py
+	successors: "sorted" or "unsorted", see get_swappable
+	ordering: "history" or "none", see move_order
+	deterministic: whether solve makes the forced swaps of
+		colinear one-swap blocks before searching
+	propagate: whether the search makes those swaps again
+		after every swap it tries
+	backjump: whether the search jumps back over swaps that
+		had no part in a failure, see Harmony.find_path
+	seed: None, or a seed for shuffling the order of moves
+	restarts: whether the search starts over with the next
+		seed after restart_nodes times the next term of the
+		Luby sequence nodes, see Harmony.restart_search
+	restart_nodes: node budget of the shortest run
+	decompose: whether blocks that never interact are searched
+		as separate games
+	workers: number of processes searching those games
+	endgame: whether positions with few swaps left are looked
+		up in the endgame table, see tablebase.py
+	patterns: whether moves are pruned and ordered by the
+		pattern database, see pattern.py
+	transpositions: whether the search skips positions it has
+		already found to have no solution, see transposition.py
+	table_memory: megabytes of that table
+
+Positions are grouped into profiles by their features. If
+STRATEGY_FILE holds a table for the profile, made by
+benchmark.py --tune, that configuration is used. Otherwise
+DEFAULT_RULES decides by the total number of swaps.
+"""
+STRATEGY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+	"strategies.json")
+
+# (max total swaps or None, configuration), first match wins
+DEFAULT_RULES = [
+	(16, {"engine": "dfs", "successors": "unsorted",
+		"ordering": "none", "deterministic": True,
+		"propagate": False, "seed": None, "decompose": True,
+		"workers": 1, "endgame": True, "patterns": True,
+		"middle_states": 1000000, "transpositions": True,
+		"table_memory": 16, "restarts": False, "restart_nodes": 1000,
+		"backjump": False, "memory": None}),
+	(None, {"engine": "dfs", "successors": "sorted",
+		"ordering": "none", "deterministic": True,
+		"propagate": False, "seed": None, "decompose": True,
+		"workers": 1, "endgame": True, "patterns": True,
+		"middle_states": 1000000, "transpositions": True,
+		"table_memory": 16, "restarts": False, "restart_nodes": 1000,
+		"backjump": False, "memory": None}),
+]
+
+SWAP_BUCKETS = [8, 16, 24, 32]
+
+_table = None
+
+def features(n, colors, swaps):
+	"""
+	features
+		computes the features strategies are chosen by
+
+	Parameters
+		n: side length of game
+		colors: length n^2 list of colors
+		swaps: length n^2 list of swap counts
+
+	Return
+		{
+			n: side length of game,
+			swaps: total number of swaps,
+			active: number of blocks with swaps > 0,
+			one_swap: number of blocks with one swap,
+			misplaced: number of blocks outside their
+				color row
+		}
+	"""
+	misplaced = 0
+	for index in range(n**2):
+		if colors[index] != index // n:
+			misplaced += 1
+
+	return {
+		"n": n,
+		"swaps": sum(swaps),
+		"active": sum(1 for s in swaps if s > 0),
+		"one_swap": sum(1 for s in swaps if s == 1),
+		"misplaced": misplaced,
+	}
+
+def profile(feats):
+	"""
+	profile
+		groups features into the key of a strategy table
+		entry. Total swaps fall into SWAP_BUCKETS, and the
+		one-swap and misplaced counts are taken as a share
+		of the active blocks and of the grid, in quarters.
+
+	Parameters
+		feats: dict returned by features
+
+	Return
+		string key "n:swaps:one_swap:misplaced"
+	"""
+	bucket = len(SWAP_BUCKETS)
+	for i, limit in enumerate(SWAP_BUCKETS):
+		if feats["swaps"] <= limit:
+			bucket = i
+			break
+
+	active = max(feats["active"], 1)
+	one_swap = 4 * feats["one_swap"] // active
+	misplaced = 4 * feats["misplaced"] // feats["n"]**2
+
+	return "{}:{}:{}:{}".format(feats["n"], bucket, one_swap, misplaced)
+
+def load_table(filename = None):
+	"""
+	load_table
+		reads a strategy table saved by save_table
+
+	Parameters
+		filename: path of the table, STRATEGY_FILE if None
+
+	Return
+		dict mapping profile keys to configurations, empty
+		if there is no table
+	"""
+	filename = filename or STRATEGY_FILE
+	if not os.path.exists(filename):
+		return {}
+
+	with open(filename, "r") as f:
+		return json.load(f)["profiles"]
+
+def save_table(table, filename = None):
+	"""
+	save_table
+		writes a strategy table, and uses it for every
+		game chosen from here on
+
+	Parameters
+		table: dict mapping profile keys to configurations
+		filename: path of the table, STRATEGY_FILE if None
+	"""
+	global _table
+
+	filename = filename or STRATEGY_FILE
+	with open(filename, "w") as f:
+		json.dump({"profiles": table}, f, indent = 1, sort_keys = True)
+
+	_table = dict(table)
+
+def default_config(feats):
+	"""
+	default_config
+		returns the configuration DEFAULT_RULES gives the
+		features, as a new dict
+
+	Parameters
+		feats: dict returned by features
+	"""
+	for max_swaps, config in DEFAULT_RULES:
+		if max_swaps is None or feats["swaps"] <= max_swaps:
+			return dict(config)
+
+def select(n, colors, swaps):
+	"""
+	select
+		chooses the configuration for a game, preferring the
+		saved table over DEFAULT_RULES
+
+	Parameters
+		n: side length of game
+		colors: length n^2 list of colors
+		swaps: length n^2 list of swap counts
+
+	Return
+		configuration dict, safe for the caller to change
+	"""
+	global _table
+
+	if _table is None:
+		_table = load_table()
+
+	feats = features(n, colors, swaps)
+	config = default_config(feats)
+	config.update(_table.get(profile(feats), {}))
+
+	return config
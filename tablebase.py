@@ -0,0 +1,397 @@
+import os
+import sys
+import mmap
+import time
+import zlib
+import struct
+import multiprocessing
+
+"""
+tablebase.py builds and reads endgame tables for Harmony 3,
+as described in harmony.py. The table for side length n and
+depth k holds every position with at most k swaps left that
+can still be solved, with the first swap of a solution.
+
+Positions are found backwards from the solved grid. Undoing
+a swap gives each of its blocks one swap back, so positions
+d undone swaps from the goal have exactly 2d swaps left, and
+a position with at most k swaps left that is not in the
+table cannot be solved.
+
+File format
+	HEADER: magic, n, k, slot size, number of slots, number
+		of positions
+	slots: the position, one byte per cell holding
+		color << 4 | swaps, then the swap (index1, index2) in
+		two bytes. Empty slots are all EMPTY bytes. A position
+		is in slot crc32(position) % slots or in the first
+		slot after it that is not empty.
+
+Usage
+	tablebase.py n k [table_filename]
+
+	Builds or extends the table of side length n up to k
+	swaps left. An existing table of lower depth is extended
+	from its deepest positions rather than rebuilt.
+"""
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+	"tablebases")
+
+MAGIC = b"HTB1"
+HEADER = struct.Struct("<4sBBHII")
+EMPTY = 0xFF
+
+# positions per job handed to a worker process
+CHUNK = 2000
+
+_tables = {}
+
+def default_filename(n):
+	"""
+	default_filename
+		returns where the table of side length n is kept
+	"""
+	return os.path.join(TABLE_DIR, "endgame{}.tb".format(n))
+
+def pack(colors, swaps):
+	"""
+	pack
+		returns the position as a byte string, one byte per
+		cell with the color in the high and the swaps in the
+		low four bits
+
+	Parameters
+		colors: length n^2 list of colors
+		swaps: length n^2 list of swap counts, each < 16
+	"""
+	return bytes(bytearray((color << 4) | swap
+		for color, swap in zip(colors, swaps)))
+
+def unpack(position):
+	"""
+	unpack
+		returns the (colors, swaps) lists of a position
+		made by pack
+	"""
+	cells = bytearray(position)
+	return ([cell >> 4 for cell in cells], [cell & 15 for cell in cells])
+
+def line_pairs(n):
+	"""
+	line_pairs
+		returns every (index1, index2), index1 < index2, of
+		list indices in the same row or column
+	"""
+	return [(index1, index2)
+		for index1 in range(n**2) for index2 in range(index1 + 1, n**2)
+		if index1 // n == index2 // n or index1 % n == index2 % n]
+
+def predecessors(n, position, pairs):
+	"""
+	predecessors
+		returns the positions one swap before the given one.
+		A swap of index1 and index2 is undone by trading the
+		blocks back and giving each a swap, and only counts
+		if the game allows that swap forwards: a block on its
+		last swap must land in its color row.
+
+	Parameters
+		n: side length of game
+		position: byte string made by pack
+		pairs: list of pairs returned by line_pairs(n)
+
+	Return
+		[(position, index1, index2), ...] of earlier positions
+			and the swap leading from them to this one
+	"""
+	cells = bytearray(position)
+	found = []
+
+	for index1, index2 in pairs:
+		cell1 = cells[index1]
+		cell2 = cells[index2]
+		swap1 = cell1 & 15
+		swap2 = cell2 & 15
+
+		# the block now at index2 was at index1 with one
+		# more swap, and moves to index2 going forwards
+		if swap2 == 0 and cell2 >> 4 != index2 // n:
+			continue
+		if swap1 == 0 and cell1 >> 4 != index1 // n:
+			continue
+		if swap1 == 15 or swap2 == 15:
+			continue
+
+		before = bytearray(cells)
+		before[index1] = cell2 + 1
+		before[index2] = cell1 + 1
+		found.append((bytes(before), index1, index2))
+
+	return found
+
+def expand(job):
+	"""
+	expand
+		returns the predecessors of a chunk of positions,
+		for a worker process
+
+	Parameters
+		job: (n, [position, ...])
+
+	Return
+		[(position, index1, index2), ...]
+	"""
+	n, positions = job
+	pairs = line_pairs(n)
+
+	found = []
+	for position in positions:
+		found.extend(predecessors(n, position, pairs))
+	return found
+
+def generate(n, k, filename = None, workers = None, verbose = False):
+	"""
+	generate
+		builds the table of side length n up to k swaps left
+		on all cores and writes it. If the file already holds
+		a table of lower depth, its positions are kept and
+		only the deeper levels are generated.
+
+	Parameters
+		n: side length of game
+		k: largest number of swaps left to include
+		filename: path of the table, default_filename(n) if None
+		workers: number of processes, all cores if None
+		verbose: whether to print the size and time of
+			each level
+
+	Return
+		dict mapping positions to (index1, index2)
+	"""
+	filename = filename or default_filename(n)
+
+	goal = pack([index // n for index in range(n**2)], [0] * n**2)
+	table = {goal: (EMPTY, EMPTY)}
+	depth = 0
+
+	if os.path.exists(filename):
+		old = Tablebase(filename)
+		if old.n == n and old.k <= k:
+			table = old.items()
+			depth = old.k // 2
+		old.close()
+
+	frontier = [position for position in table
+		if sum(unpack(position)[1]) == 2 * depth]
+
+	pool = multiprocessing.Pool(workers or multiprocessing.cpu_count())
+	try:
+		while depth < k // 2 and frontier:
+			start = time.time()
+			jobs = [(n, frontier[i:i + CHUNK])
+				for i in range(0, len(frontier), CHUNK)]
+
+			level = {}
+			for found in pool.imap_unordered(expand, jobs):
+				for position, index1, index2 in found:
+					if position not in level:
+						level[position] = (index1, index2)
+
+			table.update(level)
+			frontier = list(level)
+			depth += 1
+
+			if verbose:
+				print("{} swaps left: {} positions in {:.1f}s".format(
+					2 * depth, len(level), time.time() - start))
+	finally:
+		pool.terminate()
+
+	write(n, k, table, filename)
+	_tables.pop(filename, None)
+	return table
+
+def write(n, k, table, filename):
+	"""
+	write
+		writes positions and their swaps as a hashed table
+		file, with at most half of the slots in use
+
+	Parameters
+		n: side length of game
+		k: largest number of swaps left in the table
+		table: dict mapping positions to (index1, index2)
+		filename: path of the table
+	"""
+	size = n**2 + 2
+	slots = 1
+	while slots < 2 * len(table):
+		slots *= 2
+
+	data = bytearray([EMPTY]) * (size * slots)
+	for position, move in table.items():
+		slot = (zlib.crc32(position) & 0xffffffff) % slots
+		while data[slot * size] != EMPTY:
+			slot = (slot + 1) % slots
+
+		offset = slot * size
+		data[offset:offset + size] = bytearray(position) + bytearray(move)
+
+	directory = os.path.dirname(filename)
+	if directory and not os.path.isdir(directory):
+		os.makedirs(directory)
+
+	# replace the file whole, so that processes that have the
+	# old table mapped keep reading a complete file
+	with open(filename + ".tmp", "wb") as f:
+		f.write(HEADER.pack(MAGIC, n, k, size, slots, len(table)))
+		f.write(data)
+	os.rename(filename + ".tmp", filename)
+
+class Tablebase(object):
+	"""
+	Tablebase reads a table file through mmap, so that
+	processes opening the same file share its pages.
+
+	Instance Variables
+		n: side length of game
+		k: largest number of swaps left in the table
+		size: bytes per slot
+		slots: number of slots
+		count: number of positions
+	"""
+	def __init__(self, filename):
+		"""
+		Constructor
+			maps the table file and reads its header
+
+		Parameters
+			filename: path of the table
+		"""
+		self.file = open(filename, "rb")
+		self.data = mmap.mmap(self.file.fileno(), 0,
+			access = mmap.ACCESS_READ)
+
+		magic, self.n, self.k, self.size, self.slots, self.count = \
+			HEADER.unpack(self.data[:HEADER.size])
+		if magic != MAGIC:
+			raise ValueError("{} is not a table file.".format(filename))
+
+	def close(self):
+		"""
+		close
+			unmaps and closes the table file
+		"""
+		self.data.close()
+		self.file.close()
+
+	def lookup(self, position):
+		"""
+		lookup
+			returns the first swap of a solution from the
+			packed position
+
+		Parameters
+			position: byte string made by pack
+
+		Return
+			(index1, index2): if the position is in the table
+			(EMPTY, EMPTY): if the position is solved
+			None: otherwise
+		"""
+		data = self.data
+		size = self.size
+		cells = len(position)
+		slot = (zlib.crc32(position) & 0xffffffff) % self.slots
+
+		while True:
+			offset = HEADER.size + slot * size
+			key = data[offset:offset + cells]
+			if key == position:
+				move = bytearray(data[offset + cells:offset + size])
+				return (move[0], move[1])
+			if bytearray(key[:1])[0] == EMPTY:
+				return None
+			slot = (slot + 1) % self.slots
+
+	def solution(self, colors, swaps):
+		"""
+		solution
+			returns a series of swaps solving the position,
+			by following the table from it to the goal
+
+		Parameters
+			colors: length n^2 list of colors
+			swaps: length n^2 list of swap counts
+
+		Return
+			[(index1, index2), ...]: if the position can
+				be solved
+			None: otherwise
+		"""
+		if max(swaps) > 15:
+			return None
+
+		colors = list(colors)
+		swaps = list(swaps)
+		path = []
+		while True:
+			move = self.lookup(pack(colors, swaps))
+			if move is None:
+				return None
+			if move[0] == EMPTY:
+				return path
+
+			index1, index2 = move
+			colors[index1], colors[index2] = colors[index2], colors[index1]
+			swaps[index1], swaps[index2] = swaps[index2] - 1, swaps[index1] - 1
+			path.append(move)
+
+	def items(self):
+		"""
+		items
+			returns a dict of every position in the table
+			and its swap
+		"""
+		table = {}
+		cells = self.n**2
+		for slot in range(self.slots):
+			offset = HEADER.size + slot * self.size
+			record = bytearray(self.data[offset:offset + self.size])
+			if record[0] != EMPTY:
+				table[bytes(record[:cells])] = (record[cells], record[cells + 1])
+		return table
+
+def get(n):
+	"""
+	get
+		returns the open table of side length n, shared by
+		every caller in this process, or None if it has not
+		been generated
+	"""
+	filename = default_filename(n)
+	if filename not in _tables:
+		_tables[filename] = None
+		if os.path.exists(filename):
+			_tables[filename] = Tablebase(filename)
+
+	return _tables[filename]
+
+def main():
+	"""
+	main
+		generates a table from the command line
+	"""
+	if len(sys.argv) not in (3, 4):
+		print("Usage: %s n k [table_filename]" % sys.argv[0])
+		sys.exit(1)
+
+	n, k = int(sys.argv[1]), int(sys.argv[2])
+	filename = sys.argv[3] if len(sys.argv) == 4 else None
+
+	start = time.time()
+	table = generate(n, k, filename, verbose = True)
+	print("{} positions in {:.1f}s".format(len(table), time.time() - start))
+
+if __name__ == "__main__":
+	main()
@@ -1,7 +1,36 @@
+import os
+import sys
+import json
+import tempfile
 import unittest
 from random import randint
 
-from harmony import Harmony
+import harmony
+from harmony import Harmony, TracedHarmony, SearchLimit, luby, solve_many
+import strategy
+import portfolio
+import solve
+import tablebase
+import pattern
+import twophase
+import mitm
+import transposition
+import hint
+import stepper
+import tracer
+import sat
+import memory
+import multiprocessing
+
+try:
+	import asyncio
+except ImportError:
+	asyncio = None
+
+try:
+	from StringIO import StringIO
+except ImportError:
+	from io import StringIO
 
 """
 tests.py provides unit tests for the Harmony.
@@ -86,6 +115,23 @@ class TestHarmonySmall(unittest.TestCase):
 
 		self.assertEqual(swapping_points, set(self.harmony.swapping_points))
 
+	def testConstructor_compact(self):
+		"""
+		testConstructor_compact
+			tests that Harmony links only the cells of blocks
+			with swaps, and checks the frozen blocks once
+		"""
+		self.assertEqual([1, 3], self.harmony.active)
+		self.assertEqual((3,), self.harmony.links[1])
+		self.assertEqual((1,), self.harmony.links[0])
+		self.assertEqual(0, self.harmony.frozen_misplaced)
+
+		n = 2
+		harmony = Harmony(n, [0,1,1,0], [0,1,0,1])
+		harmony.set_value(0, 1, 0)
+		self.assertEqual(1, harmony.frozen_misplaced)
+		self.assertEqual(None, harmony.search())
+
 	################################
 	# Testing index manipulations
 	################################
@@ -143,6 +189,52 @@ class TestHarmonySmall(unittest.TestCase):
 		self.assertEqual(index,
 						self.harmony.grid_to_list_index(g))
 
+	def testIndexManip_list_to_grid_invalid(self):
+		"""
+		testIndexManip_list_to_grid_invalid
+			tests that list_to_grid_index and grid_to_list_index
+			reject indices outside the grid with KeyError
+		"""
+		self.assertRaises(KeyError, self.harmony.list_to_grid_index, 4)
+		self.assertRaises(KeyError, self.harmony.grid_to_list_index, (2, 0))
+
+	def testIndexManip_partners(self):
+		"""
+		testIndexManip_partners
+			tests that the partners of an index are its row
+			then its column, without the index itself
+		"""
+		n = 3
+		harmony = Harmony(n, [0,0,0,1,1,1,2,2,2], [0,0,0,0,0,0,0,0,0])
+
+		self.assertEqual((3, 5, 1, 7), harmony.partners[4])
+		self.assertEqual((1, 2, 3, 6), harmony.partners[0])
+
+	def testIndexManip_geometry_shared(self):
+		"""
+		testIndexManip_geometry_shared
+			tests that games of the same size share their
+			geometry tables, and games of another size do not
+		"""
+		harmony = Harmony(self.n, [1,0,0,1], [1,1,1,1])
+
+		self.assertTrue(harmony.partners is self.harmony.partners)
+		self.assertTrue(harmony.line_masks is self.harmony.line_masks)
+		self.assertEqual((1 << 1) | (1 << 2), harmony.line_masks[0])
+
+		other = Harmony(3, [0,0,0,1,1,1,2,2,2], [0,0,0,0,0,0,0,0,0])
+		self.assertFalse(other.rows is harmony.rows)
+
+	def testIndexManip_compatibility_dicts(self):
+		"""
+		testIndexManip_compatibility_dicts
+			tests that the dict forms of the geometry tables
+			are still available
+		"""
+		self.assertEqual((1, 0), self.harmony.list_to_grid[2])
+		self.assertEqual(2, self.harmony.grid_to_list[(1, 0)])
+		self.assertEqual([2, 3, 1, 3], self.harmony.adjacent_points[3])
+
 	def testIndexManip_valid_index_origin(self):
 		"""
 		testIndexManip_valid_index_origin
@@ -326,6 +418,50 @@ class TestHarmonySmall(unittest.TestCase):
 
 		self.assertTrue(harmony.game_solved())
 
+	def testLogic_misplaced_swap_unswap(self):
+		"""
+		testLogic_misplaced_swap_unswap
+			tests that the count of misplaced blocks follows
+			a swap and the unswap undoing it
+		"""
+		self.assertEqual(2, self.harmony.misplaced)
+
+		self.harmony.swap(1, 3)
+		self.assertEqual(0, self.harmony.misplaced)
+		self.assertTrue(self.harmony.game_solved())
+
+		self.harmony.unswap(1, 3)
+		self.assertEqual(2, self.harmony.misplaced)
+		self.assertFalse(self.harmony.game_solved())
+
+	def testLogic_misplaced_set_value(self):
+		"""
+		testLogic_misplaced_set_value
+			tests that set_value keeps the count of misplaced
+			blocks up to date
+		"""
+		old_color, old_swaps = self.harmony.get(0)
+
+		self.harmony.set_value(0, 1, old_swaps)
+		self.assertEqual(3, self.harmony.misplaced)
+
+		self.harmony.set_value(0, old_color, old_swaps)
+		self.assertEqual(2, self.harmony.misplaced)
+
+	def testLogic_dead_end(self):
+		"""
+		testLogic_dead_end
+			tests that a game with more misplaced blocks than
+			swaps left is reported as a dead end
+		"""
+		n = 2
+		colors = [1,1,0,0]
+		swaps = [1,1,0,0]
+		harmony = Harmony(n, colors, swaps)
+
+		self.assertTrue(harmony.dead_end())
+		self.assertFalse(self.harmony.dead_end())
+
 	################################
 	# Testing pathfinding helpers
 	################################
@@ -371,11 +507,14 @@ class TestHarmonySmall(unittest.TestCase):
 		index1 = 1
 		index2 = 3
 
+		# an unswap needs a swap to undo
+		self.harmony.swap(index1, index2)
+
 		color1, swaps1 = self.harmony.get(index1)
 		color2, swaps2 = self.harmony.get(index2)
 		old_total = self.harmony.swaps_left
 
-		# swap here, and then observe new color / swaps
+		# unswap here, and then observe new color / swaps
 		self.harmony.unswap(index1, index2)
 
 		color1_new, swaps1_new = self.harmony.get(index1)
@@ -393,6 +532,19 @@ class TestHarmonySmall(unittest.TestCase):
 		# check total swaps decrease
 		self.assertEqual(new_total, old_total + 2)
 
+	def testPathfinding_unswap_nothing(self):
+		"""
+		testPathfinding_unswap_nothing
+			tests whether unswap without a swap to undo
+			raises, and leaves the board as it was
+		"""
+		colors = list(self.harmony.colors)
+		swaps = list(self.harmony.swaps)
+
+		self.assertRaises(ValueError, self.harmony.unswap, 1, 3)
+		self.assertEqual(colors, self.harmony.colors)
+		self.assertEqual(swaps, self.harmony.swaps)
+
 	def testPathfinding_valid_moves_none(self):
 		"""
 		testPathfinding_valid_moves_none
@@ -429,6 +581,62 @@ class TestHarmonySmall(unittest.TestCase):
 
 		self.assertEqual(valid, harmony.valid_moves(index))
 
+	def testPathfinding_legal_mask_rules(self):
+		"""
+		testPathfinding_legal_mask_rules
+			tests that legal_mask sets exactly the cells in
+			line with swaps left that the rules allow to swap
+			with, as swaps are made
+		"""
+		n = 4
+		colors = [3,0,0,2,2,1,1,1,0,2,2,0,1,3,3,3]
+		swaps = [1,1,0,2,3,0,1,0,1,1,0,2,2,1,0,1]
+		harmony = Harmony(n, colors, swaps)
+
+		for pair in [None, (4, 12), (3, 11), (4, 6)]:
+			if pair is not None:
+				self.assertTrue(harmony.swap(*pair))
+
+			for index in range(n**2):
+				color, swap = harmony.get(index)
+				legal = 0
+				for partner in range(n**2):
+					color2, swap2 = harmony.get(partner)
+					if partner == index or swap < 1 or swap2 < 1 or \
+						not harmony.indices_in_line(index, partner):
+						continue
+					if (swap > 1 or color == partner // n) and \
+						(swap2 > 1 or color2 == index // n):
+						legal |= 1 << partner
+				self.assertEqual(legal, harmony.legal_mask(index))
+
+	def testPathfinding_masks_follow_swaps(self):
+		"""
+		testPathfinding_masks_follow_swaps
+			tests that swap and unswap keep the occupancy
+			masks equal to ones built from the board
+		"""
+		n = 4
+		colors = [3,0,0,2,2,1,1,1,0,2,2,0,1,3,3,3]
+		swaps = [1,1,0,2,3,0,1,0,1,1,0,2,2,1,0,1]
+		harmony = Harmony(n, colors, swaps)
+		start = (harmony.active_mask, harmony.one_mask,
+			list(harmony.color_masks))
+
+		path = [(4, 12), (3, 11), (4, 6)]
+		for index1, index2 in path:
+			self.assertTrue(harmony.swap(index1, index2))
+			masks = (harmony.active_mask, harmony.one_mask,
+				list(harmony.color_masks))
+			harmony.build_masks()
+			self.assertEqual(masks, (harmony.active_mask,
+				harmony.one_mask, harmony.color_masks))
+
+		for index1, index2 in reversed(path):
+			harmony.unswap(index1, index2)
+		self.assertEqual(start, (harmony.active_mask, harmony.one_mask,
+			harmony.color_masks))
+
 	def testPathfinding_get_swappable_none(self):
 		"""
 		testPathfinding_get_swappable_none
@@ -454,6 +662,66 @@ class TestHarmonySmall(unittest.TestCase):
 		self.assertEqual(swappable,
 		                set(self.harmony.get_swappable()))
 
+	def testPathfinding_swappable_by_swaps(self):
+		"""
+		testPathfinding_swappable_by_swaps
+			tests that swappable walks the blocks with swaps
+			left fewest swaps first, and follows swaps
+		"""
+		n = 3
+		colors = [0,1,2,1,0,1,2,2,0]
+		swaps = [1,1,1,1,2,1,1,1,1]
+		harmony = Harmony(n, colors, swaps)
+
+		self.assertEqual([0,1,2,3,5,6,7,8,4], list(harmony.swappable()))
+
+		harmony.swap(4, 1)
+		self.assertEqual([0,1,2,3,5,6,7,8], list(harmony.swappable()))
+		self.assertEqual([0,1,2,3,5,6,7,8], harmony.get_one_swappable())
+		self.assertEqual([], list(harmony.bucket(2)))
+
+	def testPathfinding_unswap_restores_buckets(self):
+		"""
+		testPathfinding_unswap_restores_buckets
+			tests that unswapping puts every bucket back in
+			the order it had before the swaps
+		"""
+		n = 3
+		colors = [0,1,2,1,0,1,2,2,0]
+		swaps = [1,1,1,1,2,1,1,1,1]
+		harmony = Harmony(n, colors, swaps)
+		before = list(harmony.swappable())
+
+		for index1, index2 in [(4, 1), (3, 5), (0, 1)]:
+			self.assertTrue(harmony.swap(index1, index2))
+		for index1, index2 in [(0, 1), (3, 5), (4, 1)]:
+			harmony.unswap(index1, index2)
+
+		self.assertEqual(before, list(harmony.swappable()))
+		self.assertEqual(swaps, harmony.swaps)
+
+	def testPathfinding_unswap_returns_to_bucket(self):
+		"""
+		testPathfinding_unswap_returns_to_bucket
+			tests that a block that leaves a bucket and comes
+			back to it by later swaps is queued again, and
+			that unswapping both swaps restores the buckets
+		"""
+		n = 3
+		colors = [0,1,2,1,0,1,2,2,0]
+		swaps = [2,4,3,1,1,1,1,1,2]
+		harmony = Harmony(n, colors, swaps)
+		before = list(harmony.swappable())
+
+		self.assertTrue(harmony.swap(0, 1))
+		self.assertTrue(harmony.swap(0, 2))
+		self.assertEqual([3,4,5,6,7,1,8,0,2], list(harmony.swappable()))
+
+		harmony.unswap(0, 2)
+		self.assertEqual([3,4,5,6,7,1,8,2,0], list(harmony.swappable()))
+		harmony.unswap(0, 1)
+		self.assertEqual(before, list(harmony.swappable()))
+
 	################################
 	# Testing search algorithm
 	################################
@@ -497,5 +765,1658 @@ class TestHarmonySmall(unittest.TestCase):
 
 		self.assertEqual(len(path), actual_length)
 
+class TestHarmonyOrdering(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			clears the shared history table and creates a
+			3 by 3 game with several moves per block
+		"""
+		Harmony.history.clear()
+
+		self.n = 3
+		self.colors = [0,1,2,1,0,1,2,2,0]
+		self.swaps = [1,1,1,1,2,1,1,1,1]
+		self.harmony = Harmony(self.n, list(self.colors),
+			list(self.swaps), ordering = "history",
+			strategy = {"patterns": False})
+
+	def tearDown(self):
+		"""
+		tearDown
+			leaves the shared history table empty
+		"""
+		Harmony.history.clear()
+
+	def testOrdering_none_keeps_valid_moves(self):
+		"""
+		testOrdering_none_keeps_valid_moves
+			tests that ordering "none" tries moves in the
+			order given by valid_moves
+		"""
+		harmony = Harmony(self.n, list(self.colors),
+			list(self.swaps), ordering = "none",
+			strategy = {"patterns": False})
+
+		self.assertEqual(harmony.valid_moves(4),
+		                 harmony.move_order(4, 0))
+
+	def testOrdering_killer_first(self):
+		"""
+		testOrdering_killer_first
+			tests that a killer move recorded at a depth is
+			tried first at that depth, and only there
+		"""
+		moves = self.harmony.valid_moves(4)
+		last = moves[-1]
+		self.harmony.record_progress(0, last, 4, 3)
+
+		self.assertEqual(last, self.harmony.move_order(4, 0)[0])
+		self.assertEqual([], self.harmony.killers[1])
+
+	def testOrdering_history_shared(self):
+		"""
+		testOrdering_history_shared
+			tests that history recorded by one game orders
+			the moves of another game of the same size
+		"""
+		moves = self.harmony.valid_moves(4)
+		last = moves[-1]
+		self.harmony.record_progress(0, 4, last, 3)
+
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			ordering = "history")
+		self.assertEqual(last, harmony.move_order(4, 1)[0])
+
+	def testOrdering_moves_unordered(self):
+		"""
+		testOrdering_moves_unordered
+			tests that moves gives every valid swap of the
+			position exactly once, whichever way round
+		"""
+		for ordering in ["none", "history"]:
+			harmony = Harmony(self.n, list(self.colors),
+				list(self.swaps), ordering = ordering,
+				strategy = {"patterns": False})
+			moves = [frozenset(pair) for pair in harmony.moves(0)]
+
+			pairs = set(frozenset((index, move))
+				for index in range(self.n**2)
+				for move in harmony.valid_moves(index))
+			self.assertEqual(len(pairs), len(moves))
+			self.assertEqual(pairs, set(moves))
+
+	def testOrdering_moves_killer_first(self):
+		"""
+		testOrdering_moves_killer_first
+			tests that moves starts with the killer move of
+			its depth
+		"""
+		last = self.harmony.valid_moves(4)[-1]
+		self.harmony.record_progress(0, 4, last, 3)
+
+		self.assertEqual(set([4, last]), set(next(self.harmony.moves(0))))
+
+	def testOrdering_same_path_length(self):
+		"""
+		testOrdering_same_path_length
+			tests that both orderings find a path of the
+			same length
+		"""
+		harmony = Harmony(self.n, list(self.colors),
+			list(self.swaps), ordering = "none")
+
+		self.assertEqual(len(harmony.solve()), len(self.harmony.solve()))
+
+	def testSearch_node_limit(self):
+		"""
+		testSearch_node_limit
+			tests that running out of nodes raises SearchLimit
+			and leaves the board as it was given
+		"""
+		n = 4
+		colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+		harmony = Harmony(n, list(colors), list(swaps), max_nodes = 5,
+			strategy = {"endgame": False, "patterns": False})
+
+		self.assertRaises(SearchLimit, harmony.solve)
+		self.assertEqual(colors, harmony.colors)
+		self.assertEqual(swaps, harmony.swaps)
+		self.assertEqual(sum(swaps), harmony.swaps_left)
+
+class TestHarmonyComponents(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game with two pairs of blocks
+			that never share a row or column
+		"""
+		self.n = 4
+		self.colors = [1,0,0,0, 0,1,1,1, 2,2,3,2, 3,3,2,3]
+		self.swaps = [1,0,0,0, 1,0,0,0, 0,0,1,0, 0,0,1,0]
+
+	def testComponents_split(self):
+		"""
+		testComponents_split
+			tests that blocks that never interact are split
+			into separate components
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+
+		self.assertEqual([[0, 4], [10, 14]], harmony.components())
+
+	def testComponents_solve(self):
+		"""
+		testComponents_solve
+			tests that the paths of the components are joined
+			and leave the board solved
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		path = harmony.solve()
+
+		self.assertEqual(2, len(path))
+		self.assertTrue(harmony.game_solved())
+
+	def testComponents_solve_parallel(self):
+		"""
+		testComponents_solve_parallel
+			tests that components searched in worker
+			processes give the same path length
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = {"workers": 2})
+
+		self.assertEqual(2, len(harmony.solve()))
+
+	def testComponents_one_unsolvable(self):
+		"""
+		testComponents_one_unsolvable
+			tests that a single unsolvable component makes the
+			game unsolvable, and leaves the board alone
+		"""
+		colors = list(self.colors)
+		colors[10], colors[11] = 2, 3
+		swaps = list(self.swaps)
+		swaps[11] = 1
+		harmony = Harmony(self.n, list(colors), list(swaps))
+
+		self.assertEqual(None, harmony.solve())
+		self.assertEqual(colors, harmony.colors)
+
+	def testComponents_frozen_misplaced(self):
+		"""
+		testComponents_frozen_misplaced
+			tests that a block with no swaps outside its row
+			makes the game unsolvable
+		"""
+		colors = list(self.colors)
+		colors[1], colors[5] = 1, 0
+		harmony = Harmony(self.n, colors, list(self.swaps))
+
+		self.assertEqual(None, harmony.solve())
+
+class TestHarmonyTablebase(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			generates a 3 by 3 endgame table up to 6 swaps
+			left in a temporary file
+		"""
+		self.filename = tempfile.mktemp(suffix = ".tb")
+		self.table = tablebase.generate(3, 6, self.filename, workers = 1)
+		self.tablebase = tablebase.Tablebase(self.filename)
+
+	def tearDown(self):
+		"""
+		tearDown
+			closes and removes the table file
+		"""
+		self.tablebase.close()
+		os.remove(self.filename)
+
+	def testTablebase_lookup(self):
+		"""
+		testTablebase_lookup
+			tests that every generated position is found in
+			the file with its swap, and others are not
+		"""
+		for position, move in self.table.items():
+			self.assertEqual(move, self.tablebase.lookup(position))
+
+		position = tablebase.pack([0,0,0,2,2,2,1,1,1], [1,1,1,0,0,0,1,1,1])
+		self.assertEqual(None, self.tablebase.lookup(position))
+
+	def testTablebase_solution(self):
+		"""
+		testTablebase_solution
+			tests that following the table solves a position
+			with swaps that the game allows
+		"""
+		colors = [0,0,0,1,2,2,2,1,1]
+		swaps = [0,0,0,0,1,1,0,1,1]
+		moves = self.tablebase.solution(colors, swaps)
+
+		harmony = Harmony(3, colors, swaps, strategy = {"endgame": False})
+		for index1, index2 in moves:
+			self.assertTrue(harmony.swap(index1, index2))
+		self.assertTrue(harmony.game_solved())
+
+	def testTablebase_incremental(self):
+		"""
+		testTablebase_incremental
+			tests that extending a table gives the same
+			positions as building it at once
+		"""
+		filename = tempfile.mktemp(suffix = ".tb")
+		try:
+			tablebase.generate(3, 2, filename, workers = 1)
+			table = tablebase.generate(3, 6, filename, workers = 1)
+		finally:
+			os.remove(filename)
+
+		self.assertEqual(set(self.table), set(table))
+
+	def testTablebase_search(self):
+		"""
+		testTablebase_search
+			tests that the search finishes games by lookup
+			once few enough swaps are left
+		"""
+		colors = [0,1,2,1,0,1,2,2,0]
+		swaps = [1,1,1,1,2,1,1,1,1]
+		harmony = Harmony(3, colors, swaps,
+			strategy = {"deterministic": False})
+		harmony.tablebase = self.tablebase
+		path = harmony.solve()
+
+		self.assertEqual(5, len(path))
+		self.assertTrue(harmony.game_solved())
+		self.assertTrue(harmony.nodes < 5)
+
+class TestHarmonyPattern(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			builds the 3 by 3 pattern database
+		"""
+		self.table = pattern.build(3)
+		self.patterns = pattern.PatternDatabase(3, pattern.MAX_SWAPS[3],
+			self.table)
+
+	def testPattern_goal(self):
+		"""
+		testPattern_goal
+			tests that the solved pattern costs nothing
+		"""
+		colors = [0,0,0,1,1,1,2,2,2]
+		swaps = [0] * 9
+
+		self.assertEqual([0,0,0], self.patterns.costs(colors, swaps))
+
+	def testPattern_infeasible(self):
+		"""
+		testPattern_infeasible
+			tests that two one-swap blocks of a color in one
+			column outside their row cannot both be solved
+		"""
+		colors = [1,1,0,0,1,2,0,2,2]
+		swaps = [0,0,0,1,0,0,1,0,0]
+
+		self.assertEqual(pattern.INFEASIBLE,
+			self.patterns.cost(colors, swaps, 0))
+
+		harmony = Harmony(3, colors, swaps)
+		harmony.patterns = self.patterns
+		self.assertTrue(harmony.pattern_dead())
+		self.assertEqual(None, harmony.solve())
+
+	def testPattern_save_load(self):
+		"""
+		testPattern_save_load
+			tests that a saved table loads unchanged
+		"""
+		filename = tempfile.mktemp(suffix = ".pdb")
+		try:
+			self.patterns.save(filename)
+			patterns = pattern.PatternDatabase.load(filename)
+		finally:
+			os.remove(filename)
+
+		self.assertEqual(3, patterns.n)
+		self.assertEqual(self.table, patterns.table)
+
+	def testPattern_same_path_length(self):
+		"""
+		testPattern_same_path_length
+			tests that pruning and ordering by patterns still
+			finds a path of the same length
+		"""
+		colors = [0,1,2,1,0,1,2,2,0]
+		swaps = [1,1,1,1,2,1,1,1,1]
+
+		harmony = Harmony(3, list(colors), list(swaps),
+			strategy = {"patterns": False, "endgame": False})
+		expected = len(harmony.solve())
+
+		harmony = Harmony(3, list(colors), list(swaps),
+			strategy = {"endgame": False})
+		harmony.patterns = self.patterns
+		self.assertEqual(expected, len(harmony.solve()))
+
+class TestHarmonyStrategy(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 3 by 3 game position to select
+			strategies for
+		"""
+		self.n = 3
+		self.colors = [0,1,2,1,0,1,2,2,0]
+		self.swaps = [1,1,1,1,2,1,1,1,1]
+
+	def testStrategy_features(self):
+		"""
+		testStrategy_features
+			tests that the features of a position are
+			counted correctly
+		"""
+		feats = strategy.features(self.n, self.colors, self.swaps)
+
+		self.assertEqual(10, feats["swaps"])
+		self.assertEqual(9, feats["active"])
+		self.assertEqual(8, feats["one_swap"])
+		self.assertEqual(4, feats["misplaced"])
+
+	def testStrategy_default_rules(self):
+		"""
+		testStrategy_default_rules
+			tests that without a table, long games use
+			sorted successors and short games do not
+		"""
+		short = {"swaps": 16}
+		long = {"swaps": 18}
+
+		self.assertEqual("unsorted",
+			strategy.default_config(short)["successors"])
+		self.assertEqual("sorted",
+			strategy.default_config(long)["successors"])
+
+	def testStrategy_table_round_trip(self):
+		"""
+		testStrategy_table_round_trip
+			tests that a saved table is loaded back and
+			used to select the configuration of its profile
+		"""
+		feats = strategy.features(self.n, self.colors, self.swaps)
+		config = {"engine": "dfs", "successors": "sorted",
+			"ordering": "none", "deterministic": False}
+		table = {strategy.profile(feats): config}
+
+		old_table = strategy._table
+		filename = tempfile.mktemp(suffix = ".json")
+		try:
+			strategy.save_table(table, filename)
+			self.assertEqual(table, strategy.load_table(filename))
+			selected = strategy.select(self.n, self.colors, self.swaps)
+			self.assertEqual(config,
+				dict((key, selected[key]) for key in config))
+		finally:
+			strategy._table = old_table
+			os.remove(filename)
+
+	def testStrategy_constructor_override(self):
+		"""
+		testStrategy_constructor_override
+			tests that Harmony applies configuration keys
+			given to its constructor
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = {"successors": "sorted", "deterministic": False})
+
+		self.assertEqual(harmony.get_swappable_sorted,
+			harmony.get_swappable)
+		self.assertFalse(harmony.deterministic)
+		self.assertEqual(5, len(harmony.solve()))
+
+class TestHarmonyTwoPhase(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game for the two phase engine
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+		self.strategy = {"engine": "twophase", "endgame": False,
+			"decompose": False, "patterns": False}
+
+	def testTwoPhase_reach(self):
+		"""
+		testTwoPhase_reach
+			tests that a cell reaches only itself in no moves,
+			its active partners in one, and that a block with
+			no swaps blocks the way
+		"""
+		colors = [0,1,0,1,1,0,2,2,2]
+		swaps = [1,1,0,1,1,0,0,0,0]
+		harmony = Harmony(3, colors, swaps)
+		reach = twophase.reach_table(harmony)
+
+		self.assertEqual(1 << 0, reach[0][0])
+		self.assertEqual((1 << 1) | (1 << 3), reach[1][0])
+		self.assertEqual(0, reach[1][0] & (1 << 2))
+
+	def testTwoPhase_assignments(self):
+		"""
+		testTwoPhase_assignments
+			tests that every assignment puts each block in a
+			distinct cell of its color row
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		reach = twophase.reach_table(harmony)
+
+		found = list(twophase.assignments(harmony, reach))
+		self.assertTrue(found)
+		for targets in found:
+			self.assertEqual(sorted(targets), list(range(self.n**2)))
+			for index in range(self.n**2):
+				self.assertEqual(self.colors[index],
+					harmony.rows[targets[index]])
+
+	def testTwoPhase_solve(self):
+		"""
+		testTwoPhase_solve
+			tests that the engine finds a full length path
+			that solves the game
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = self.strategy)
+		path = harmony.search()
+
+		self.assertEqual(11, len(path))
+		self.assertTrue(harmony.game_solved())
+
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = self.strategy)
+		for index1, index2 in path:
+			self.assertTrue(harmony.swap(index1, index2))
+		self.assertTrue(harmony.game_solved())
+
+	def testTwoPhase_no_solution(self):
+		"""
+		testTwoPhase_no_solution
+			tests that the engine answers None when a block
+			can only leave its row with its last swap
+		"""
+		harmony = Harmony(2, [0,0,1,1], [1,0,1,0],
+			strategy = self.strategy)
+
+		self.assertEqual(None, harmony.solve())
+
+class TestHarmonyMeetInTheMiddle(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game for the meet in the middle
+			engine
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+		self.strategy = {"engine": "mitm", "endgame": False,
+			"decompose": False, "patterns": False}
+
+	def testMitm_layers_consistent(self):
+		"""
+		testMitm_layers_consistent
+			tests that each goal layer holds positions with
+			two more swaps than the one before, whose swaps
+			lead back to it
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		layers = mitm.goal_layers(harmony, 3, 100000)
+
+		self.assertEqual(4, len(layers))
+		for depth in range(1, len(layers)):
+			for position, (index1, index2) in layers[depth].items():
+				colors, swaps = tablebase.unpack(position)
+				self.assertEqual(2 * depth, sum(swaps))
+
+				game = Harmony(self.n, colors, swaps)
+				self.assertTrue(game.swap(index1, index2))
+				self.assertTrue(tablebase.pack(game.colors, game.swaps)
+					in layers[depth - 1])
+
+	def testMitm_memory_cap(self):
+		"""
+		testMitm_memory_cap
+			tests that no layer is kept past the memory cap
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		layers = mitm.goal_layers(harmony, 6, 50)
+
+		self.assertTrue(sum(len(layer) for layer in layers) <= 50)
+
+	def testMitm_solve(self):
+		"""
+		testMitm_solve
+			tests that the engine finds a full length path
+			that solves the game, with and without room to
+			meet in the middle
+		"""
+		for states in (1, 1000000):
+			strategy = dict(self.strategy, middle_states = states)
+			harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+				strategy = strategy)
+			path = harmony.search()
+
+			self.assertEqual(11, len(path))
+			self.assertTrue(harmony.game_solved())
+
+			harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+			for index1, index2 in path:
+				self.assertTrue(harmony.swap(index1, index2))
+			self.assertTrue(harmony.game_solved())
+
+	def testMitm_no_solution(self):
+		"""
+		testMitm_no_solution
+			tests that the engine answers None for a game
+			without a solution
+		"""
+		harmony = Harmony(2, [0,0,1,1], [1,0,1,0],
+			strategy = self.strategy)
+
+		self.assertEqual(None, harmony.solve())
+
+class TestHarmonyTransposition(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 3 by 3 game and positions of it to store
+		"""
+		self.n = 3
+		self.colors = [0,1,2,1,0,1,2,2,0]
+		self.swaps = [1,1,1,1,2,1,1,1,1]
+		self.positions = [tablebase.pack(self.colors, [swaps] * 9)
+			for swaps in range(1, 7)]
+
+	def testTransposition_add(self):
+		"""
+		testTransposition_add
+			tests that added positions are found and others
+			are not, within the memory given
+		"""
+		table = transposition.TranspositionTable(self.n, 1)
+		table.add(self.positions[0], 10)
+
+		self.assertTrue(self.positions[0] in table)
+		self.assertFalse(self.positions[1] in table)
+		self.assertEqual(1, table.count())
+		self.assertTrue(len(table.data) <= 1024**2)
+
+	def testTransposition_replace_shallowest(self):
+		"""
+		testTransposition_replace_shallowest
+			tests that a full bucket gives up the position
+			with the fewest swaps left
+		"""
+		table = transposition.TranspositionTable(self.n, 0)
+		self.assertEqual(1, table.buckets)
+
+		for swaps_left, position in enumerate(self.positions[1:]):
+			table.add(position, 10 + 2 * swaps_left)
+		table.add(self.positions[0], 20)
+
+		self.assertTrue(self.positions[0] in table)
+		self.assertFalse(self.positions[1] in table)
+		self.assertEqual(transposition.WAYS, table.count())
+
+	def testTransposition_shared(self):
+		"""
+		testTransposition_shared
+			tests that a position added by another process is
+			found in a table made by create
+		"""
+		table = transposition.create(self.n, 1)
+		try:
+			process = multiprocessing.Process(target = table.add,
+				args = (self.positions[0], 10))
+			process.start()
+			process.join()
+
+			self.assertTrue(self.positions[0] in table)
+		finally:
+			table.close()
+
+	def testTransposition_search(self):
+		"""
+		testTransposition_search
+			tests that a search uses the table attached to
+			its process and finds a path of the same length
+		"""
+		strategy = {"deterministic": False, "endgame": False,
+			"patterns": False}
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = dict(strategy, transpositions = False))
+		expected = len(harmony.solve())
+
+		table = transposition.TranspositionTable(self.n, 1)
+		transposition.attach(table)
+		try:
+			harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+				strategy = strategy)
+			self.assertEqual(expected, len(harmony.solve()))
+			self.assertTrue(harmony.transpositions is table)
+		finally:
+			transposition.attach(None)
+
+class TestHarmonyPortfolio(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game and a file for the
+			portfolio to record wins in
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+		self.stats_file = tempfile.mktemp(suffix = ".json")
+
+	def tearDown(self):
+		"""
+		tearDown
+			removes the wins file, if one was written
+		"""
+		if os.path.exists(self.stats_file):
+			os.remove(self.stats_file)
+
+	def testPortfolio_first_path_wins(self):
+		"""
+		testPortfolio_first_path_wins
+			tests that the portfolio returns a full length
+			path and records the configuration that won
+		"""
+		path, name = portfolio.solve_portfolio(self.n, self.colors,
+			self.swaps, stats_file = self.stats_file)
+
+		self.assertEqual(11, len(path))
+		self.assertTrue(name in dict(portfolio.PORTFOLIO))
+		with open(self.stats_file) as f:
+			self.assertEqual({name: 1}, json.load(f))
+
+	def testPortfolio_no_solution(self):
+		"""
+		testPortfolio_no_solution
+			tests that the portfolio answers None for a game
+			without a solution
+		"""
+		path, name = portfolio.solve_portfolio(3,
+			[0,0,0,2,2,2,1,1,1], [1,1,1,0,0,0,1,1,1],
+			stats_file = False)
+
+		self.assertEqual(None, path)
+		config = strategy.select(3, [0,0,0,2,2,2,1,1,1], [1,1,1,0,0,0,1,1,1])
+		config.update(dict(portfolio.PORTFOLIO)[name])
+		self.assertTrue(portfolio.complete(config))
+
+	def testPortfolio_defaults_not_complete(self):
+		"""
+		testPortfolio_defaults_not_complete
+			tests that a configuration that does not override
+			the forced swaps of the defaults does not end the
+			race with a None
+		"""
+		path, name = portfolio.solve_portfolio(3,
+			[0,0,0,2,2,2,1,1,1], [1,1,1,0,0,0,1,1,1],
+			portfolio = [("sorted", {"successors": "sorted"})],
+			stats_file = False)
+
+		self.assertEqual((None, None), (path, name))
+
+	def testPortfolio_restarts(self):
+		"""
+		testPortfolio_restarts
+			tests that the randomized restart configuration
+			solves on its own
+		"""
+		config = dict(portfolio.PORTFOLIO)["restarts"]
+		path = portfolio.run_config(self.n, self.colors, self.swaps, config)
+
+		self.assertEqual(11, len(path))
+
+	def testPortfolio_node_limit(self):
+		"""
+		testPortfolio_node_limit
+			tests that configurations out of nodes do not
+			answer that there is no solution
+		"""
+		path, name = portfolio.solve_portfolio(self.n, self.colors,
+			self.swaps, stats_file = False, max_nodes = 1)
+
+		self.assertEqual((None, None), (path, name))
+
+class TestHarmonyRestarts(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game searched with restarts
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+		self.strategy = {"restarts": True, "restart_nodes": 2,
+			"deterministic": False, "endgame": False, "patterns": False}
+
+	def testRestarts_luby(self):
+		"""
+		testRestarts_luby
+			tests the start of the Luby sequence
+		"""
+		self.assertEqual([1,1,2,1,1,2,4,1,1,2,1,1,2,4,8,1],
+			[luby(i) for i in range(1, 17)])
+
+	def testRestarts_solve(self):
+		"""
+		testRestarts_solve
+			tests that short runs still find a full path
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = self.strategy)
+		path = harmony.solve()
+
+		self.assertEqual(11, len(path))
+		self.assertTrue(harmony.game_solved())
+
+	def testRestarts_node_limit(self):
+		"""
+		testRestarts_node_limit
+			tests that the overall node budget still holds
+			and leaves the board as it was given
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			max_nodes = 7, strategy = self.strategy)
+
+		self.assertRaises(SearchLimit, harmony.solve)
+		self.assertEqual(7, harmony.max_nodes)
+		self.assertEqual(self.colors, harmony.colors)
+		self.assertEqual(self.swaps, harmony.swaps)
+
+	def testRestarts_no_solution(self):
+		"""
+		testRestarts_no_solution
+			tests that a run that finishes proves there is no
+			solution
+		"""
+		harmony = Harmony(2, [0,0,1,1], [1,0,1,0],
+			strategy = self.strategy)
+		self.assertEqual(None, harmony.solve())
+
+class TestHarmonyBackjump(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game whose failed subtrees are
+			often caused by swaps far up the path
+		"""
+		Harmony.history.clear()
+
+		self.n = 4
+		self.colors = [3,0,0,2,2,1,1,1,0,2,2,0,1,3,3,3]
+		self.swaps = [1,1,0,2,3,0,1,0,1,1,0,2,2,1,0,1]
+		self.strategy = {"deterministic": False, "decompose": False,
+			"patterns": False, "endgame": False, "transpositions": False}
+
+	def tearDown(self):
+		"""
+		tearDown
+			leaves the shared history table empty
+		"""
+		Harmony.history.clear()
+
+	def solve(self, backjump):
+		"""
+		solve
+			solves the game with or without backjumping
+
+		Return
+			(path, nodes)
+		"""
+		Harmony.history.clear()
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			ordering = "none", strategy = dict(self.strategy,
+				backjump = backjump))
+		return (harmony.solve(), harmony.nodes)
+
+	def testBackjump_fewer_nodes(self):
+		"""
+		testBackjump_fewer_nodes
+			tests that backjumping finds a path of the same
+			length with fewer swaps
+		"""
+		path, nodes = self.solve(False)
+		jump_path, jump_nodes = self.solve(True)
+
+		self.assertEqual(len(path), len(jump_path))
+		self.assertTrue(jump_nodes < nodes)
+
+	def testBackjump_no_solution(self):
+		"""
+		testBackjump_no_solution
+			tests that backjumping still proves there is no
+			solution
+		"""
+		harmony = Harmony(3, [0,0,0,2,2,2,1,1,1], [1,1,1,0,0,0,1,1,1],
+			strategy = dict(self.strategy, backjump = True))
+		self.assertEqual(None, harmony.solve())
+
+	def testBackjump_closure(self):
+		"""
+		testBackjump_closure
+			tests that the closure of a cell holds the blocks
+			with swaps left that it can reach
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+
+		self.assertEqual(set([0, 1, 3, 4, 6, 8, 9, 11, 12, 13, 15]),
+			harmony.closure([0]))
+		self.assertEqual(set([2]), harmony.closure([2]))
+
+	def testBackjump_dead_conflict(self):
+		"""
+		testBackjump_dead_conflict
+			tests that a position with a block stuck outside its
+			row is explained by that block alone, and any other
+			by the blocks with swaps left
+		"""
+		harmony = Harmony(3, [1,0,0,0,1,1,2,2,2], [0,0,0,1,0,0,0,0,0])
+		self.assertTrue(harmony.dead_end())
+		self.assertEqual(frozenset([0]), harmony.dead_conflict())
+
+		harmony = Harmony(3, [1,0,0,0,1,1,2,2,2], [1,0,0,1,0,0,0,0,0])
+		self.assertFalse(harmony.dead_end())
+		self.assertEqual(frozenset([0, 3]), harmony.dead_conflict())
+
+	def testBackjump_jumps_over(self):
+		"""
+		testBackjump_jumps_over
+			tests that only swaps that neither touch the
+			conflict set nor link it to other blocks are
+			jumped over
+		"""
+		harmony = Harmony(3, [1,0,0,0,1,1,2,2,2], [1,0,0,1,0,0,0,0,0])
+		conflict = frozenset([0, 3])
+
+		self.assertFalse(harmony.jumps_over(conflict, [3, 4]))
+		self.assertFalse(harmony.jumps_over(conflict, [1, 7]))
+		self.assertTrue(harmony.jumps_over(conflict, [7, 8]))
+
+class TestHarmonyEstimate(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+		self.harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = {"patterns": False, "endgame": False})
+
+	def testEstimate_interval(self):
+		"""
+		testEstimate_interval
+			tests that the estimate lies in its interval, and
+			that the board is left as it was
+		"""
+		estimate, low, high = self.harmony.estimate_cost(16, seed = 0)
+
+		self.assertTrue(0 < low <= estimate <= high)
+		self.assertEqual(self.colors, self.harmony.colors)
+		self.assertEqual(self.swaps, self.harmony.swaps)
+		self.assertEqual(sum(self.swaps), self.harmony.swaps_left)
+
+	def testEstimate_seeded(self):
+		"""
+		testEstimate_seeded
+			tests that the same seed gives the same estimate
+		"""
+		self.assertEqual(self.harmony.estimate_cost(8, seed = 1),
+			self.harmony.estimate_cost(8, seed = 1))
+
+	def testEstimate_solved(self):
+		"""
+		testEstimate_solved
+			tests that a solved game has nothing to search
+		"""
+		harmony = Harmony(2, [0,0,1,1], [0,0,0,0])
+		self.assertEqual((0.0, 0.0, 0.0), harmony.estimate_cost(4))
+
+	def testEstimate_one_move(self):
+		"""
+		testEstimate_one_move
+			tests that a game with a single swap left is
+			estimated exactly
+		"""
+		harmony = Harmony(2, [0,1,1,0], [0,1,0,1],
+			strategy = {"endgame": False})
+		self.assertEqual((1.0, 1.0, 1.0), harmony.estimate_cost(4))
+
+	def testEstimate_plan(self):
+		"""
+		testEstimate_plan
+			tests that a small game is solved inline within
+			the time budget bounds
+		"""
+		route, seconds = solve.plan(self.harmony)
+
+		self.assertEqual("inline", route)
+		self.assertTrue(solve.MIN_SECONDS <= seconds <= solve.MAX_SECONDS)
+
+	def testEstimate_plan_cases(self):
+		"""
+		testEstimate_plan_cases
+			tests that the 4 by 4 games of cases/ are solved
+			inline, and within their time budget
+		"""
+		for number in range(6, 10):
+			data = solve.get_harmony_text("cases/{}.in".format(number))
+			harmony = Harmony(data["n"], data["colors"], data["swaps"],
+				max_nodes = solve.MAX_SECONDS * solve.NODES_PER_SECOND,
+				strategy = {"patterns": False, "endgame": False})
+			route, seconds = solve.plan(harmony)
+
+			self.assertEqual("inline", route)
+			harmony.max_nodes = int(seconds * solve.NODES_PER_SECOND)
+			self.assertTrue(harmony.solve())
+
+	def testEstimate_batch_out_of_time(self):
+		"""
+		testEstimate_batch_out_of_time
+			tests that the batch mode reports a game it ran
+			out of time on as unanswered, not as without a
+			solution
+		"""
+		bounds = (solve.MIN_SECONDS, solve.MAX_SECONDS)
+		solve.MIN_SECONDS = solve.MAX_SECONDS = 0.001
+		stdout, sys.stdout = sys.stdout, StringIO()
+		try:
+			paths = solve.solve_batch(["cases/6.in", "cases/10.in"])
+			lines = sys.stdout.getvalue().splitlines()
+		finally:
+			sys.stdout = stdout
+			solve.MIN_SECONDS, solve.MAX_SECONDS = bounds
+
+		self.assertEqual(4, len(paths[0]))
+		self.assertEqual(None, paths[1])
+		self.assertTrue("4 swaps" in lines[0])
+		self.assertTrue("no answer within the time limit" in lines[1])
+
+class TestHarmonyHint(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game and a hint session for it
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+		self.session = hint.HintSession(self.n, table_memory = 1)
+
+	def testHint_follow_line(self):
+		"""
+		testHint_follow_line
+			tests that following the hints solves the game
+			with a single search
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		while True:
+			move = self.session.hint(harmony.colors, harmony.swaps)
+			if move is None:
+				break
+			self.assertTrue(harmony.swap(*move))
+
+		self.assertTrue(harmony.game_solved())
+		self.assertEqual(1, self.session.searches)
+
+	def testHint_leave_line(self):
+		"""
+		testHint_leave_line
+			tests that a position off the known solution is
+			searched again, and its hint leads on from there
+		"""
+		move = self.session.hint(self.colors, self.swaps)
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		other = next(pair for pair in [(1, 3), (2, 10)] if pair != move)
+		self.assertTrue(harmony.swap(*other))
+
+		move = self.session.hint(harmony.colors, harmony.swaps)
+		self.assertEqual(2, self.session.searches)
+		self.assertTrue(harmony.swap(*move))
+		self.assertNotEqual(None, Harmony(self.n, harmony.colors,
+			harmony.swaps).solve())
+
+	def testHint_lost(self):
+		"""
+		testHint_lost
+			tests that a position without a solution has no
+			hint, even where forced swaps miss a solution, and
+			is only searched once
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		harmony.swap(5, 13)
+		self.assertEqual(None, self.session.hint(harmony.colors,
+			harmony.swaps))
+		searches = self.session.searches
+		self.assertEqual(None, self.session.hint(harmony.colors,
+			harmony.swaps))
+		self.assertEqual(searches, self.session.searches)
+
+		harmony.unswap(5, 13)
+		harmony.swap(4, 5)
+		self.assertNotEqual(None, self.session.hint(harmony.colors,
+			harmony.swaps))
+
+	def testHint_known_line(self):
+		"""
+		testHint_known_line
+			tests that a search reaching a position on a known
+			solution follows it instead of searching on
+		"""
+		path = self.session.solve(self.colors, self.swaps)
+		strategy = {"deterministic": False, "ordering": "none",
+			"endgame": False, "patterns": False, "transpositions": False}
+
+		searched = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = strategy)
+		searched.search()
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = strategy)
+		harmony.known = self.session.line
+
+		self.assertEqual(len(path), len(harmony.search()))
+		self.assertTrue(harmony.game_solved())
+		self.assertTrue(harmony.nodes < searched.nodes)
+
+	def testHint_forgotten_line(self):
+		"""
+		testHint_forgotten_line
+			tests that a hint is given even if the memory
+			budget forgets the solution as soon as it is found
+		"""
+		self.session.line = memory.Cache(memory.MemoryBudget(0.000001), 0)
+
+		move = self.session.hint(self.colors, self.swaps)
+		self.assertEqual(0, len(self.session.line))
+		self.assertNotEqual(None, move)
+
+	def testHint_solved(self):
+		"""
+		testHint_solved
+			tests that a solved game has no hint and is not
+			searched
+		"""
+		colors = [0,0,1,1]
+		swaps = [0,0,0,0]
+		session = hint.HintSession(2)
+
+		self.assertEqual(None, session.hint(colors, swaps))
+		self.assertEqual([], session.solve(colors, swaps))
+		self.assertEqual(0, session.searches)
+
+class TestHarmonyStepper(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+		# without the table of positions earlier searches of
+		# the process found lost, to compare node counts
+		self.strategy = {"deterministic": False, "ordering": "none",
+			"patterns": False, "endgame": False, "transpositions": False}
+
+	def testStepper_steps(self):
+		"""
+		testStepper_steps
+			tests that a search made in small steps pauses
+			between them, and finds the path of solve
+		"""
+		solver = stepper.Solver(self.n, self.colors, self.swaps,
+			strategy = self.strategy)
+		steps = 1
+		while not solver.step(2):
+			steps += 1
+
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = self.strategy)
+		self.assertEqual(harmony.solve(), solver.path)
+		self.assertEqual(harmony.nodes, solver.nodes)
+		self.assertTrue(steps > 1)
+		self.assertTrue(solver.step(2))
+
+	def testStepper_cancel(self):
+		"""
+		testStepper_cancel
+			tests that cancel stops a paused search and gives
+			the board back
+		"""
+		solver = stepper.Solver(self.n, self.colors, self.swaps,
+			strategy = self.strategy)
+		self.assertFalse(solver.step(1))
+		solver.cancel()
+
+		self.assertTrue(solver.finished)
+		self.assertEqual(None, solver.path)
+		self.assertEqual(self.colors, solver.harmony.colors)
+		self.assertEqual(self.swaps, solver.harmony.swaps)
+		solver.thread.join()
+
+	def testStepper_limit(self):
+		"""
+		testStepper_limit
+			tests that step raises SearchLimit when the game's
+			node budget runs out
+		"""
+		solver = stepper.Solver(self.n, self.colors, self.swaps,
+			max_nodes = 1, strategy = self.strategy)
+		self.assertRaises(SearchLimit, solver.step, 100)
+
+	@unittest.skipIf(asyncio is None, "no asyncio")
+	def testStepper_async_interleaved(self):
+		"""
+		testStepper_async_interleaved
+			tests that games awaited side by side take turns,
+			and each finds its path
+		"""
+		turns = []
+
+		def game(name):
+			pending = stepper.solve_async(self.n, self.colors, self.swaps,
+				step_nodes = 1, strategy = self.strategy)
+			for result in pending:
+				turns.append(name)
+				yield result
+
+		games = [game("a"), game("b")]
+		while games:
+			for running in list(games):
+				try:
+					next(running)
+				except StopIteration:
+					games.remove(running)
+
+		self.assertEqual(["a", "b"], turns[:2])
+		self.assertEqual(turns.count("a"), turns.count("b"))
+
+		loop = asyncio.new_event_loop()
+		asyncio.set_event_loop(loop)
+		try:
+			paths = loop.run_until_complete(asyncio.gather(
+				stepper.solve_async(self.n, self.colors, self.swaps,
+					step_nodes = 1, strategy = self.strategy),
+				stepper.solve_async(self.n, self.colors, self.swaps,
+					step_nodes = 1, strategy = self.strategy)))
+		finally:
+			asyncio.set_event_loop(None)
+			loop.close()
+		self.assertEqual(paths[0], paths[1])
+		self.assertNotEqual(None, paths[0])
+
+	@unittest.skipIf(asyncio is None, "no asyncio")
+	def testStepper_async_cancel(self):
+		"""
+		testStepper_async_cancel
+			tests that cancelling the task awaiting a game
+			cancels its search
+		"""
+		pending = stepper.solve_async(self.n, self.colors, self.swaps,
+			step_nodes = 1, strategy = self.strategy)
+		loop = asyncio.new_event_loop()
+		try:
+			task = loop.create_task(asyncio.wait_for(pending, 0))
+			self.assertRaises(asyncio.TimeoutError,
+				loop.run_until_complete, task)
+		finally:
+			loop.close()
+
+		self.assertTrue(pending.solver.finished)
+		self.assertTrue(pending.solver.cancelled)
+
+class TestHarmonyTracer(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game and a file to trace it in
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+
+		handle, self.filename = tempfile.mkstemp(suffix = ".htr")
+		os.close(handle)
+
+	def tearDown(self):
+		os.remove(self.filename)
+
+	def testTracer_records_search(self):
+		"""
+		testTracer_records_search
+			tests that a traced search logs one expand per node,
+			a backtrack for every swap taken back, and the
+			solution
+		"""
+		harmony = TracedHarmony(self.n, list(self.colors),
+			list(self.swaps), strategy = {"deterministic": False,
+				"endgame": False, "decompose": False})
+		with tracer.Recorder(self.filename, buffer_size = 60) as recorder:
+			harmony.trace = recorder
+			path = harmony.solve()
+		self.assertNotEqual(None, path)
+
+		events = list(tracer.read(self.filename))
+		kinds = [event[0] for event in events]
+		self.assertEqual(harmony.nodes, kinds.count(tracer.EXPAND))
+		self.assertEqual(1, kinds.count(tracer.SOLVED))
+		self.assertEqual(len(path), kinds.count(tracer.EXPAND) -
+			kinds.count(tracer.BACKTRACK))
+		self.assertEqual(len(tracer.MAGIC) + tracer.RECORD.size * len(events),
+			os.path.getsize(self.filename))
+
+		summary = tracer.analyze(events)
+		self.assertEqual(harmony.nodes, summary["expanded"])
+		self.assertEqual(1, summary["solved"])
+
+	def testTracer_analyze(self):
+		"""
+		testTracer_analyze
+			tests the branching factors, prune counts and
+			largest subtrees of a small trace
+		"""
+		events = [
+			(tracer.EXPAND, tracer.NONE, 0, 0, 1),
+			(tracer.EXPAND, tracer.NONE, 1, 2, 3),
+			(tracer.PRUNE, tracer.DEAD_END, 1, 2, 3),
+			(tracer.BACKTRACK, tracer.NONE, 1, 2, 3),
+			(tracer.PRUNE, tracer.PATTERN, 1, 2, 4),
+			(tracer.EXPAND, tracer.NONE, 1, 5, 6),
+			(tracer.BACKTRACK, tracer.NONE, 1, 5, 6),
+			(tracer.BACKTRACK, tracer.NONE, 0, 0, 1),
+			(tracer.EXPAND, tracer.NONE, 0, 1, 2),
+			(tracer.SOLVED, tracer.NONE, 0, 1, 2),
+		]
+		summary = tracer.analyze(events, top = 2, depth = 0)
+
+		self.assertEqual(4, summary["expanded"])
+		self.assertEqual(1, summary["solved"])
+		self.assertEqual({0: (1, 2.0), 1: (1, 2.0), 2: (1, 0.0)},
+			summary["branching"])
+		self.assertEqual({"dead end": 1, "pattern": 1}, summary["prunes"])
+		self.assertEqual([(3, ((0, 1),)), (1, ((1, 2),))],
+			summary["hottest"])
+
+	def testTracer_not_a_trace(self):
+		"""
+		testTracer_not_a_trace
+			tests that read rejects a file without MAGIC
+		"""
+		with open(self.filename, "wb") as f:
+			f.write(b"nope")
+		self.assertRaises(ValueError, list, tracer.read(self.filename))
+
+class TestHarmonySat(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game for the SAT engine
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+		self.strategy = {"engine": "sat", "endgame": False,
+			"decompose": False, "deterministic": False}
+
+	def testSat_cdcl(self):
+		"""
+		testSat_cdcl
+			tests that the solver finds a model of satisfiable
+			clauses and proves three pigeons do not fit in two
+			holes
+		"""
+		clauses = [[1, 2], [-1, 3], [-2, 3], [-3, -4], [4, -1, 2]]
+		solver = sat.CDCL(4)
+		for clause in clauses:
+			solver.add_clause(clause)
+		model = set(solver.solve())
+		for clause in clauses:
+			self.assertTrue(any(literal in model for literal in clause))
+
+		# pigeon p in hole h is variable 2p + h + 1
+		solver = sat.CDCL(6)
+		for p in range(3):
+			solver.add_clause([2 * p + 1, 2 * p + 2])
+		for h in range(2):
+			for p in range(3):
+				for q in range(p + 1, 3):
+					solver.add_clause([-(2 * p + h + 1), -(2 * q + h + 1)])
+		self.assertEqual(None, solver.solve())
+		self.assertTrue(solver.conflicts > 0)
+
+	def testSat_dimacs(self):
+		"""
+		testSat_dimacs
+			tests that the DIMACS text of an encoding has its
+			header, one line per clause, and a comment for
+			every swap variable
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		encoding = sat.encode(harmony)
+		lines = encoding.dimacs().splitlines()
+
+		self.assertEqual(11, encoding.steps)
+		self.assertTrue("p cnf {} {}".format(encoding.num_vars,
+			len(encoding.clauses)) in lines)
+		self.assertEqual(len(encoding.clauses),
+			len([line for line in lines if line.endswith(" 0")]))
+		self.assertEqual(sum(len(choices) for choices in encoding.swap_vars),
+			len([line for line in lines if line.startswith("c swap")]))
+
+	def testSat_solve(self):
+		"""
+		testSat_solve
+			tests that the engine finds a full length path
+			that solves the game
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			strategy = self.strategy)
+		path = harmony.search()
+
+		self.assertEqual(11, len(path))
+		self.assertTrue(harmony.game_solved())
+
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		for index1, index2 in path:
+			self.assertTrue(harmony.swap(index1, index2))
+		self.assertTrue(harmony.game_solved())
+
+	def testSat_agrees_with_dfs(self):
+		"""
+		testSat_agrees_with_dfs
+			tests that the engine finds a path for the same
+			small random games as the depth first search
+		"""
+		for _ in range(40):
+			colors = [color for color in range(3) for _ in range(3)]
+			colors.sort(key = lambda color: randint(0, 100))
+			swaps = [randint(0, 2) for _ in range(9)]
+
+			answers = []
+			for engine in ("dfs", "sat"):
+				strategy = dict(self.strategy, engine = engine,
+					transpositions = False)
+				harmony = Harmony(3, list(colors), list(swaps),
+					strategy = strategy)
+				answers.append(harmony.search() is not None)
+			self.assertEqual(answers[0], answers[1])
+
+	def testSat_node_budget(self):
+		"""
+		testSat_node_budget
+			tests that conflicts spend the node budget of the
+			game
+		"""
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+			max_nodes = 0, strategy = self.strategy)
+		self.assertRaises(SearchLimit, harmony.search)
+
+def exit_job(job):
+	"""
+	exit_job
+		stands in for harmony.pool_job as a worker killed in
+		the middle of a puzzle
+	"""
+	os._exit(1)
+
+class TestHarmonySolveMany(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a list of small games, as tuples and as
+			dicts, and one without a solution
+		"""
+		self.puzzles = [
+			(3, [0,0,0,1,2,1,2,1,2], [0,0,0,0,1,1,0,2,0]),
+			{"n": 4, "colors": [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2],
+				"swaps": [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]},
+			(2, [0,0,1,1], [1,0,1,0]),
+			(2, [0,1,0,1], [1,2,1,0]),
+		]
+		self.pulled = 0
+
+	def stream(self):
+		"""
+		stream
+			yields the puzzles over and over, counting how many
+			were taken
+		"""
+		while True:
+			for puzzle in self.puzzles:
+				self.pulled += 1
+				yield puzzle
+
+	def expected(self, position):
+		"""
+		expected
+			returns the path Harmony.solve gives a puzzle
+		"""
+		puzzle = self.puzzles[position % len(self.puzzles)]
+		if isinstance(puzzle, dict):
+			puzzle = (puzzle["n"], puzzle["colors"], puzzle["swaps"])
+		n, colors, swaps = puzzle
+		return Harmony(n, list(colors), list(swaps)).solve()
+
+	def testSolveMany_in_process(self):
+		"""
+		testSolveMany_in_process
+			tests that each answer is the one solve gives, in
+			order, and that a puzzle is only read once the
+			answer before it is taken
+		"""
+		results = solve_many(self.stream())
+		for position in range(8):
+			self.assertEqual((position, self.expected(position), True),
+				next(results))
+			self.assertEqual(position + 1, self.pulled)
+		results.close()
+
+	def testSolveMany_workers(self):
+		"""
+		testSolveMany_workers
+			tests that a pool of workers answers every puzzle,
+			in order if asked, reading at most window puzzles
+			ahead
+		"""
+		for ordered in (True, False):
+			self.pulled = 0
+			results = solve_many(self.stream(), workers = 2,
+				ordered = ordered, window = 3)
+
+			answers = {}
+			for _ in range(8):
+				position, path, finished = next(results)
+				self.assertTrue(self.pulled <= len(answers) + 3)
+				answers[position] = path
+			results.close()
+
+			if ordered:
+				self.assertEqual(list(range(8)), sorted(answers))
+			for position, path in answers.items():
+				self.assertEqual(self.expected(position) is None, path is None)
+
+	def testSolveMany_worker_dies(self):
+		"""
+		testSolveMany_worker_dies
+			tests that a worker dying in the middle of a puzzle
+			raises, instead of waiting for its answer forever
+		"""
+		pool_job = harmony.pool_job
+		harmony.pool_job = exit_job
+		try:
+			results = solve_many(self.puzzles, workers = 2)
+			self.assertRaises(RuntimeError, next, results)
+		finally:
+			harmony.pool_job = pool_job
+
+	def testSolveMany_node_budget(self):
+		"""
+		testSolveMany_node_budget
+			tests that a puzzle out of nodes is reported as
+			not finished
+		"""
+		results = list(solve_many(self.puzzles[1:2], max_nodes = 1,
+			strategy = {"deterministic": False, "endgame": False}))
+		self.assertEqual([(0, None, False)], results)
+
+	def testSolveMany_bad_puzzle(self):
+		"""
+		testSolveMany_bad_puzzle
+			tests that a puzzle of the wrong size raises
+			ValueError when it is reached
+		"""
+		results = solve_many([self.puzzles[0], (3, [0,1], [1,1])])
+		self.assertEqual(0, next(results)[0])
+		self.assertRaises(ValueError, next, results)
+
+class TestHarmonyMemory(unittest.TestCase):
+	def setUp(self):
+		"""
+		setUp
+			creates a 4 by 4 game to search on a budget
+		"""
+		self.n = 4
+		self.colors = [2,0,2,0,1,1,1,1,0,2,0,3,3,3,3,2]
+		self.swaps = [1,1,1,1,2,2,1,3,1,2,1,1,1,2,1,1]
+
+	def tearDown(self):
+		memory.set_limit(None)
+
+	def testMemory_cache_shrinks(self):
+		"""
+		testMemory_cache_shrinks
+			tests that a cache over its budget drops its oldest
+			entries, and gives its bytes back when closed
+		"""
+		budget = memory.MemoryBudget(0.5)
+		cache = memory.Cache(budget)
+		for key in range(5000):
+			cache.add((key, key))
+
+		self.assertTrue(memory.MIN_ENTRIES < len(cache) < 5000)
+		self.assertTrue(budget.used <= budget.limit)
+		self.assertEqual(cache.nbytes, budget.used)
+		self.assertTrue((4999, 4999) in cache)
+		self.assertFalse((0, 0) in cache)
+
+		cache.close()
+		self.assertEqual(0, budget.used)
+		self.assertEqual([], budget.caches)
+
+	def testMemory_parent(self):
+		"""
+		testMemory_parent
+			tests that a search's budget counts against the
+			process's, which can shrink the search's caches
+		"""
+		memory.set_limit(1)
+		self.assertEqual(memory.MEGABYTE, memory.process_budget().limit)
+
+		process = memory.MemoryBudget(0.1)
+		budget = memory.MemoryBudget(None, process)
+		cache = memory.Cache(budget)
+		for key in range(2000):
+			cache.add(key)
+
+		self.assertTrue(len(cache) < 2000)
+		self.assertEqual(budget.used, process.used)
+		self.assertTrue(process.used <= process.limit)
+		self.assertTrue(0 < budget.allot(1) < 0.1)
+
+		cache.close()
+		self.assertEqual(0, process.used)
+		self.assertEqual([], process.caches)
+
+	def testMemory_limit(self):
+		"""
+		testMemory_limit
+			tests that a budget its caches cannot get back
+			under raises MemoryLimit, and that a search cache
+			keeps MIN_ENTRIES while trying
+		"""
+		budget = memory.MemoryBudget(0.01)
+		cache = memory.Cache(budget)
+		self.assertRaises(memory.MemoryLimit, lambda:
+			[cache.add(key) for key in range(memory.MIN_ENTRIES)])
+		self.assertTrue(0 in cache)
+
+		budget = memory.MemoryBudget(0.01)
+		cache = memory.Cache(budget, 0)
+		for key in range(1000):
+			cache.add(key)
+		self.assertTrue(budget.used <= budget.limit)
+
+	def testMemory_engines_fall_back(self):
+		"""
+		testMemory_engines_fall_back
+			tests that engines whose tables do not fit the
+			budget hand the game to the depth first search,
+			which still solves it
+		"""
+		for engine in ("twophase", "mitm", "sat"):
+			strategy = {"engine": engine, "endgame": False,
+				"decompose": False, "deterministic": False, "memory": 0.01}
+			harmony = Harmony(self.n, list(self.colors), list(self.swaps),
+				strategy = strategy)
+
+			# the shared history table may grow, but no more
+			used = memory.process_budget().used - Harmony.history.nbytes
+			path = harmony.search()
+
+			self.assertEqual(11, len(path))
+			self.assertTrue(harmony.game_solved())
+			self.assertEqual(0, harmony.budget.used)
+			self.assertEqual(used,
+				memory.process_budget().used - Harmony.history.nbytes)
+
+	def testMemory_shared_tables(self):
+		"""
+		testMemory_shared_tables
+			tests that the history table counts against the
+			process's budget, and that a pattern database the
+			budget shrinks is dropped and costs 0 from then on
+		"""
+		budget = memory.process_budget()
+		self.assertTrue(Harmony.history in budget.caches)
+
+		harmony = Harmony(self.n, list(self.colors), list(self.swaps))
+		harmony.record_progress(0, 0, 2, 3)
+		self.assertTrue(Harmony.history.nbytes > 0)
+
+		database = pattern.PatternDatabase(2, 2, pattern.build(2, 2))
+		budget.register(database)
+		budget.grow(database.nbytes)
+		used = budget.used
+
+		nbytes = database.nbytes
+		colors, swaps = [0,1,1,0], [0,1,0,1]
+		self.assertEqual(1, database.cost(colors, swaps, 0))
+		self.assertEqual(nbytes, database.shrink())
+
+		self.assertEqual(used - nbytes, budget.used)
+		self.assertFalse(database in budget.caches)
+		self.assertEqual(0, database.cost(colors, swaps, 0))
+
 if __name__ == '__main__':
 	unittest.main()
\ No newline at end of file
@@ -0,0 +1,284 @@
+import sys
+import heapq
+import struct
+
+"""
+tracer.py records what the search of Harmony 3, as described
+in harmony.py, does, and sums the record up afterwards.
+
+A Recorder given to a game as its trace logs every swap
+find_path tries, every swap or position it prunes and why,
+and every swap it takes back. Each event is one RECORD of
+its kind, reason, depth and the two list indices swapped.
+Events are gathered in a buffer and written out in blocks,
+after MAGIC.
+
+analyze reads a trace into the branching factor of the
+positions searched at each depth, the number of prunes of
+each reason, and the subtrees that took the most swaps.
+
+Usage
+	tracer.py trace_filename [top [depth]]
+
+	Prints the summary of a trace, with the top (default 10)
+	largest subtrees below swaps at the given depth, by
+	default the first depth with that many swaps tried.
+
+	solve.py --trace trace_filename data_filename.txt
+	records one.
+"""
+MAGIC = b"HTR1"
+
+# kind, reason, depth, index1, index2
+RECORD = struct.Struct("<BBHBB")
+
+# bytes gathered before they are written
+BUFFER_SIZE = 1 << 16
+
+# kinds of events
+EXPAND, PRUNE, BACKTRACK, SOLVED = range(4)
+
+# reasons of PRUNE, BACKTRACK and SOLVED events
+NONE, DEAD_END, TRANSPOSITION, PATTERN, ENDGAME, BACKJUMP, LIMIT, \
+	KNOWN = range(8)
+
+REASONS = ["none", "dead end", "transposition", "pattern", "endgame",
+	"backjump", "limit", "known"]
+
+class Recorder(object):
+	"""
+	Recorder writes the events of a search to a trace file.
+
+	Instance Variables
+		file: the trace file
+		buffer: bytearray of events not written yet
+		buffer_size: bytes gathered before they are written
+		pack: RECORD.pack
+	"""
+	def __init__(self, filename, buffer_size = BUFFER_SIZE):
+		"""
+		Constructor
+			starts a trace file
+
+		Parameters
+			filename: path of the trace
+			buffer_size: bytes gathered before they are written
+		"""
+		self.file = open(filename, "wb")
+		self.file.write(MAGIC)
+		self.buffer = bytearray()
+		self.buffer_size = buffer_size
+		self.pack = RECORD.pack
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def record(self, kind, reason, depth, index1, index2):
+		"""
+		record
+			logs one event
+
+		Parameters
+			kind: EXPAND, PRUNE, BACKTRACK or SOLVED
+			reason: one of the reasons, NONE for EXPAND
+			depth: number of swaps on the path before the swap
+			index1, index2: list indices of the swap
+		"""
+		self.buffer += self.pack(kind, reason, depth, index1, index2)
+		if len(self.buffer) >= self.buffer_size:
+			self.flush()
+
+	def flush(self):
+		"""
+		flush
+			writes the buffered events
+		"""
+		self.file.write(bytes(self.buffer))
+		del self.buffer[:]
+
+	def close(self):
+		"""
+		close
+			writes the buffered events and closes the file
+		"""
+		if not self.file.closed:
+			self.flush()
+			self.file.close()
+
+def read(filename):
+	"""
+	read
+		yields the events of a trace file
+
+	Parameters
+		filename: path of the trace
+
+	Return
+		generator of (kind, reason, depth, index1, index2)
+
+	Raises
+		ValueError: if the file is not a trace
+	"""
+	size = RECORD.size
+	with open(filename, "rb") as f:
+		if f.read(len(MAGIC)) != MAGIC:
+			raise ValueError("{} is not a trace".format(filename))
+
+		while True:
+			block = f.read(size * 4096)
+			for offset in range(0, len(block) - size + 1, size):
+				yield RECORD.unpack_from(block, offset)
+			if len(block) < size * 4096:
+				return
+
+def analyze(events, top = 10, depth = None):
+	"""
+	analyze
+		sums up the events of a trace. Every swap tried leads
+		to a position, which is searched unless it is pruned
+		or solves the game.
+
+	Parameters
+		events: iterable of events, as yielded by read
+		top: number of largest subtrees to keep
+		depth: depth of the swaps the largest subtrees are
+			below, or None for the first depth with top swaps
+			tried, or the deepest
+
+	Return
+		{
+			expanded: number of swaps tried,
+			solved: number of positions that solved the game,
+			branching: dict mapping depth to (positions
+				searched after that many swaps, mean swaps
+				tried from them),
+			prunes: dict mapping reason names to counts,
+			hottest: list of (swaps tried in the subtree,
+				path of swaps leading to it), largest first
+		}
+	"""
+	# per node on the path: [swaps tried from it, swaps in its
+	# subtree, whether it was not searched]
+	stack = [[0, 0, False]]
+	path = []
+	first = None
+
+	expanded = 0
+	solved = 0
+	searched = {}
+	prunes = {}
+	# per depth, a heap of the largest subtrees
+	hottest = {}
+
+	def close():
+		children, size, skipped = stack.pop()
+		stack[-1][1] += size
+		if not skipped:
+			positions, tried = searched.get(len(path), (0, 0))
+			searched[len(path)] = (positions + 1, tried + children)
+
+		heap = hottest.setdefault(len(path), [])
+		if len(heap) < top:
+			heapq.heappush(heap, (size, tuple(path)))
+		elif size > heap[0][0]:
+			heapq.heapreplace(heap, (size, tuple(path)))
+		path.pop()
+
+	for kind, reason, at, index1, index2 in events:
+		if first is None:
+			first = at
+
+		# swaps on the path, with this one unless it is new or
+		# was never made. A search stopped by a solution never
+		# backtracks, so its swaps are closed here.
+		made = kind != EXPAND and not (kind == PRUNE and reason == PATTERN)
+		while len(path) > at - first + made:
+			close()
+
+		if kind == EXPAND:
+			expanded += 1
+			stack[-1][0] += 1
+			stack.append([0, 1, False])
+			path.append((index1, index2))
+			continue
+
+		if kind == SOLVED:
+			solved += 1
+			stack[-1][2] = True
+		elif kind == PRUNE:
+			prunes[REASONS[reason]] = prunes.get(REASONS[reason], 0) + 1
+			if reason != PATTERN:
+				stack[-1][2] = True
+		elif kind == BACKTRACK:
+			if reason != NONE:
+				prunes[REASONS[reason]] = prunes.get(REASONS[reason], 0) + 1
+			close()
+
+	while len(path) > 0:
+		close()
+
+	branching = {}
+	if first is not None:
+		branching[first] = (1, float(stack[0][0]))
+	for after, (positions, tried) in searched.items():
+		branching[first + after] = (positions, float(tried) / positions)
+
+	# hottest is keyed by the number of swaps on the path
+	if depth is None:
+		depth = max([first + made - 1 for made in hottest] or [0])
+		for made in sorted(hottest):
+			if len(hottest[made]) >= top:
+				depth = first + made - 1
+				break
+	heap = hottest.get(depth - first + 1, []) if first is not None else []
+
+	return {
+		"expanded": expanded,
+		"solved": solved,
+		"branching": branching,
+		"prunes": prunes,
+		"hottest": sorted(heap, reverse = True),
+	}
+
+def report(summary):
+	"""
+	report
+		prints a summary made by analyze
+	"""
+	print("{} swaps tried, {} solutions".format(summary["expanded"],
+		summary["solved"]))
+
+	print("\ndepth  positions  branching")
+	for depth in sorted(summary["branching"]):
+		positions, mean = summary["branching"][depth]
+		print("{:5d}  {:9d}  {:9.2f}".format(depth, positions, mean))
+
+	print("\nprunes")
+	for reason, count in sorted(summary["prunes"].items(),
+		key = lambda item: -item[1]):
+		print("  {:<14} {}".format(reason, count))
+
+	print("\nlargest subtrees")
+	for size, path in summary["hottest"]:
+		swaps = " ".join("{}-{}".format(index1, index2)
+			for index1, index2 in path)
+		print("  {:9d}  {}".format(size, swaps))
+
+def main():
+	"""
+	main
+		prints the summary of a trace from the command line
+	"""
+	if len(sys.argv) not in (2, 3, 4):
+		print("Usage: %s trace_filename [top [depth]]" % sys.argv[0])
+		sys.exit(1)
+
+	top = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+	depth = int(sys.argv[3]) if len(sys.argv) > 3 else None
+	report(analyze(read(sys.argv[1]), top, depth))
+
+if __name__ == "__main__":
+	main()
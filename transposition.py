@@ -0,0 +1,261 @@
+import ctypes
+import zlib
+import multiprocessing
+
+try:
+	from multiprocessing import shared_memory
+except ImportError:
+	shared_memory = None
+
+"""
+transposition.py keeps positions of Harmony 3, as described in
+harmony.py, that a search has found to have no solution, so
+that it and other searches skip them when they reach them
+again by another order of swaps.
+
+A table lives in a fixed block of memory, split into buckets
+of WAYS slots. A slot holds the position packed as in
+tablebase.py, then half its swaps left. A position goes in
+bucket crc32(position) % buckets. When its bucket is full, it
+replaces the slot with the fewest swaps left, since those
+positions are the cheapest to search again.
+
+A table made by create lives in shared memory, from
+multiprocessing.shared_memory where there is one and a
+multiprocessing.RawArray otherwise, with one lock per STRIPES
+buckets. Worker processes that are handed it call attach, and
+their games find it with get.
+"""
+WAYS = 4
+STRIPES = 64
+EMPTY = 0xFF
+
+# megabytes of a table, if the strategy does not say
+DEFAULT_MEMORY = 16
+
+_shared = None
+
+def layout(n, memory):
+	"""
+	layout
+		returns (bytes per slot, number of buckets) of a table
+		of side length n in memory megabytes
+	"""
+	size = n**2 + 1
+	return (size, max(int(memory * 1024**2) // (size * WAYS), 1))
+
+class TranspositionTable(object):
+	"""
+	TranspositionTable is a fixed size set of packed positions
+	without a solution.
+
+	Instance Variables
+		n: side length of game
+		size: bytes per slot
+		buckets: number of buckets
+		data: buffer of buckets * WAYS slots
+		locks: list of STRIPES locks guarding the buckets, or
+			None if only one process uses the table
+		block: the SharedMemory holding data, if there is one
+	"""
+	def __init__(self, n, memory = DEFAULT_MEMORY, data = None, locks = None,
+		block = None):
+		"""
+		Constructor
+			makes a table in memory of its own, unless given
+			a buffer
+
+		Parameters
+			n: side length of game
+			memory: size of the table in megabytes
+			data: buffer of the table, filled with EMPTY
+			locks: list of locks guarding the buckets
+			block: SharedMemory holding data
+		"""
+		self.n = n
+		self.size, self.buckets = layout(n, memory)
+		self.locks = locks
+		self.block = block
+
+		if data is None:
+			data = bytearray([EMPTY]) * (self.size * WAYS * self.buckets)
+		self.data = data
+
+	def __getstate__(self):
+		"""
+		__getstate__
+			leaves out the view of a SharedMemory, which the
+			receiving process opens again
+		"""
+		state = dict(self.__dict__)
+		if self.block is not None:
+			state["data"] = None
+		return state
+
+	def __setstate__(self, state):
+		"""
+		__setstate__
+			restores a table handed to another process
+		"""
+		self.__dict__.update(state)
+		if self.block is not None:
+			self.data = self.block.buf
+
+	def bucket(self, position):
+		"""
+		bucket
+			returns the bucket of a packed position
+		"""
+		return (zlib.crc32(position) & 0xffffffff) % self.buckets
+
+	def find(self, bucket, position):
+		"""
+		find
+			returns the slot of the bucket holding the position,
+			or None
+
+		Parameters
+			bucket: bucket of the position
+			position: byte string made by tablebase.pack
+		"""
+		data = self.data
+		size = self.size
+		cells = len(position)
+
+		for way in range(WAYS):
+			offset = (bucket * WAYS + way) * size
+			if bytes(bytearray(data[offset:offset + cells])) == position:
+				return offset
+		return None
+
+	def __contains__(self, position):
+		"""
+		__contains__
+			returns whether the packed position is known to
+			have no solution
+		"""
+		bucket = self.bucket(position)
+		if self.locks is None:
+			return self.find(bucket, position) is not None
+
+		with self.locks[bucket % len(self.locks)]:
+			return self.find(bucket, position) is not None
+
+	def add(self, position, swaps_left):
+		"""
+		add
+			records that the packed position has no solution,
+			replacing the slot of its bucket with the fewest
+			swaps left if the bucket is full
+
+		Parameters
+			position: byte string made by tablebase.pack
+			swaps_left: total swaps left in the position
+		"""
+		bucket = self.bucket(position)
+		if self.locks is None:
+			self.store(bucket, position, swaps_left)
+			return
+
+		with self.locks[bucket % len(self.locks)]:
+			self.store(bucket, position, swaps_left)
+
+	def store(self, bucket, position, swaps_left):
+		"""
+		store
+			writes the position into its bucket, see add
+		"""
+		if self.find(bucket, position) is not None:
+			return
+
+		data = self.data
+		size = self.size
+		depth = min(swaps_left // 2, EMPTY - 1)
+
+		target = None
+		shallowest = EMPTY
+		for way in range(WAYS):
+			offset = (bucket * WAYS + way) * size
+			if bytearray(data[offset:offset + 1])[0] == EMPTY:
+				target = offset
+				break
+
+			slot_depth = bytearray(data[offset + size - 1:offset + size])[0]
+			if slot_depth < shallowest:
+				target = offset
+				shallowest = slot_depth
+
+		data[target:target + size] = bytearray(position) + bytearray([depth])
+
+	def count(self):
+		"""
+		count
+			returns the number of positions in the table
+		"""
+		size = self.size
+		return sum(1 for offset in range(0, len(self.data), size)
+			if bytearray(self.data[offset:offset + 1])[0] != EMPTY)
+
+	def close(self):
+		"""
+		close
+			frees the shared memory of a table made by create.
+			Other processes must be done with it.
+		"""
+		if self.block is not None:
+			self.data = None
+			self.block.close()
+			self.block.unlink()
+			self.block = None
+
+def create(n, memory = DEFAULT_MEMORY):
+	"""
+	create
+		makes a table in shared memory, for processes that
+		are started or given a pool with it
+
+	Parameters
+		n: side length of game
+		memory: size of the table in megabytes
+
+	Return
+		TranspositionTable
+	"""
+	size, buckets = layout(n, memory)
+	length = size * WAYS * buckets
+	locks = [multiprocessing.Lock() for _ in range(STRIPES)]
+
+	if shared_memory is not None:
+		block = shared_memory.SharedMemory(create = True, size = length)
+		block.buf[:length] = bytearray([EMPTY]) * length
+		return TranspositionTable(n, memory, block.buf, locks, block)
+
+	data = multiprocessing.RawArray(ctypes.c_ubyte, length)
+	ctypes.memset(data, EMPTY, length)
+	return TranspositionTable(n, memory, data, locks)
+
+def attach(table):
+	"""
+	attach
+		makes the table the one get returns in this process,
+		for a worker process given a table made by create
+
+	Parameters
+		table: TranspositionTable, or None to detach
+
+	Return
+		the table attached before, or None
+	"""
+	global _shared
+	previous, _shared = _shared, table
+	return previous
+
+def get(n):
+	"""
+	get
+		returns the table attached to this process, if there
+		is one for side length n, or None
+	"""
+	if _shared is not None and _shared.n == n:
+		return _shared
+	return None
@@ -0,0 +1,202 @@
+import memory
+
+"""
+twophase.py is a search engine for Harmony 3, as described
+in harmony.py, that decides where every block ends before
+it decides the order of the swaps.
+
+Phase one assigns each block that can move a cell of its
+color row. A block only moves between cells that hold blocks
+with swaps left, one line at a time, and must use exactly
+its swaps, so it can only end in the cells it reaches in
+exactly that many moves. Phase two searches for swaps that
+keep every block able to reach its assigned cell, and tries
+the next assignment when none are left. The positions it has
+failed from are kept in a cache of the game's memory budget,
+see memory.py.
+"""
+
+def reach_table(harmony):
+	"""
+	reach_table
+		finds the cells each cell reaches in an exact number
+		of moves, moving only between cells of blocks with
+		swaps left that are in line with each other
+
+	Parameters
+		harmony: Harmony game at its starting position
+
+	Return
+		list indexed by moves of lists indexed by cell of
+			bitmasks of the cells reached
+	"""
+	cells = range(harmony.n**2)
+	steps = harmony.links
+
+	reach = [[1 << index for index in cells]]
+	for moves in range(max(harmony.swaps)):
+		last = reach[-1]
+		masks = []
+		for index in cells:
+			mask = 0
+			for partner in steps[index]:
+				mask |= last[partner]
+			masks.append(mask)
+		reach.append(masks)
+
+	return reach
+
+def assignments(harmony, reach):
+	"""
+	assignments
+		yields every way to give each block that can move a
+		cell of its color row that it reaches in exactly its
+		swaps, no two blocks the same cell. Blocks with the
+		fewest choices are assigned first.
+
+	Parameters
+		harmony: Harmony game at its starting position
+		reach: list returned by reach_table
+
+	Return
+		generator of length n^2 lists of the cell each block
+			ends in, by the cell it starts in
+	"""
+	n = harmony.n
+	colors = harmony.colors
+	swaps = harmony.swaps
+	active = [index for index in harmony.active if swaps[index] > 0]
+
+	choices = {}
+	for index in active:
+		color = colors[index]
+		mask = reach[swaps[index]][index]
+		choices[index] = [target for target in active
+			if harmony.rows[target] == color and mask >> target & 1]
+		if not choices[index]:
+			return
+
+	order = sorted(active, key = lambda index: len(choices[index]))
+	targets = list(range(n**2))
+	used = set()
+
+	def assign(position):
+		if position == len(order):
+			yield list(targets)
+			return
+
+		index = order[position]
+		for target in choices[index]:
+			if target not in used:
+				used.add(target)
+				targets[index] = target
+				for found in assign(position + 1):
+					yield found
+				used.discard(target)
+
+	for found in assign(0):
+		yield found
+
+def sequence(harmony, targets, reach, path, failed):
+	"""
+	sequence
+		searches for swaps that bring every block to its
+		assigned cell. A swap is only tried if both blocks
+		can still reach their cells with the swaps they
+		have left.
+
+	Parameters
+		harmony: Harmony game
+		targets: length n^2 list of the cell the block in
+			each cell must end in, moved along with the blocks
+		reach: list returned by reach_table
+		path: list of tuples of indices, detailing swap order
+		failed: memory.Cache of positions, with their targets,
+			known not to lead to the assignment
+
+	Return
+		path: with the swaps appended, if there are any
+		None: otherwise
+
+	Raises
+		SearchLimit: if the node budget runs out. The board is
+			restored before it propagates.
+		MemoryLimit: if failed cannot shrink enough to fit the
+			budget, likewise
+	"""
+	if harmony.swaps_left == 0:
+		return path if harmony.game_solved() else None
+
+	swaps = harmony.swaps
+	key = (tuple(harmony.colors), tuple(swaps), tuple(targets))
+	if key in failed:
+		return None
+
+	for index1 in harmony.active:
+		if swaps[index1] == 0:
+			continue
+
+		for index2 in harmony.links[index1]:
+			if index2 < index1 or swaps[index2] == 0:
+				continue
+			if not reach[swaps[index1] - 1][index2] >> targets[index1] & 1:
+				continue
+			if not reach[swaps[index2] - 1][index1] >> targets[index2] & 1:
+				continue
+
+			harmony.swap(index1, index2)
+			targets[index1], targets[index2] = targets[index2], targets[index1]
+			path.append((index1, index2))
+
+			try:
+				harmony.spend_node()
+				found = sequence(harmony, targets, reach, path, failed)
+			except Exception:
+				path.pop()
+				targets[index1], targets[index2] = \
+					targets[index2], targets[index1]
+				harmony.unswap(index1, index2)
+				raise
+
+			if found is not None:
+				return found
+
+			path.pop()
+			targets[index1], targets[index2] = targets[index2], targets[index1]
+			harmony.unswap(index1, index2)
+
+	failed.add(key)
+	return None
+
+def search(harmony):
+	"""
+	search
+		solves the game in two phases, trying assignments in
+		turn until one can be carried out
+
+	Parameters
+		harmony: Harmony game
+
+	Return
+		[(index1, index2), ...]: if there exists a valid
+			series of swaps to win the game
+		None: otherwise
+
+	Raises
+		SearchLimit: if the node budget of the game runs out
+		MemoryLimit: if the memory budget of the game runs out
+
+	Postcondition
+		If a path was found, the board is solved.
+	"""
+	reach = reach_table(harmony)
+	for targets in assignments(harmony, reach):
+		failed = memory.Cache(harmony.budget)
+		try:
+			path = sequence(harmony, targets, reach, [], failed)
+		finally:
+			failed.close()
+		if path is not None:
+			return path
+
+	return None